@@ -3,9 +3,16 @@ __version__ = "1.0.0"
 __author__ = "LLM Roleplay Evaluator Team"
 __description__ = "大型語言模型角色扮演能力評估工具"
 
-from .config import config
-from .evaluator import RoleplayTestRunner, RoleplayScorer
-from .prompts import get_scenario_prompt, get_all_scenarios
+# 子模組在第一次存取時才匯入，避免僅匯入套件就載入 scikit-learn 與 aiohttp
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'config': '.config',
+    'RoleplayTestRunner': '.evaluator',
+    'RoleplayScorer': '.evaluator',
+    'get_scenario_prompt': '.prompts',
+    'get_all_scenarios': '.prompts'
+}
 
 __all__ = [
     'config',
@@ -13,4 +20,14 @@ __all__ = [
     'RoleplayScorer',
     'get_scenario_prompt',
     'get_all_scenarios'
-]
\ No newline at end of file
+]
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+基準測試用的本機模擬 LLM 服務
+提供 OpenAI 相容的 /v1/chat/completions（串流與非串流）、Ollama 的 /api/tags、/api/chat 與 /api/generate，
+可設定首 token 延遲分布、解碼速度、錯誤與 429 注入比例，以及同時處理的槽位上限
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+from aiohttp import web
+
+# 回應內容使用的中英混合詞彙
+RESPONSE_WORDS = (
+    "我 覺得 今天 的 天氣 很 好 ， 我們 一起 去 公園 走走 吧 。 "
+    "I think it's a wonderful day , and I really enjoy talking with you ! "
+    "年輕 的 時候 我 常常 這樣 想 ， 人生 最 重要 的 是 家人 。"
+).split()
+
+class LatencyModel:
+    """延遲分布（秒）"""
+
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, distribution: str = "fixed", mean: float = 0.2, spread: float = 0.0):
+        """
+        Args:
+            distribution: 分布類型（fixed、uniform、normal 或 lognormal）
+            mean: 平均延遲
+            spread: 分散程度（uniform 為半寬，normal 與 lognormal 為標準差）
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"不支援的延遲分布: {distribution}。可用的分布：{list(self.DISTRIBUTIONS)}")
+        self.distribution = distribution
+        self.mean = mean
+        self.spread = spread
+
+    def sample(self) -> float:
+        """抽樣一次延遲（不小於 0）"""
+        if self.distribution == "uniform":
+            value = random.uniform(self.mean - self.spread, self.mean + self.spread)
+        elif self.distribution == "normal":
+            value = random.gauss(self.mean, self.spread)
+        elif self.distribution == "lognormal" and self.mean > 0:
+            # 依平均值與標準差換算對數常態分布參數
+            variance = self.spread ** 2
+            sigma_sq = math.log1p(variance / self.mean ** 2)
+            value = random.lognormvariate(math.log(self.mean) - sigma_sq / 2, sigma_sq ** 0.5)
+        else:
+            value = self.mean
+        return max(0.0, value)
+
+class MockLLMServer:
+    """模擬 LLM 服務"""
+
+    def __init__(self, ttft: Optional[LatencyModel] = None, tokens_per_sec: float = 50.0,
+                 response_tokens: int = 40, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: float = 0.5, max_slots: int = 0, queue_when_full: bool = True,
+                 load_time: float = 0.0, max_loaded_models: int = 0, models: Optional[List[str]] = None,
+                 prompt_tokens_per_sec: float = 0.0):
+        """
+        Args:
+            ttft: 首 token 延遲分布（預設固定 0.2 秒）
+            tokens_per_sec: 解碼速度（每秒 token 數，0 表示不延遲）
+            response_tokens: 每個回應的 token 數
+            error_rate: 回傳 500 錯誤的比例
+            throttle_rate: 回傳 429（附 Retry-After）的比例
+            retry_after: 429 回應的 Retry-After 秒數
+            max_slots: 同時處理的請求上限（0 表示不限制）
+            queue_when_full: 槽位已滿時排隊等待；否則立即回傳 429
+            load_time: 模型首次被請求時的載入時間（秒）
+            max_loaded_models: 同時載入的模型上限，超過時卸載最久未使用的模型（0 表示不限制）
+            models: /api/tags 列出的模型
+            prompt_tokens_per_sec: 提示詞處理速度（每秒 token 數，0 表示不計提示詞處理時間）
+        """
+        self.ttft = ttft or LatencyModel()
+        self.tokens_per_sec = tokens_per_sec
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_slots = max_slots
+        self.queue_when_full = queue_when_full
+        self.load_time = load_time
+        self.max_loaded_models = max_loaded_models
+        self.models = models or ["gpt-oss:20b"]
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self._slots = asyncio.Semaphore(max_slots) if max_slots > 0 else None
+        # 已載入的模型（依最近使用順序）
+        self.loaded_models: "OrderedDict[str, None]" = OrderedDict()
+        self._runner: Optional[web.AppRunner] = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """重設統計數據"""
+        self.stats: Dict[str, Any] = {
+            "requests": 0,
+            "completed": 0,
+            "errors": 0,
+            "throttled": 0,
+            "active": 0,
+            "peak_active": 0,
+            "service_time": 0.0,
+            "model_loads": 0
+        }
+
+    def create_app(self) -> web.Application:
+        """建立 aiohttp 應用程式"""
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle_openai_chat)
+        app.router.add_get("/v1/models", self.handle_openai_models)
+        app.router.add_post("/api/chat", self.handle_ollama_chat)
+        app.router.add_post("/api/generate", self.handle_ollama_generate)
+        app.router.add_get("/api/tags", self.handle_tags)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """在目前的事件迴圈啟動服務
+
+        Returns:
+            服務的基礎 URL（port 為 0 時自動選擇可用埠）
+        """
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        bound_port = self._runner.addresses[0][1]
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        """停止服務"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _throttle_response(self) -> web.Response:
+        self.stats["throttled"] += 1
+        return web.json_response(
+            {"error": {"message": "rate limited"}},
+            status=429,
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    def _injected_failure(self) -> Optional[web.Response]:
+        """依設定比例注入 429 或 500 錯誤"""
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return self._throttle_response()
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"error": {"message": "injected server error"}}, status=500)
+        return None
+
+    async def _acquire_slot(self) -> bool:
+        """取得處理槽位；不排隊且已滿時回傳 False"""
+        if self._slots is None:
+            return True
+        if self._slots.locked() and not self.queue_when_full:
+            return False
+        await self._slots.acquire()
+        return True
+
+    def _release_slot(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def _tokens(self) -> List[str]:
+        """產生本次回應的 token 序列"""
+        start = random.randrange(len(RESPONSE_WORDS))
+        return [RESPONSE_WORDS[(start + i) % len(RESPONSE_WORDS)] + " " for i in range(self.response_tokens)]
+
+    async def _generate(self, request: web.Request, handler):
+        """共用的請求流程：注入錯誤、取得槽位、計時與統計"""
+        self.stats["requests"] += 1
+        failure = self._injected_failure()
+        if failure is not None:
+            return failure
+        if not await self._acquire_slot():
+            return self._throttle_response()
+
+        self.stats["active"] += 1
+        self.stats["peak_active"] = max(self.stats["peak_active"], self.stats["active"])
+        start_time = time.perf_counter()
+        try:
+            body = await request.json()
+            load_time = await self._load_model(body.get("model"))
+            return await handler(request, body, load_time)
+        finally:
+            self.stats["active"] -= 1
+            self.stats["completed"] += 1
+            self.stats["service_time"] += time.perf_counter() - start_time
+            self._release_slot()
+
+    async def _load_model(self, model: Optional[str]) -> float:
+        """模擬模型載入（只有尚未載入的模型需要等待），回傳載入時間"""
+        if model in self.loaded_models:
+            self.loaded_models.move_to_end(model)
+            return 0.0
+        if self.max_loaded_models > 0:
+            while len(self.loaded_models) >= self.max_loaded_models:
+                self.loaded_models.popitem(last=False)
+        self.loaded_models[model] = None
+        self.stats["model_loads"] += 1
+        await asyncio.sleep(self.load_time)
+        return self.load_time
+
+    async def _emit_tokens(self, tokens: List[str], emit, prompt_tokens: int = 0):
+        """依提示詞處理時間、首 token 延遲與解碼速度逐一送出 token"""
+        prefill = prompt_tokens / self.prompt_tokens_per_sec if self.prompt_tokens_per_sec > 0 else 0.0
+        await asyncio.sleep(prefill + self.ttft.sample())
+        delay = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        for index, token in enumerate(tokens):
+            if index and delay:
+                await asyncio.sleep(delay)
+            await emit(token)
+
+    @staticmethod
+    def _timings(load_time: float, prompt_tokens: int, eval_count: int, prompt_time: float,
+                 eval_time: float) -> Dict[str, int]:
+        """Ollama 原生 API 的時間統計（奈秒）"""
+        return {
+            "total_duration": int((load_time + prompt_time + eval_time) * 1e9),
+            "load_duration": int(load_time * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_time * 1e9),
+            "eval_count": eval_count,
+            "eval_duration": int(eval_time * 1e9)
+        }
+
+    @staticmethod
+    def _prompt_tokens(body: Dict[str, Any]) -> int:
+        """以字元數粗估提示詞 token 數"""
+        return sum(len(message.get("content", "")) for message in body.get("messages", [])) // 4
+
+    async def handle_openai_chat(self, request: web.Request) -> web.StreamResponse:
+        """OpenAI 相容的聊天完成 API"""
+        return await self._generate(request, self._openai_chat)
+
+    async def _openai_chat(self, request: web.Request, body: Dict[str, Any],
+                           load_time: float) -> web.StreamResponse:
+        tokens = self._tokens()
+        prompt_tokens = self._prompt_tokens(body)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)
+        }
+
+        if not body.get("stream"):
+            parts = []
+
+            async def collect(token):
+                parts.append(token)
+
+            await self._emit_tokens(tokens, collect, prompt_tokens)
+            # n 個選項以批次同時產生，回應時間與單一選項相同
+            choices = [{"index": 0, "message": {"role": "assistant", "content": "".join(parts)},
+                        "finish_reason": "stop"}]
+            for index in range(1, int(body.get("n") or 1)):
+                choices.append({"index": index, "message": {"role": "assistant", "content": "".join(self._tokens())},
+                                "finish_reason": "stop"})
+            usage["completion_tokens"] = len(tokens) * len(choices)
+            usage["total_tokens"] = prompt_tokens + usage["completion_tokens"]
+            return web.json_response({"model": body.get("model"), "choices": choices, "usage": usage})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(token):
+            chunk = {"model": body.get("model"), "choices": [{"index": 0, "delta": {"content": token}}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        await self._emit_tokens(tokens, send, prompt_tokens)
+        final_chunk = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        await response.write(f"data: {json.dumps(final_chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def handle_ollama_chat(self, request: web.Request) -> web.StreamResponse:
+        """Ollama 原生聊天 API（預設以 NDJSON 串流）"""
+        return await self._generate(request, self._ollama_chat)
+
+    async def _ollama_chat(self, request: web.Request, body: Dict[str, Any],
+                           load_time: float) -> web.StreamResponse:
+        return await self._ollama_native(
+            request, body, load_time, self._tokens(), self._prompt_tokens(body),
+            lambda text: {"message": {"role": "assistant", "content": text}}
+        )
+
+    async def _ollama_native(self, request: web.Request, body: Dict[str, Any], load_time: float,
+                             tokens: List[str], prompt_tokens: int, wrap,
+                             final_fields: Optional[Dict[str, Any]] = None) -> web.StreamResponse:
+        """Ollama 原生 API 的共用回應流程（stream 預設為 true，以 NDJSON 串流）
+
+        Args:
+            wrap: 將一段回應文字包成回應欄位（/api/chat 為 message，/api/generate 為 response）
+            final_fields: 最後一個片段額外附帶的欄位
+        """
+        start_time = time.perf_counter()
+        first_token_time = None
+        parts = []
+        response = None
+
+        if body.get("stream", True):
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+
+        async def emit(token):
+            nonlocal first_token_time
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            parts.append(token)
+            if response is not None:
+                line = {"model": body.get("model"), **wrap(token), "done": False}
+                await response.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+
+        await self._emit_tokens(tokens, emit, prompt_tokens)
+        end_time = time.perf_counter()
+        prompt_time = (first_token_time or end_time) - start_time
+        timings = self._timings(load_time, prompt_tokens, len(tokens), prompt_time, end_time - (first_token_time or end_time))
+        final = {"done": True, "done_reason": "stop", **timings, **(final_fields or {})}
+
+        if response is None:
+            return web.json_response({"model": body.get("model"), **wrap("".join(parts)), **final})
+
+        await response.write((json.dumps({"model": body.get("model"), **wrap(""), **final}) + "\n").encode("utf-8"))
+        return response
+
+    async def handle_ollama_generate(self, request: web.Request) -> web.Response:
+        """Ollama 原生生成 API：不含提示詞時只載入模型；keep_alive 為 0 時卸載模型"""
+        body = await request.json()
+        model = body.get("model")
+        if body.get("keep_alive") in (0, "0", "0s") and not body.get("prompt"):
+            self.loaded_models.pop(model, None)
+            return web.json_response({"model": model, "response": "", "done": True, "done_reason": "unload"})
+        if not body.get("prompt"):
+            load_time = await self._load_model(model)
+            return web.json_response({"model": model, "response": "", "done": True, "done_reason": "load",
+                                      "load_duration": int(load_time * 1e9)})
+        return await self._generate(request, self._ollama_generate)
+
+    async def _ollama_generate(self, request: web.Request, body: Dict[str, Any],
+                               load_time: float) -> web.StreamResponse:
+        # 帶有 context 時沿用已計算的前綴，只處理新的提示詞（系統提示詞只在第一輪套用）
+        context = body.get("context") or []
+        prompt = body.get("prompt", "") if context else body.get("system", "") + body.get("prompt", "")
+        prompt_tokens = len(prompt) // 4
+        tokens = self._tokens()
+        # 模擬的 token 編號：原 context 加上本輪提示詞與回應
+        new_context = list(context) + [0] * (prompt_tokens + len(tokens))
+        return await self._ollama_native(
+            request, body, load_time, tokens, prompt_tokens,
+            lambda text: {"response": text}, {"context": new_context}
+        )
+
+    async def handle_tags(self, request: web.Request) -> web.Response:
+        """Ollama 模型列表"""
+        return web.json_response({"models": [{"name": name, "model": name} for name in self.models]})
+
+    async def handle_openai_models(self, request: web.Request) -> web.Response:
+        """OpenAI 相容的模型列表"""
+        return web.json_response({"data": [{"id": name} for name in self.models]})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        """目前的統計數據"""
+        return web.json_response(self.stats)
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """加入模擬服務的共用命令列參數"""
+    parser.add_argument("--ttft-distribution", choices=LatencyModel.DISTRIBUTIONS, default="fixed",
+                        help="首 token 延遲分布（預設: fixed）")
+    parser.add_argument("--ttft-mean", type=float, default=0.2, help="首 token 平均延遲秒數（預設: 0.2）")
+    parser.add_argument("--ttft-spread", type=float, default=0.0, help="首 token 延遲分散程度（預設: 0）")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="解碼速度（預設: 50）")
+    parser.add_argument("--prompt-tokens-per-sec", type=float, default=0.0,
+                        help="提示詞處理速度，0 表示不計提示詞處理時間（預設: 0）")
+    parser.add_argument("--response-tokens", type=int, default=40, help="每個回應的 token 數（預設: 40）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 錯誤比例（預設: 0）")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="429 回應比例（預設: 0）")
+    parser.add_argument("--max-slots", type=int, default=0, help="同時處理的請求上限，0 表示不限制（預設: 0）")
+    parser.add_argument("--reject-when-full", action="store_true", help="槽位已滿時回傳 429 而非排隊")
+    parser.add_argument("--load-time", type=float, default=0.0, help="模型首次被請求時的載入秒數（預設: 0）")
+    parser.add_argument("--max-loaded-models", type=int, default=0,
+                        help="同時載入的模型上限，超過時卸載最久未使用的模型，0 表示不限制（預設: 0）")
+
+def server_from_args(args: argparse.Namespace) -> MockLLMServer:
+    """依命令列參數建立模擬服務"""
+    return MockLLMServer(
+        ttft=LatencyModel(args.ttft_distribution, args.ttft_mean, args.ttft_spread),
+        tokens_per_sec=args.tokens_per_sec,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        max_slots=args.max_slots,
+        queue_when_full=not args.reject_when_full,
+        load_time=args.load_time,
+        max_loaded_models=args.max_loaded_models,
+        prompt_tokens_per_sec=args.prompt_tokens_per_sec
+    )
+
+async def serve(server: MockLLMServer, host: str, port: int):
+    """持續執行模擬服務直到中斷"""
+    base_url = await server.start(host, port)
+    print(f"模擬 LLM 服務已啟動: {base_url}")
+    print(f"使用方式: OLLAMA_BASE_URL={base_url} python main.py")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main():
+    """模擬服務入口點"""
+    parser = argparse.ArgumentParser(description="基準測試用的本機模擬 LLM 服務")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址（預設: 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=11435, help="監聽埠（預設: 11435）")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(server_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
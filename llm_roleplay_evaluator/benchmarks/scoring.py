@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+評分器微基準測試
+以固定亂數種子產生中英混合的回應語料（多種長度與對話歷史深度），
+量測各評分函式的單次呼叫延遲與每秒可評分的回應數，並與儲存的基準比較
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Tuple
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "scoring.json"
+
+# 回應長度（詞數）與對話歷史深度（輪數）
+RESPONSE_LENGTHS = {"short": 20, "medium": 100, "long": 400}
+HISTORY_DEPTHS = (0, 4, 16)
+
+# 低於此絕對差距（秒）的變化視為量測雜訊，不判定為退步
+MIN_REGRESSION_SECONDS = 1e-6
+
+CHINESE_WORDS = (
+    "我 覺得 今天 的 天氣 很 好 說真的 年輕 時候 常常 這樣 想 人生 最 重要 是 家人 "
+    "工作 壓力 有點 大 不過 慢慢 來 哎呀 你 知道 嗎 退休 以後 每天 種花 下棋 聊天"
+).split()
+ENGLISH_WORDS = (
+    "I think it's a wonderful day and I really enjoy talking with you honestly "
+    "my work has been stressful lately but wow I love painting and music as an AI assistant"
+).split()
+PUNCTUATION = ("，", "。", "！", "？", ".", "!", "?", "...")
+
+def generate_response(rng: random.Random, length: int) -> str:
+    """產生指定詞數的中英混合回應"""
+    words = []
+    for index in range(length):
+        pool = CHINESE_WORDS if rng.random() < 0.6 else ENGLISH_WORDS
+        words.append(rng.choice(pool))
+        if index % 12 == 11:
+            words.append(rng.choice(PUNCTUATION))
+    return " ".join(words)
+
+def generate_history(rng: random.Random, depth: int) -> List[Dict[str, str]]:
+    """產生指定輪數的對話歷史"""
+    history = []
+    for _ in range(depth):
+        history.append({"role": "user", "content": generate_response(rng, 15)})
+        history.append({"role": "assistant", "content": generate_response(rng, 60)})
+    return history
+
+def time_calls(function: Callable, arguments: List[Tuple], repeat: int) -> float:
+    """重複量測整批呼叫，回傳最快一次的平均單次呼叫秒數（降低排程雜訊的影響）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for args in arguments:
+            function(*args)
+        best = min(best, (time.perf_counter() - start_time) / len(arguments))
+    return best
+
+def calibrate(repeat: int) -> float:
+    """量測固定的純 Python 工作量，用於換算不同機器間的速度差異"""
+    def workload():
+        total = 0
+        for value in range(200000):
+            total += value % 7
+        return total
+    return time_calls(workload, [()], repeat)
+
+def build_cases(corpus_size: int, seed: int) -> List[Tuple[str, Callable, List[Tuple]]]:
+    """建立所有量測項目（名稱、函式、呼叫參數列表）"""
+    from compare_prompts import evaluate_response
+    from evaluator import RoleplayScorer
+    from prompts import get_scenario_prompt
+
+    rng = random.Random(seed)
+    scorer = RoleplayScorer()
+    scenario = get_scenario_prompt("optimistic_elderly")
+    profile = scorer.get_profile(scenario["system_prompt"])
+
+    cases = []
+    for length_name, length in RESPONSE_LENGTHS.items():
+        responses = [generate_response(rng, length) for _ in range(corpus_size)]
+        cases.append((
+            f"role_consistency/{length_name}",
+            scorer.calculate_role_consistency_score,
+            [(response, profile) for response in responses]
+        ))
+        cases.append((
+            f"fluency/{length_name}",
+            scorer.calculate_fluency_score,
+            [(response,) for response in responses]
+        ))
+        cases.append((
+            f"evaluate_response/{length_name}",
+            evaluate_response,
+            [(response, scenario["name"]) for response in responses]
+        ))
+        for depth in HISTORY_DEPTHS:
+            histories = [generate_history(rng, depth) for _ in range(corpus_size)]
+            cases.append((
+                f"context_coherence/{length_name}/history{depth}",
+                scorer.calculate_context_coherence_score,
+                list(zip(histories, responses))
+            ))
+    return cases
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]], calibration: float,
+                          baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """與基準比較（依校準時間換算機器速度差異），回傳變慢超過容許範圍的項目說明"""
+    scale = calibration / baseline["calibration"] if baseline.get("calibration") else 1.0
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            continue
+        expected = reference["seconds_per_call"] * scale
+        if (result["seconds_per_call"] > expected * (1 + tolerance)
+                and result["seconds_per_call"] - expected > MIN_REGRESSION_SECONDS):
+            regressions.append(
+                f"{name}: {result['seconds_per_call'] * 1e6:.1f}µs/次，基準換算後 {expected * 1e6:.1f}µs/次"
+                f"（容許 +{tolerance:.0%}）"
+            )
+    return regressions
+
+def main():
+    """評分器微基準測試入口點"""
+    parser = argparse.ArgumentParser(description="評分器微基準測試")
+    parser.add_argument("--corpus-size", type=int, default=50, help="每種長度的回應數（預設: 50）")
+    parser.add_argument("--repeat", type=int, default=5, help="每個項目的重複量測次數（預設: 5）")
+    parser.add_argument("--seed", type=int, default=42, help="語料亂數種子（預設: 42）")
+    parser.add_argument("--filter", help="只執行名稱包含此字串的項目")
+    parser.add_argument(
+        "--baseline",
+        default=str(DEFAULT_BASELINE),
+        help=f"基準檔路徑（預設: {DEFAULT_BASELINE.relative_to(project_root)}）"
+    )
+    parser.add_argument("--update-baseline", action="store_true", help="以本次結果覆寫基準檔")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.3,
+        help="相對基準的容許變慢幅度（預設: 0.3，即 30%%）"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="data/benchmarks",
+        help="結果輸出目錄（預設: data/benchmarks）"
+    )
+    args = parser.parse_args()
+
+    cases = build_cases(args.corpus_size, args.seed)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case[0]]
+
+    calibration = calibrate(args.repeat)
+    results = {}
+    print(f"{'項目':<40}{'µs/次':>12}{'回應/秒':>12}")
+    for name, function, arguments in cases:
+        # 先呼叫一次暖機（建立快取、載入延遲初始化的資源）
+        function(*arguments[0])
+        seconds_per_call = time_calls(function, arguments, args.repeat)
+        results[name] = {
+            "seconds_per_call": seconds_per_call,
+            "responses_per_sec": 1.0 / seconds_per_call if seconds_per_call else 0.0
+        }
+        print(f"{name:<40}{seconds_per_call * 1e6:>12.1f}{results[name]['responses_per_sec']:>12.0f}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "corpus_size": args.corpus_size,
+        "seed": args.seed,
+        "calibration": calibration,
+        "cases": results
+    }
+
+    output_dir = project_root / args.output_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"scoring_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已儲存至: {output_file}")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基準已更新: {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print("找不到基準檔，略過比較（可使用 --update-baseline 建立）")
+        return
+
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    regressions = compare_with_baseline(results, calibration, baseline, args.tolerance)
+    if regressions:
+        print("評分速度退步:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"評分速度符合基準（{len(results)} 個項目）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+CLI 入口點啟動時間基準測試
+以全新的 Python 行程（-X importtime）量測每個入口點的冷啟動時間與匯入時間，
+並檢查不需要評分或呼叫模型的指令是否載入了重量級套件
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any
+
+project_root = Path(__file__).resolve().parent.parent
+
+# 入口點名稱 -> 指令列參數
+ENTRY_POINTS = {
+    "main --help": ["main.py", "--help"],
+    "main --list-scenarios": ["main.py", "--list-scenarios"],
+    "compare_prompts history": ["compare_prompts.py", "history"],
+    "rescore --help": ["rescore.py", "--help"]
+}
+
+# 校準用的固定匯入工作量（只用標準函式庫），用於換算不同機器間的匯入速度差異
+CALIBRATION_ARGS = ["-c", "import argparse, asyncio, json, sqlite3, email.mime.multipart, http.client"]
+
+# 輕量指令不應載入的重量級套件
+HEAVY_MODULES = ("sklearn", "scipy", "numpy", "pandas", "aiohttp")
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "startup.json"
+
+def _parse_importtime(stderr: str) -> Dict[str, Any]:
+    """解析 -X importtime 的輸出，取得總匯入時間與載入的頂層套件"""
+    total_us = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 縮排層級為 0 的項目代表直接匯入，其累計時間加總即為總匯入時間
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+        modules.add(name.strip().split(".")[0])
+    return {"import_time": total_us / 1e6, "modules": modules}
+
+def measure_entry_point(args: List[str], repeat: int) -> Dict[str, Any]:
+    """以全新行程重複執行入口點，回傳啟動時間的中位數與匯入時間的最小值
+
+    匯入時間用於與基準比較，取最小值較不受同時執行的其他行程干擾。
+    """
+    wall_times, import_times = [], []
+    heavy_modules = set()
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", *args],
+            cwd=project_root, env=env, capture_output=True, text=True
+        )
+        wall_times.append(time.perf_counter() - start_time)
+        parsed = _parse_importtime(completed.stderr)
+        import_times.append(parsed["import_time"])
+        heavy_modules |= parsed["modules"] & set(HEAVY_MODULES)
+
+    return {
+        "wall_time": statistics.median(wall_times),
+        "import_time": min(import_times),
+        "heavy_modules": sorted(heavy_modules)
+    }
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], calibration: float,
+                          baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """與基準比較（匯入時間依校準時間換算機器速度差異），回傳超出容許範圍的項目說明
+
+    基準沒有校準時間時（舊版基準檔）無法換算，只檢查重量級套件。
+    """
+    scale = calibration / baseline["calibration"] if baseline.get("calibration") else None
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("entry_points", {}).get(name)
+        if reference is None:
+            continue
+        if scale is not None:
+            expected = reference["import_time"] * scale
+            if result["import_time"] > expected * (1 + tolerance):
+                regressions.append(
+                    f"{name}: 匯入時間 {result['import_time']:.3f}s 超過基準換算後 {expected:.3f}s"
+                    f"（容許 +{tolerance:.0%}）"
+                )
+        new_modules = set(result["heavy_modules"]) - set(reference.get("heavy_modules", []))
+        if new_modules:
+            regressions.append(f"{name}: 新載入重量級套件 {', '.join(sorted(new_modules))}")
+    return regressions
+
+def main():
+    """啟動時間基準測試入口點"""
+    parser = argparse.ArgumentParser(description="量測 CLI 入口點的冷啟動時間")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="每個入口點的執行次數（預設: 5）"
+    )
+    parser.add_argument(
+        "--baseline",
+        default=str(DEFAULT_BASELINE),
+        help=f"基準檔路徑（預設: {DEFAULT_BASELINE.relative_to(project_root)}）"
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="以本次結果覆寫基準檔"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="匯入時間相對基準的容許增幅（預設: 0.5，即 50%%）"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="data/benchmarks",
+        help="結果輸出目錄（預設: data/benchmarks）"
+    )
+
+    args = parser.parse_args()
+
+    calibration = measure_entry_point(CALIBRATION_ARGS, args.repeat * len(ENTRY_POINTS))["import_time"]
+    print(f"校準匯入時間: {calibration:.3f}s")
+
+    results = {}
+    print(f"{'入口點':<28}{'啟動時間':>10}{'匯入時間':>10}  重量級套件")
+    for name, entry_args in ENTRY_POINTS.items():
+        result = measure_entry_point(entry_args, args.repeat)
+        results[name] = result
+        heavy = ", ".join(result["heavy_modules"]) or "-"
+        print(f"{name:<28}{result['wall_time']:>9.3f}s{result['import_time']:>9.3f}s  {heavy}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "calibration": calibration,
+        "entry_points": results
+    }
+
+    output_dir = project_root / args.output_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已儲存至: {output_file}")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基準已更新: {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print("找不到基準檔，略過比較（可使用 --update-baseline 建立）")
+        return
+
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    if not baseline.get("calibration"):
+        print("基準檔沒有校準時間，匯入時間僅供參考，只檢查重量級套件（可使用 --update-baseline 重建）")
+    regressions = compare_with_baseline(results, calibration, baseline, args.tolerance)
+    if regressions:
+        print("啟動時間退步:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("啟動時間符合基準")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+測試執行器端到端吞吐量基準測試
+在同一個事件迴圈啟動模擬 LLM 服務，以不同並行數執行全面測試，
+量測吞吐量、相對於單一並行的加速比，以及執行器本身（客戶端、串流解析、評分）的額外開銷
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_server import MockLLMServer, add_server_arguments, server_from_args
+
+async def run_level(server: MockLLMServer, concurrency: int, scenarios: List[str],
+                    scoring_workers: int) -> Dict[str, Any]:
+    """以指定並行數執行一次全面測試並回傳量測結果"""
+    from evaluator import RoleplayTestRunner
+
+    server.reset_stats()
+    runner = RoleplayTestRunner(cache_mode="bypass", scoring_workers=scoring_workers)
+    try:
+        # 執行器的逐輪輸出與基準測試無關
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            result = await runner.run_comprehensive_test(scenarios=scenarios, concurrency=concurrency)
+            wall_time = time.perf_counter() - start_time
+    finally:
+        await runner.close()
+
+    response_times = [
+        round_result["response_time"]
+        for scenario_result in result["scenario_results"].values() if "error" not in scenario_result
+        for round_result in scenario_result["round_results"] if round_result["response_time"]
+    ]
+    completed = server.stats["completed"]
+    server_time = server.stats["service_time"] / completed if completed else 0.0
+    client_time = statistics.mean(response_times) if response_times else 0.0
+
+    return {
+        "concurrency": concurrency,
+        "requests": completed,
+        "throttled": server.stats["throttled"],
+        "errors": server.stats["errors"],
+        "peak_active": server.stats["peak_active"],
+        "wall_time": wall_time,
+        "requests_per_sec": completed / wall_time if wall_time else 0.0,
+        "mean_response_time": client_time,
+        "mean_service_time": server_time,
+        # 客戶端量到的回應時間扣除服務端實際處理時間，即每個請求在執行器側的開銷
+        "overhead_per_request": client_time - server_time
+    }
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """啟動模擬服務並依序量測各並行數"""
+    server = server_from_args(args)
+    base_url = await server.start()
+    os.environ["LLM_PROVIDER"] = "ollama"
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    os.environ["TEST_ROUNDS"] = str(args.rounds)
+
+    from prompts import get_all_scenarios
+    scenarios = get_all_scenarios()
+
+    levels = []
+    try:
+        for concurrency in args.concurrency:
+            level = await run_level(server, concurrency, scenarios, args.scoring_workers)
+            levels.append(level)
+    finally:
+        await server.stop()
+
+    baseline_rate = levels[0]["requests_per_sec"] if levels else 0.0
+    for level in levels:
+        level["speedup"] = level["requests_per_sec"] / baseline_rate if baseline_rate else 0.0
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "scenarios": len(scenarios),
+        "rounds": args.rounds,
+        "scoring_workers": args.scoring_workers,
+        "server": {
+            "ttft_distribution": args.ttft_distribution,
+            "ttft_mean": args.ttft_mean,
+            "ttft_spread": args.ttft_spread,
+            "tokens_per_sec": args.tokens_per_sec,
+            "response_tokens": args.response_tokens,
+            "error_rate": args.error_rate,
+            "throttle_rate": args.throttle_rate,
+            "max_slots": args.max_slots,
+            "load_time": args.load_time,
+            "max_loaded_models": args.max_loaded_models
+        },
+        "levels": levels
+    }
+
+def main():
+    """吞吐量基準測試入口點"""
+    parser = argparse.ArgumentParser(description="以模擬 LLM 服務量測測試執行器的吞吐量")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(v) for v in value.split(",")],
+        default=[1, 2, 4],
+        help="要量測的並行場景數，以逗號分隔（預設: 1,2,4）"
+    )
+    parser.add_argument("--rounds", type=int, default=3, help="每個場景的測試輪數（預設: 3）")
+    parser.add_argument(
+        "--scoring-workers",
+        type=int,
+        default=2,
+        help="評分行程池的工作行程數，0 表示在事件迴圈內直接評分（預設: 2）"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="data/benchmarks",
+        help="結果輸出目錄（預設: data/benchmarks）"
+    )
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    output_dir = project_root / args.output_dir
+    # 執行器會寫入 data/results 與結果索引，改在暫存目錄執行以免混入正式結果
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            report = asyncio.run(run_benchmark(args))
+        finally:
+            os.chdir(project_root)
+
+    print(f"{'並行數':>6}{'請求數':>8}{'耗時':>9}{'請求/秒':>10}{'加速比':>8}{'回應時間':>10}{'服務時間':>10}{'開銷':>9}{'429':>6}")
+    for level in report["levels"]:
+        print(f"{level['concurrency']:>6}{level['requests']:>8}{level['wall_time']:>8.2f}s"
+              f"{level['requests_per_sec']:>10.2f}{level['speedup']:>7.2f}x"
+              f"{level['mean_response_time'] * 1000:>8.1f}ms{level['mean_service_time'] * 1000:>8.1f}ms"
+              f"{level['overhead_per_request'] * 1000:>7.1f}ms{level['throttled']:>6}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f"throughput_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已儲存至: {output_file}")
+
+if __name__ == "__main__":
+    main()
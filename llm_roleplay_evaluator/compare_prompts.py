@@ -1,8 +1,6 @@
 """比較舊版和新版提示詞的角色扮演效果 - 帶完整日誌記錄"""
 
 import asyncio
-import json
-import os
 import sys
 from datetime import datetime
 from typing import Dict, List
@@ -12,8 +10,11 @@ from config.settings import config
 # 修正 Windows 控制台編碼問題
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding='utf-8')
-from providers.ollama_client import OllamaClient
-from providers.openrouter_client import OpenRouterClient
+from providers.cache import CachedProvider, ResponseCache
+from evaluator.matcher import PatternSets
+from evaluator.catalog import ResultCatalog
+from evaluator.result_log import BackgroundWriter, JsonlResultLog
+from evaluator.token_usage import estimate_tokens
 from prompts.roleplay_prompts import ROLEPLAY_SCENARIOS as OLD_SCENARIOS
 from prompts.roleplay_prompts_v2 import ROLEPLAY_SCENARIOS as NEW_SCENARIOS
 
@@ -24,7 +25,7 @@ LOG_DIR.mkdir(parents=True, exist_ok=True)
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
 class TestLogger:
-    """測試日誌記錄器"""
+    """測試日誌記錄器（日誌與 JSONL 結果皆由背景執行緒附加寫入）"""
 
     def __init__(self, model_name: str, test_type: str):
         self.model_name = model_name.replace(':', '_').replace('/', '_')
@@ -34,15 +35,20 @@ class TestLogger:
 
         # 創建本次測試的日誌檔
         self.log_file = LOG_DIR / f"{self.session_id}.log"
-        self.json_file = RESULTS_DIR / f"{self.session_id}.json"
-
-        self.test_results = {
+        self.json_file = RESULTS_DIR / f"{self.session_id}.jsonl"
+        self._log_writer = BackgroundWriter(self.log_file)
+
+        # 每筆結果即時附加一行 (以防程式中斷)，只在記憶體保留統計所需的分數
+        self.start_time = datetime.now().isoformat()
+        self.total_tests = 0
+        self.scores: List[float] = []
+        self.result_log = JsonlResultLog(self.json_file, {
             "session_id": self.session_id,
             "model_name": model_name,
             "test_type": test_type,
-            "start_time": datetime.now().isoformat(),
-            "tests": []
-        }
+            "provider": config.provider,
+            "start_time": self.start_time
+        })
 
         self.log(f"=== Test Session Started ===")
         self.log(f"Model: {model_name}")
@@ -53,49 +59,45 @@ class TestLogger:
     def log(self, message: str):
         """寫入日誌檔"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_line = f"[{timestamp}] {message}\n"
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_line)
+        self._log_writer.write(f"[{timestamp}] {message}\n")
         print(message)  # 同時輸出到控制台
 
     def add_test_result(self, result: dict):
         """添加單個測試結果"""
         result["timestamp"] = datetime.now().isoformat()
-        self.test_results["tests"].append(result)
-
-        # 即時寫入 JSON (以防程式中斷)
-        self._save_json()
+        self.total_tests += 1
+        if "evaluation" in result and "error" not in result:
+            self.scores.append(result["evaluation"]["score"])
 
-    def _save_json(self):
-        """儲存 JSON 結果"""
-        with open(self.json_file, 'w', encoding='utf-8') as f:
-            json.dump(self.test_results, f, ensure_ascii=False, indent=2)
+        self.result_log.add_test(result)
 
     def finalize(self):
         """完成測試,寫入總結"""
-        self.test_results["end_time"] = datetime.now().isoformat()
-        self.test_results["total_tests"] = len(self.test_results["tests"])
+        summary = {
+            "end_time": datetime.now().isoformat(),
+            "total_tests": self.total_tests
+        }
 
         # 計算統計
-        scores = [t["evaluation"]["score"] for t in self.test_results["tests"]
-                  if "evaluation" in t and "error" not in t]
-
-        if scores:
-            self.test_results["statistics"] = {
-                "average_score": sum(scores) / len(scores),
-                "max_score": max(scores),
-                "min_score": min(scores),
-                "successful_tests": len(scores),
-                "failed_tests": len(self.test_results["tests"]) - len(scores)
+        if self.scores:
+            summary["statistics"] = {
+                "average_score": sum(self.scores) / len(self.scores),
+                "max_score": max(self.scores),
+                "min_score": min(self.scores),
+                "successful_tests": len(self.scores),
+                "failed_tests": self.total_tests - len(self.scores)
             }
 
-        self._save_json()
+        self.result_log.finalize(summary)
+        catalog = ResultCatalog(config.result_catalog_path)
+        catalog.record_file(self.json_file)
+        catalog.close()
 
         self.log("\n" + "="*80)
         self.log("=== Test Session Completed ===")
-        if "statistics" in self.test_results:
-            stats = self.test_results["statistics"]
-            self.log(f"Total Tests: {self.test_results['total_tests']}")
+        if "statistics" in summary:
+            stats = summary["statistics"]
+            self.log(f"Total Tests: {summary['total_tests']}")
             self.log(f"Successful: {stats['successful_tests']}")
             self.log(f"Failed: {stats['failed_tests']}")
             self.log(f"Average Score: {stats['average_score']:.1f}/100")
@@ -104,6 +106,25 @@ class TestLogger:
         self.log(f"  Log: {self.log_file}")
         self.log(f"  JSON: {self.json_file}")
         self.log("="*80)
+        self._log_writer.close()
+
+
+def create_client(model_name: str):
+    """建立 LLM 客戶端（依設定加上回應快取）"""
+    # 客戶端依賴 aiohttp，只在實際呼叫模型時才匯入（查看歷史記錄不需要）
+    from providers import OllamaClient, OpenRouterClient
+
+    config.validate()
+    if config.provider == "ollama":
+        client = OllamaClient(config.ollama_base_url, model_name,
+                              api=config.ollama_api, keep_alive=config.ollama_keep_alive)
+    else:
+        client = OpenRouterClient(config.openrouter_api_key, model_name)
+
+    if config.response_cache_mode != "bypass":
+        cache = ResponseCache(config.response_cache_path, max_bytes=config.response_cache_max_mb * 1024 * 1024)
+        client = CachedProvider(client, cache, mode=config.response_cache_mode)
+    return client
 
 
 async def test_prompt_version(client, scenario_data: dict, version: str, logger: TestLogger) -> dict:
@@ -124,12 +145,25 @@ async def test_prompt_version(client, scenario_data: dict, version: str, logger:
     logger.log(scenario_data["conversation_starter"])
 
     try:
-        start_time = datetime.now()
-        response = await client.chat_completion(messages=messages)
-        response_time = (datetime.now() - start_time).total_seconds()
+        response, latency = await client.timed_stream_completion(messages)
+        response_time = latency["response_time"]
 
-        logger.log(f"\n--- Response (took {response_time:.2f}s) ---")
+        if latency.get("cache_hit"):
+            logger.log("\n--- Response (cache hit) ---")
+        else:
+            logger.log(f"\n--- Response (took {response_time:.2f}s) ---")
         logger.log(response)
+        if latency["time_to_first_token"] is not None:
+            logger.log(f"  Time to first token: {latency['time_to_first_token']:.2f}s")
+        if latency["decode_tokens_per_sec"] is not None:
+            logger.log(f"  Decode speed: {latency['decode_tokens_per_sec']:.1f} tokens/s")
+        server_timings = latency.get("server_timings")
+        if server_timings and server_timings.get("prompt_eval_duration") is not None:
+            logger.log(f"  Prompt eval: {server_timings['prompt_eval_count']} tokens in "
+                       f"{server_timings['prompt_eval_duration']:.2f}s")
+        usage = latency.get("usage")
+        if usage:
+            logger.log(f"  Token usage: {usage['prompt_tokens']} prompt / {usage['completion_tokens']} completion")
         logger.log("-" * 60)
 
         # 評估回應
@@ -140,15 +174,22 @@ async def test_prompt_version(client, scenario_data: dict, version: str, logger:
         logger.log(f"  No AI markers: {not evaluation['has_ai_markers']}")
         logger.log(f"  First person: {evaluation['uses_first_person']}")
         logger.log(f"  Has personality: {evaluation['has_personality']}")
-        logger.log(f"  Word count: {evaluation['word_count']}")
+        logger.log(f"  Length: {evaluation['token_count']} tokens (estimated)")
 
         result = {
             "version": version,
             "scenario": scenario_data["name"],
             "response": response,
             "response_time_seconds": response_time,
+            "cache_hit": latency.get("cache_hit", False),
+            "time_to_first_token": latency["time_to_first_token"],
+            "inter_token_latency": latency["inter_token_latency"],
+            "decode_tokens_per_sec": latency["decode_tokens_per_sec"],
+            "server_timings": latency.get("server_timings"),
+            "usage": latency.get("usage"),
             "evaluation": evaluation,
             "system_prompt_length": len(scenario_data["system_prompt"]),
+            "system_prompt_tokens": estimate_tokens(scenario_data["system_prompt"]),
             "user_message": scenario_data["conversation_starter"]
         }
 
@@ -163,28 +204,45 @@ async def test_prompt_version(client, scenario_data: dict, version: str, logger:
         }
 
 
+# AI 自我指涉標記
+AI_MARKERS = [
+    "as an ai", "as a language model", "i'm an ai",
+    "i am an ai", "i cannot", "i don't have personal",
+    "作為ai", "作為語言模型", "我是ai", "我是一個ai"
+]
+
+# 個性標記
+PERSONALITY_MARKERS = ["*", "...", "!", "oh", "wow", "haha", "hmm", "ah", "um"]
+
+# 兩組標記共用一個比對器，每個回應只掃描一次
+RESPONSE_MARKERS = PatternSets({
+    "ai_markers": AI_MARKERS,
+    "personality_markers": PERSONALITY_MARKERS
+})
+
+
 def evaluate_response(response: str, character_name: str) -> dict:
     """評估回應品質"""
     response_lower = response.lower()
+    marker_hits = RESPONSE_MARKERS.scan(response_lower)
 
     # 檢查 AI 自我指涉
-    ai_markers = [
-        "as an ai", "as a language model", "i'm an ai",
-        "i am an ai", "i cannot", "i don't have personal",
-        "作為ai", "作為語言模型", "我是ai", "我是一個ai"
-    ]
-    has_ai_markers = any(marker in response_lower for marker in ai_markers)
+    has_ai_markers = any(marker_hits["ai_markers"])
 
     # 檢查第一人稱使用
     uses_first_person = " i " in response_lower or response_lower.startswith("i ")
 
     # 檢查個性標記
-    personality_markers = ["*", "...", "!", "oh", "wow", "haha", "hmm", "ah", "um"]
-    has_personality_markers = any(marker in response_lower for marker in personality_markers)
+    has_personality_markers = any(marker_hits["personality_markers"])
 
-    # 長度檢查
-    word_count = len(response.split())
-    appropriate_length = 30 < word_count < 200
+    # 長度檢查（以 token 估算，以空白切詞會把整段中文算成一個詞）
+    # 原本的範圍是 30～200 個詞；英文散文以 estimate_tokens 估算約每詞 1.4～1.7 個 token
+    # （拉丁字母詞每 4 字元一個 token，標點另計），故取 50～320 作為近似換算。
+    # 這只是近似：長度接近邊界的英文回應判定可能與舊的詞數規則不同
+    # （以 20～220 詞的英文散文隨機抽樣約 5% 不一致，含大量程式識別字的文字可達 20% 以上），
+    # 中文回應則不再因整段只算一個詞而判定過短
+    token_count = estimate_tokens(response)
+    appropriate_length = 50 < token_count < 320
 
     # 評分
     score = 0
@@ -212,14 +270,14 @@ def evaluate_response(response: str, character_name: str) -> dict:
         score += 20
         reasons.append("+20: Appropriate length")
     else:
-        reasons.append(f" 0: Length issue ({word_count} words)")
+        reasons.append(f" 0: Length issue ({token_count} tokens)")
 
     return {
         "score": score,
         "has_ai_markers": has_ai_markers,
         "uses_first_person": uses_first_person,
         "has_personality": has_personality_markers,
-        "word_count": word_count,
+        "token_count": token_count,
         "appropriate_length": appropriate_length,
         "scoring_breakdown": reasons
     }
@@ -230,16 +288,14 @@ async def compare_prompts(model_name: str):
     logger = TestLogger(model_name, "prompt_comparison")
 
     # 初始化客戶端
-    if config.provider == "ollama":
-        client = OllamaClient(config.ollama_base_url, model_name)
-    else:
-        client = OpenRouterClient(config.openrouter_api_key, model_name)
+    client = create_client(model_name)
 
     # 健康檢查
     logger.log("Performing health check...")
     if not await client.health_check():
         logger.log("[FAILED] Client health check failed!")
         logger.finalize()
+        await client.close()
         return
 
     logger.log("[OK] Client health check passed\n")
@@ -263,7 +319,6 @@ async def compare_prompts(model_name: str):
                 logger
             )
             logger.add_test_result(old_result)
-            await asyncio.sleep(2)
 
         # 測試新版
         if new_key in NEW_SCENARIOS:
@@ -277,9 +332,46 @@ async def compare_prompts(model_name: str):
                 logger
             )
             logger.add_test_result(new_result)
-            await asyncio.sleep(2)
+
+        if old_key in OLD_SCENARIOS and new_key in NEW_SCENARIOS:
+            log_prompt_overhead(logger, old_result, new_result)
 
     logger.finalize()
+    await client.close()
+
+
+def log_prompt_overhead(logger: TestLogger, old_result: dict, new_result: dict):
+    """記錄新舊版本的系統提示詞 token 開銷（有服務端用量時一併比較實際提示詞 tokens）"""
+    logger.log("\n--- System Prompt Overhead ---")
+    for label, result in (("OLD", old_result), ("NEW", new_result)):
+        if "error" in result:
+            logger.log(f"  {label}: failed")
+            continue
+        line = f"  {label}: ~{result['system_prompt_tokens']} system prompt tokens (estimated)"
+        if result.get("usage"):
+            line += f", {result['usage']['prompt_tokens']} prompt tokens reported"
+        logger.log(line)
+
+
+def print_prompt_token_overhead():
+    """比較新舊版本所有場景的系統提示詞 token 數（粗估，不需要呼叫模型）"""
+    print("\n" + "="*80)
+    print("System Prompt Token Overhead (estimated)")
+    print("="*80)
+
+    averages = {}
+    for label, scenarios in (("OLD (Chinese, verbose)", OLD_SCENARIOS), ("NEW (English, concise)", NEW_SCENARIOS)):
+        print(f"\n{label}:")
+        counts = []
+        for key, scenario in scenarios.items():
+            tokens = estimate_tokens(scenario["system_prompt"])
+            counts.append(tokens)
+            print(f"  {key:<28} {tokens:>6} tokens")
+        averages[label] = sum(counts) / len(counts)
+        print(f"  {'average':<28} {averages[label]:>6.0f} tokens")
+
+    old_average, new_average = averages.values()
+    print(f"\nEach round re-sends the system prompt: OLD costs {old_average / new_average:.1f}x the prompt tokens of NEW")
 
 
 async def test_all_new_scenarios(model_name: str):
@@ -287,15 +379,13 @@ async def test_all_new_scenarios(model_name: str):
     logger = TestLogger(model_name, "all_new_scenarios")
 
     # 初始化客戶端
-    if config.provider == "ollama":
-        client = OllamaClient(config.ollama_base_url, model_name)
-    else:
-        client = OpenRouterClient(config.openrouter_api_key, model_name)
+    client = create_client(model_name)
 
     logger.log("Performing health check...")
     if not await client.health_check():
         logger.log("[FAILED] Client health check failed!")
         logger.finalize()
+        await client.close()
         return
 
     logger.log("[OK] Client health check passed\n")
@@ -313,43 +403,38 @@ async def test_all_new_scenarios(model_name: str):
             logger
         )
         logger.add_test_result(result)
-        await asyncio.sleep(2)
 
     logger.finalize()
+    await client.close()
 
 
 def view_historical_logs(model_name: str = None, limit: int = 10):
-    """查看歷史測試日誌"""
+    """查看歷史測試日誌（讀取結果索引，不載入結果檔）"""
     print("\n" + "="*80)
     print("Historical Test Logs")
     print("="*80)
 
-    json_files = sorted(RESULTS_DIR.glob("*.json"), key=os.path.getmtime, reverse=True)
-
-    if model_name:
-        model_safe = model_name.replace(':', '_').replace('/', '_')
-        json_files = [f for f in json_files if model_safe in f.name]
+    catalog = ResultCatalog(config.result_catalog_path)
+    # 登錄索引建立前的結果與不經過 TestLogger 加入的結果檔（只讀取新增或修改過的檔案）
+    catalog.sync(RESULTS_DIR)
+    # 與舊版依檔名篩選相同，列出模型名稱包含 model_name 的記錄
+    runs = catalog.query(model_contains=model_name, kinds=["prompt_session"], limit=limit)
+    catalog.close()
 
-    json_files = json_files[:limit]
-
-    if not json_files:
+    if not runs:
         print("No historical logs found.")
         return
 
-    for idx, json_file in enumerate(json_files, 1):
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        print(f"\n{idx}. {json_file.name}")
-        print(f"   Model: {data['model_name']}")
-        print(f"   Time: {data['start_time']}")
-        print(f"   Tests: {data['total_tests']}")
+    for idx, run in enumerate(runs, 1):
+        print(f"\n{idx}. {Path(run['path']).name}")
+        print(f"   Model: {run['model']}")
+        print(f"   Time: {run['timestamp']}")
+        print(f"   Tests: {run['total_tests']}")
 
-        if "statistics" in data:
-            stats = data["statistics"]
-            print(f"   Avg Score: {stats['average_score']:.1f}/100")
-            print(f"   Range: {stats['min_score']}-{stats['max_score']}")
-            print(f"   Success Rate: {stats['successful_tests']}/{data['total_tests']}")
+        if run["overall_score"] is not None:
+            print(f"   Avg Score: {run['overall_score']:.1f}/100")
+            print(f"   Range: {run['min_score']:g}-{run['max_score']:g}")
+            print(f"   Success Rate: {run['successful_tests']}/{run['total_tests']}")
 
 
 if __name__ == "__main__":
@@ -359,18 +444,22 @@ if __name__ == "__main__":
     # python compare_prompts.py compare [model_name]   - 比較新舊提示詞
     # python compare_prompts.py all [model_name]        - 測試所有新場景
     # python compare_prompts.py history [model_name]    - 查看歷史記錄
+    # python compare_prompts.py tokens                  - 比較新舊系統提示詞的 token 開銷
 
     if len(sys.argv) < 2:
         print("Usage:")
         print("  python compare_prompts.py compare [model_name]")
         print("  python compare_prompts.py all [model_name]")
         print("  python compare_prompts.py history [model_name]")
+        print("  python compare_prompts.py tokens")
         sys.exit(1)
 
     mode = sys.argv[1]
     model = sys.argv[2] if len(sys.argv) > 2 else "gpt-oss:20b-cloud"
 
-    if mode == "history":
+    if mode == "tokens":
+        print_prompt_token_overhead()
+    elif mode == "history":
         view_historical_logs(model if len(sys.argv) > 2 else None)
     elif mode == "all":
         asyncio.run(test_all_new_scenarios(model))
@@ -378,4 +467,4 @@ if __name__ == "__main__":
         asyncio.run(compare_prompts(model))
     else:
         print(f"Unknown mode: {mode}")
-        print("Valid modes: compare, all, history")
+        print("Valid modes: compare, all, history, tokens")
@@ -1,14 +1,24 @@
 import os
-from dotenv import load_dotenv
 
 class LLMConfig:
-    """LLM 設定管理類別"""
+    """LLM 設定管理類別
+
+    .env 在第一次讀取設定時才載入；必要環境變數的驗證由 validate() 在建立 LLM 客戶端前執行，
+    因此只列出場景或查看歷史記錄時不需要完整的服務設定。
+    """
     
     def __init__(self):
-        load_dotenv()
-        self._validate_config()
+        self._env_loaded = False
+    
+    def _getenv(self, name: str, default=None):
+        """讀取環境變數（必要時先載入 .env）"""
+        if not self._env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            self._env_loaded = True
+        return os.getenv(name, default)
     
-    def _validate_config(self):
+    def validate(self):
         """驗證必要的環境變數"""
         provider = self.provider
         if provider == "ollama":
@@ -23,43 +33,138 @@ class LLMConfig:
     @property
     def provider(self):
         """取得服務提供者"""
-        return os.getenv("LLM_PROVIDER", "ollama").lower()
+        return self._getenv("LLM_PROVIDER", "ollama").lower()
     
     @property
     def ollama_base_url(self):
         """取得 Ollama 基礎 URL"""
-        return os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        return self._getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     
     @property
     def ollama_model(self):
         """取得 Ollama 模型名稱"""
-        return os.getenv("OLLAMA_MODEL", "gpt-oss:20b")
+        return self._getenv("OLLAMA_MODEL", "gpt-oss:20b")
+    
+    @property
+    def ollama_api(self):
+        """取得 Ollama 對話使用的 API（openai 為 OpenAI 相容端點，native 為原生 /api/chat）"""
+        return self._getenv("OLLAMA_API", "openai").lower()
+    
+    @property
+    def ollama_keep_alive(self):
+        """取得預先載入時設定的模型保留時間（例如 30m；空字串表示使用服務端預設值）"""
+        return self._getenv("OLLAMA_KEEP_ALIVE", "30m") or None
+    
+    @property
+    def ollama_preload(self):
+        """是否在測試前預先載入 Ollama 模型（載入時間與回應時間分開記錄）"""
+        return self._getenv("OLLAMA_PRELOAD", "true").lower() in ("1", "true", "yes")
+    
+    @property
+    def ollama_incremental_context(self):
+        """是否使用增量對話模式（服務端保留 context，每輪只送出新的使用者訊息）"""
+        return self._getenv("OLLAMA_INCREMENTAL_CONTEXT", "false").lower() in ("1", "true", "yes")
     
     @property
     def openrouter_api_key(self):
         """取得 OpenRouter API 金鑰"""
-        return os.getenv("OPENROUTER_API_KEY")
+        return self._getenv("OPENROUTER_API_KEY")
     
     @property
     def openrouter_model(self):
         """取得 OpenRouter 模型名稱"""
-        return os.getenv("OPENROUTER_MODEL", "gpt-oss:20b")
+        return self._getenv("OPENROUTER_MODEL", "gpt-oss:20b")
     
     @property
     def test_rounds(self):
         """取得測試輪數"""
-        return int(os.getenv("TEST_ROUNDS", "3"))
+        return int(self._getenv("TEST_ROUNDS", "3"))
     
+    @property
+    def test_concurrency(self):
+        """取得全面測試時同時執行的場景數"""
+        return int(self._getenv("TEST_CONCURRENCY", "1"))
+
+    @property
+    def scoring_workers(self):
+        """取得評分行程池的工作行程數（0 表示在事件迴圈內直接評分）"""
+        return int(self._getenv("SCORING_WORKERS", "0"))
+
+    @property
+    def history_strategy(self):
+        """取得對話歷史策略（full、sliding、first-last 或 summarize）"""
+        return self._getenv("HISTORY_STRATEGY", "full").lower()
+
+    @property
+    def history_token_budget(self):
+        """取得每輪提示詞的 token 預算（sliding 與 summarize 策略使用）"""
+        return int(self._getenv("HISTORY_TOKEN_BUDGET", "2000"))
+
+    @property
+    def history_keep_turns(self):
+        """取得 first-last 策略保留的最近輪數"""
+        return int(self._getenv("HISTORY_KEEP_TURNS", "4"))
+
     @property
     def max_tokens(self):
         """取得最大 token 數"""
-        return int(os.getenv("MAX_TOKENS", "500"))
+        return int(self._getenv("MAX_TOKENS", "500"))
     
     @property
     def temperature(self):
         """取得溫度參數"""
-        return float(os.getenv("TEMPERATURE", "0.7"))
+        return float(self._getenv("TEMPERATURE", "0.7"))
     
+    @property
+    def http_pool_size(self):
+        """取得 HTTP 連線池大小"""
+        return int(self._getenv("HTTP_POOL_SIZE", "10"))
+
+    @property
+    def http_timeout(self):
+        """取得 HTTP 請求逾時秒數"""
+        return float(self._getenv("HTTP_TIMEOUT", "60"))
+
+    @property
+    def http_connect_timeout(self):
+        """取得 HTTP 連線逾時秒數"""
+        return float(self._getenv("HTTP_CONNECT_TIMEOUT", "10"))
+
+    @property
+    def rate_limit_initial_concurrency(self):
+        """取得自適應限流的初始並行數"""
+        return int(self._getenv("RATE_LIMIT_INITIAL_CONCURRENCY", "4"))
+
+    @property
+    def rate_limit_max_concurrency(self):
+        """取得自適應限流的並行數上限"""
+        return int(self._getenv("RATE_LIMIT_MAX_CONCURRENCY", "16"))
+
+    @property
+    def rate_limit_max_retries(self):
+        """取得遭到限流時的最大重試次數"""
+        return int(self._getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+
+    @property
+    def response_cache_mode(self):
+        """取得回應快取模式（read-through、write-only 或 bypass）"""
+        return self._getenv("RESPONSE_CACHE_MODE", "bypass").lower()
+
+    @property
+    def response_cache_path(self):
+        """取得回應快取資料庫路徑"""
+        return self._getenv("RESPONSE_CACHE_PATH", "data/cache/responses.sqlite")
+
+    @property
+    def response_cache_max_mb(self):
+        """取得回應快取容量上限（MB）"""
+        return int(self._getenv("RESPONSE_CACHE_MAX_MB", "256"))
+
+    @property
+    def result_catalog_path(self):
+        """取得測試結果索引資料庫路徑"""
+        return self._getenv("RESULT_CATALOG_PATH", "data/results/catalog.sqlite")
+
     @property
     def current_model(self):
         """取得當前使用的模型名稱"""
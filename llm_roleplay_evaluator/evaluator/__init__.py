@@ -1,9 +1,33 @@
 # 評估器模組初始化檔案
-from .scoring import RoleplayScorer, calculate_overall_score
-from .test_runner import RoleplayTestRunner
+# 評分器依賴 scikit-learn 與 NumPy，載入成本高，因此在第一次存取時才匯入對應的子模組
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'RoleplayScorer': '.scoring',
+    'ScenarioProfile': '.scoring',
+    'calculate_overall_score': '.scoring',
+    'RoleplayTestRunner': '.test_runner',
+    'MatrixTarget': '.matrix',
+    'expand_targets': '.matrix',
+    'estimate_tokens': '.token_usage'
+}
 
 __all__ = [
     'RoleplayScorer',
+    'ScenarioProfile',
     'calculate_overall_score',
-    'RoleplayTestRunner'
-]
\ No newline at end of file
+    'RoleplayTestRunner',
+    'MatrixTarget',
+    'expand_targets',
+    'estimate_tokens'
+]
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
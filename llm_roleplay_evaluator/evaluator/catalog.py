@@ -0,0 +1,275 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Union
+
+from .result_log import load_session
+
+RESULT_KINDS = ("single", "comprehensive", "prompt_session")
+
+def load_result_file(path: Union[str, Path]) -> Dict[str, Any]:
+    """讀取結果檔（*.json 為單一 JSON，*.jsonl 為 TestLogger 的工作階段記錄）"""
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        return load_session(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _path_key(path: Union[str, Path]) -> str:
+    """索引鍵：結果檔的絕對路徑（以相對或絕對路徑、從不同工作目錄登錄同一檔案時只有一列）"""
+    return str(Path(path).resolve())
+
+def _result_files(results_dir: Path) -> List[Path]:
+    """結果目錄中的結果檔（*.json 與 *.jsonl）"""
+    return sorted(list(results_dir.glob("*.json")) + list(results_dir.glob("*.jsonl")))
+
+def summarize_result(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """從任一種結果格式擷取索引欄位
+
+    Returns:
+        run 資料列（含 "scenarios" 場景分數列表）；無法辨識的格式回傳 None
+    """
+    if "round_results" in data:
+        score = data.get("overall_average_score")
+        return {
+            "run_id": data["test_id"],
+            "kind": "single",
+            "model": data.get("model"),
+            "provider": data.get("provider"),
+            "timestamp": data.get("timestamp"),
+            "overall_score": score,
+            "success_rate": 1.0,
+            "total_tests": len(data["round_results"]),
+            "successful_tests": len(data["round_results"]),
+            "min_score": score,
+            "max_score": score,
+            "scenarios": [(data["scenario"], score)]
+        }
+
+    if "scenario_results" in data:
+        stats = data.get("overall_statistics", {})
+        scenarios = [
+            (scenario, result.get("overall_average_score"))
+            for scenario, result in data["scenario_results"].items()
+        ]
+        scores = [score for _, score in scenarios if score is not None]
+        return {
+            "run_id": data["comprehensive_test_id"],
+            "kind": "comprehensive",
+            "model": data.get("model"),
+            "provider": data.get("provider"),
+            "timestamp": data.get("timestamp"),
+            "overall_score": stats.get("overall_average_score"),
+            "success_rate": stats.get("success_rate"),
+            "total_tests": len(scenarios),
+            "successful_tests": len(scores),
+            "min_score": min(scores) if scores else None,
+            "max_score": max(scores) if scores else None,
+            "scenarios": scenarios
+        }
+
+    if "session_id" in data:
+        tests = data.get("tests", [])
+        stats = data.get("statistics", {})
+        total_tests = data.get("total_tests", len(tests))
+        # 同一場景重複測試時取最後一次的分數
+        scenario_scores = {}
+        for test in tests:
+            if "scenario" in test:
+                scenario_scores[test["scenario"]] = test.get("evaluation", {}).get("score")
+        return {
+            "run_id": data["session_id"],
+            "kind": "prompt_session",
+            "model": data.get("model_name"),
+            "provider": data.get("provider"),
+            "timestamp": data.get("start_time"),
+            "overall_score": stats.get("average_score"),
+            "success_rate": stats["successful_tests"] / total_tests if stats and total_tests else None,
+            "total_tests": total_tests,
+            "successful_tests": stats.get("successful_tests"),
+            "min_score": stats.get("min_score"),
+            "max_score": stats.get("max_score"),
+            "scenarios": list(scenario_scores.items())
+        }
+
+    return None
+
+class ResultCatalog:
+    """測試結果索引（SQLite）
+
+    每次儲存結果時更新，歷史查詢只讀索引而不必載入每個結果檔。
+    索引可隨時以 rebuild() 從結果目錄重建；sync() 只登錄新增或修改過的檔案（以修改時間判斷）。
+    """
+
+    # 索引結構版本（1: 以絕對路徑為鍵並記錄修改時間）
+    SCHEMA_VERSION = 1
+
+    COLUMNS = ("run_id", "kind", "model", "provider", "timestamp", "overall_score", "success_rate",
+               "total_tests", "successful_tests", "min_score", "max_score")
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 索引資料庫檔案路徑
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            # 舊版索引的鍵是未正規化的路徑且沒有修改時間；索引可由結果目錄重建，直接清除
+            self._conn.execute("DROP TABLE IF EXISTS runs")
+            self._conn.execute("DROP TABLE IF EXISTS run_scenarios")
+            self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "path TEXT PRIMARY KEY, mtime REAL, run_id TEXT NOT NULL, kind TEXT NOT NULL, "
+            "model TEXT, provider TEXT, timestamp TEXT, overall_score REAL, success_rate REAL, "
+            "total_tests INTEGER, successful_tests INTEGER, min_score REAL, max_score REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS run_scenarios ("
+            "path TEXT NOT NULL, scenario TEXT NOT NULL, score REAL, PRIMARY KEY (path, scenario))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_model ON runs (model, timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_run_scenarios_scenario ON run_scenarios (scenario)")
+        self._conn.commit()
+
+    def record(self, path: Union[str, Path], data: Dict[str, Any]) -> bool:
+        """登錄（或更新）一個結果檔
+
+        Returns:
+            是否為可辨識的結果格式
+        """
+        summary = summarize_result(data)
+        if summary is None:
+            return False
+        path = Path(path)
+        self._insert(_path_key(path), summary, path.stat().st_mtime if path.exists() else None)
+        self._conn.commit()
+        return True
+
+    def record_file(self, path: Union[str, Path]) -> bool:
+        """讀取結果檔並登錄"""
+        return self.record(path, load_result_file(path))
+
+    def _insert(self, path: str, summary: Dict[str, Any], mtime: Optional[float]):
+        """寫入 run 與場景資料列（不 commit）"""
+        placeholders = ", ".join("?" for _ in range(len(self.COLUMNS) + 2))
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO runs (path, mtime, {', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+            (path, mtime, *(summary[column] for column in self.COLUMNS))
+        )
+        self._conn.execute("DELETE FROM run_scenarios WHERE path = ?", (path,))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO run_scenarios (path, scenario, score) VALUES (?, ?, ?)",
+            [(path, scenario, score) for scenario, score in summary["scenarios"]]
+        )
+
+    def rebuild(self, results_dir: Union[str, Path]) -> Dict[str, int]:
+        """清除索引並從結果目錄中的 *.json 與 *.jsonl 重建
+
+        Returns:
+            {"indexed": 已登錄數, "skipped": 無法辨識或讀取失敗的檔案數}
+        """
+        self._conn.execute("DELETE FROM runs")
+        self._conn.execute("DELETE FROM run_scenarios")
+        counts = self.sync(results_dir)
+        return {"indexed": counts["indexed"], "skipped": counts["skipped"]}
+
+    def sync(self, results_dir: Union[str, Path]) -> Dict[str, int]:
+        """登錄結果目錄中新增或修改過的結果檔，並移除已刪除檔案的索引
+
+        不經過測試執行器產生的結果檔（例如從其他機器複製）也會出現在查詢中；
+        未變更的檔案只比對修改時間，不重新讀取。
+
+        Returns:
+            {"indexed": 新登錄或更新數, "removed": 移除數, "skipped": 無法辨識或讀取失敗的檔案數}
+        """
+        results_dir = Path(results_dir).resolve()
+        counts = {"indexed": 0, "removed": 0, "skipped": 0}
+        files = {_path_key(path): path for path in _result_files(results_dir)}
+        indexed = {
+            row["path"]: row["mtime"] for row in self._conn.execute("SELECT path, mtime FROM runs")
+            if Path(row["path"]).parent == results_dir
+        }
+
+        for key, path in files.items():
+            try:
+                mtime = path.stat().st_mtime
+                if indexed.get(key) == mtime:
+                    continue
+                summary = summarize_result(load_result_file(path))
+            except (OSError, ValueError, KeyError):
+                summary = None
+            if summary is None:
+                counts["skipped"] += 1
+                continue
+            self._insert(key, summary, mtime)
+            counts["indexed"] += 1
+
+        for key in indexed.keys() - files.keys():
+            self._conn.execute("DELETE FROM runs WHERE path = ?", (key,))
+            self._conn.execute("DELETE FROM run_scenarios WHERE path = ?", (key,))
+            counts["removed"] += 1
+        self._conn.commit()
+        return counts
+
+    def query(self, model: Optional[str] = None, model_contains: Optional[str] = None,
+              provider: Optional[str] = None, scenario: Optional[str] = None, kinds: Optional[Iterable[str]] = None,
+              since: Optional[str] = None, limit: Optional[int] = 10) -> List[Dict[str, Any]]:
+        """依條件查詢結果（依時間由新到舊）
+
+        Args:
+            model: 模型名稱（完全相符）
+            model_contains: 模型名稱包含此字串（SQL LIKE，不分大小寫，「_」可對應任一字元，
+                因此檔名安全形式的名稱如 gpt-oss_20b 也能對應 gpt-oss:20b）
+            provider: 服務提供者
+            scenario: 包含此場景的結果
+            kinds: 結果種類（single、comprehensive、prompt_session）
+            since: 只列出此 ISO 時間之後的結果
+            limit: 最多回傳筆數，None 表示不限制
+        """
+        conditions, params = [], []
+        if model is not None:
+            conditions.append("model = ?")
+            params.append(model)
+        if model_contains is not None:
+            conditions.append("model LIKE '%' || ? || '%'")
+            params.append(model_contains)
+        if provider is not None:
+            conditions.append("provider = ?")
+            params.append(provider)
+        if scenario is not None:
+            conditions.append("path IN (SELECT path FROM run_scenarios WHERE scenario = ?)")
+            params.append(scenario)
+        if kinds is not None:
+            kinds = list(kinds)
+            conditions.append(f"kind IN ({', '.join('?' for _ in kinds)})")
+            params.extend(kinds)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+
+        sql = "SELECT * FROM runs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def scenario_scores(self, path: Union[str, Path]) -> Dict[str, Optional[float]]:
+        """取得某個結果的各場景分數"""
+        rows = self._conn.execute("SELECT scenario, score FROM run_scenarios WHERE path = ?", (_path_key(path),))
+        return {row["scenario"]: row["score"] for row in rows}
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def close(self):
+        """關閉索引資料庫"""
+        self._conn.close()
@@ -0,0 +1,332 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Sequence, Set, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .catalog import load_result_file
+
+# 分割欄位：模型（檔名安全形式）與執行日期
+PARTITION_COLUMNS = ["model", "date"]
+
+# 所有結果格式共用的欄位結構（各檔案結構一致，讀取時才能合併；不適用的欄位為 null）
+ROUND_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("run_kind", pa.string()),
+    ("source_file", pa.string()),
+    ("model", pa.string()),
+    ("model_name", pa.string()),
+    ("provider", pa.string()),
+    ("date", pa.string()),
+    ("run_timestamp", pa.string()),
+    ("scenario", pa.string()),
+    ("prompt_version", pa.string()),
+    ("round", pa.int32()),
+    ("sample", pa.int32()),
+    ("user_message", pa.string()),
+    ("model_response", pa.string()),
+    ("response_length", pa.int32()),
+    ("response_time", pa.float64()),
+    ("time_to_first_token", pa.float64()),
+    ("inter_token_latency", pa.float64()),
+    ("decode_tokens_per_sec", pa.float64()),
+    ("prompt_tokens", pa.int64()),
+    ("completion_tokens", pa.int64()),
+    ("cached_tokens", pa.int64()),
+    ("cache_hit", pa.bool_()),
+    ("score_role_consistency", pa.float64()),
+    ("score_fluency", pa.float64()),
+    ("score_context_coherence", pa.float64()),
+    ("overall_score", pa.float64()),
+    ("evaluation_score", pa.float64()),
+    ("error", pa.string())
+])
+
+# 記錄已匯出來源檔的清單（底線開頭的檔案會被 Parquet 讀取端忽略）
+MANIFEST_NAME = "_manifest.json"
+
+def _safe_model_name(model: Optional[str]) -> str:
+    """將模型名稱轉為可作為目錄名稱的形式"""
+    return (model or "unknown").replace(':', '_').replace('/', '_')
+
+def _run_fields(run_id: str, kind: str, model: Optional[str], provider: Optional[str],
+                timestamp: Optional[str], source: str) -> Dict[str, Any]:
+    """每一列共用的執行層級欄位"""
+    return {
+        "run_id": run_id,
+        "run_kind": kind,
+        "source_file": source,
+        "model": _safe_model_name(model),
+        "model_name": model,
+        "provider": provider,
+        "date": (timestamp or "")[:10] or "unknown",
+        "run_timestamp": timestamp
+    }
+
+def _usage_fields(usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """服務端回報的 token 用量欄位（沒有回報時為 null）"""
+    usage = usage or {}
+    return {key: usage.get(key) for key in ("prompt_tokens", "completion_tokens", "cached_tokens")}
+
+def _scenario_rows(result: Dict[str, Any], run_fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """將 RoleplayTestRunner 的單一場景結果攤平成每輪一列"""
+    rows = []
+    for round_result in result["round_results"]:
+        row = dict(run_fields)
+        row.update({
+            "scenario": result["scenario"],
+            "round": round_result["round"],
+            # 多次取樣時區分同一場景的各次獨立對話（單次測試為 null）
+            "sample": round_result.get("sample"),
+            "user_message": round_result["user_message"],
+            "model_response": round_result["model_response"],
+            "response_length": len(round_result["model_response"]),
+            "response_time": round_result.get("response_time"),
+            "time_to_first_token": round_result.get("time_to_first_token"),
+            "inter_token_latency": round_result.get("inter_token_latency"),
+            "decode_tokens_per_sec": round_result.get("decode_tokens_per_sec"),
+            "cache_hit": round_result.get("cache_hit"),
+            "overall_score": round_result.get("overall_score"),
+            **_usage_fields(round_result.get("usage"))
+        })
+        for score_name, score_value in round_result.get("scores", {}).items():
+            row[f"score_{score_name}"] = score_value
+        rows.append(row)
+    return rows
+
+def _scenario_file_paths(data: Dict[str, Any], path: Path) -> Dict[str, Path]:
+    """全面測試各場景對應的單一場景結果檔路徑（同一目錄的 <test_id>.json，不一定存在）"""
+    return {
+        result["test_id"]: path.parent / f"{result['test_id']}.json"
+        for result in data.get("scenario_results", {}).values() if "test_id" in result
+    }
+
+def _standalone_test_ids(data: Dict[str, Any], path: Path) -> Set[str]:
+    """全面測試中已另外儲存為單一場景結果檔的場景 test_id"""
+    return {test_id for test_id, scenario_path in _scenario_file_paths(data, path).items()
+            if scenario_path.exists()}
+
+def _file_mtimes(paths: Iterable[Union[str, Path]]) -> Dict[str, Optional[float]]:
+    """各檔案的修改時間（不存在的檔案為 None）"""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[str(path)] = Path(path).stat().st_mtime
+        except FileNotFoundError:
+            mtimes[str(path)] = None
+    return mtimes
+
+def flatten_result(data: Dict[str, Any], source: str = "",
+                   standalone_test_ids: Iterable[str] = ()) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """將任一種結果格式攤平成每輪一列
+
+    全面測試的各場景結果也會另外儲存為單一場景結果檔，兩者都匯出時同一輪會出現兩次；
+    standalone_test_ids 中的場景由單一場景結果檔匯出，全面測試檔只匯出其餘的場景。
+
+    Returns:
+        (run_id, 資料列)；無法辨識的格式回傳 (None, [])
+    """
+    if "round_results" in data:
+        run_fields = _run_fields(data["test_id"], "single", data.get("model"), data.get("provider"),
+                                 data.get("timestamp"), source)
+        return data["test_id"], _scenario_rows(data, run_fields)
+
+    if "scenario_results" in data:
+        run_fields = _run_fields(data["comprehensive_test_id"], "comprehensive", data.get("model"),
+                                 data.get("provider"), data.get("timestamp"), source)
+        standalone_test_ids = set(standalone_test_ids)
+        rows = []
+        for result in data["scenario_results"].values():
+            if "error" not in result and result.get("test_id") not in standalone_test_ids:
+                rows.extend(_scenario_rows(result, run_fields))
+        return data["comprehensive_test_id"], rows
+
+    if "session_id" in data:
+        # compare_prompts 每個測試只有一輪對話
+        run_fields = _run_fields(data["session_id"], "prompt_session", data.get("model_name"),
+                                 data.get("provider"), data.get("start_time"), source)
+        rows = []
+        for test in data.get("tests", []):
+            evaluation = test.get("evaluation", {})
+            response = test.get("response", "")
+            row = dict(run_fields)
+            row.update({
+                "scenario": test.get("scenario"),
+                "prompt_version": test.get("version"),
+                "round": 1,
+                "model_response": response,
+                "response_length": len(response),
+                "response_time": test.get("response_time_seconds"),
+                "time_to_first_token": test.get("time_to_first_token"),
+                "inter_token_latency": test.get("inter_token_latency"),
+                "decode_tokens_per_sec": test.get("decode_tokens_per_sec"),
+                "cache_hit": test.get("cache_hit"),
+                "evaluation_score": evaluation.get("score"),
+                "error": test.get("error"),
+                **_usage_fields(test.get("usage"))
+            })
+            rows.append(row)
+        return data["session_id"], rows
+
+    return None, []
+
+class ParquetExporter:
+    """將測試結果匯出為依模型與日期分割的 Parquet 資料集（每輪一列）
+
+    每個執行寫成所屬分割下的一個檔案（以 run_id 命名），重新匯出同一執行會覆寫該檔案；
+    清單記錄每個來源檔的修改時間、執行 ID 與列數，增量匯出時略過未變更的檔案。
+    全面測試檔匯出哪些場景取決於同目錄的單一場景結果檔，因此清單也記錄這些檔案的修改時間
+    （不存在為 null），任一個新增、刪除或修改時都會重新匯出。
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        """
+        Args:
+            root: 資料集根目錄
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / MANIFEST_NAME
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def _save_manifest(self):
+        """寫入清單（先寫暫存檔再取代）"""
+        temp_path = self.manifest_path.with_suffix(".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def _remove_run(self, run_id: str):
+        """刪除某個執行已匯出的 Parquet 檔"""
+        for stale_file in self.root.glob(f"*/*/{run_id}-*.parquet"):
+            stale_file.unlink()
+
+    def _is_current(self, path: Path) -> bool:
+        """來源檔（與全面測試的各場景結果檔）自上次匯出後是否都未變更"""
+        entry = self.manifest.get(str(path))
+        # 舊版清單只記錄修改時間（數值），一律視為已變更
+        if not isinstance(entry, dict):
+            return False
+        return (entry["mtime"] == path.stat().st_mtime
+                and entry["scenario_files"] == _file_mtimes(entry["scenario_files"]))
+
+    def export_file(self, path: Union[str, Path]) -> Optional[int]:
+        """匯出單一結果檔，並更新清單中此檔案的記錄（由呼叫端寫入清單檔）
+
+        Returns:
+            寫入的列數；無法辨識的格式回傳 None
+        """
+        path = Path(path)
+        mtime = path.stat().st_mtime
+        data = load_result_file(path)
+        scenario_files = _scenario_file_paths(data, path)
+        scenario_mtimes = _file_mtimes(scenario_files.values())
+        run_id, rows = flatten_result(
+            data, str(path),
+            [test_id for test_id, scenario_path in scenario_files.items()
+             if scenario_mtimes[str(scenario_path)] is not None]
+        )
+        if run_id is None:
+            return None
+        # 先移除此執行先前匯出的檔案（例如改由單一場景結果檔匯出、不再有資料列的全面測試）
+        self._remove_run(run_id)
+        if rows:
+            pq.write_to_dataset(
+                pa.Table.from_pylist(rows, schema=ROUND_SCHEMA),
+                self.root,
+                partition_cols=PARTITION_COLUMNS,
+                basename_template=f"{run_id}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore"
+            )
+        self.manifest[str(path)] = {
+            "mtime": mtime,
+            "scenario_files": scenario_mtimes,
+            "run_id": run_id,
+            "rows": len(rows)
+        }
+        return len(rows)
+
+    def export(self, paths: Iterable[Union[str, Path]], full: bool = False) -> Dict[str, int]:
+        """匯出多個結果檔
+
+        Args:
+            paths: 結果檔路徑
+            full: 是否忽略清單、全部重新匯出
+
+        Returns:
+            {"exported": 匯出檔案數, "rows": 寫入列數, "unchanged": 未變更略過數, "skipped": 無法辨識數,
+             "removed": 來源檔已刪除而移除的執行數}
+        """
+        counts = {"exported": 0, "rows": 0, "unchanged": 0, "skipped": 0, "removed": 0}
+
+        # 來源檔已刪除的執行從資料集移除（例如刪除單一場景結果檔後，該場景改由全面測試檔匯出）
+        for key in [key for key in self.manifest if not Path(key).exists()]:
+            entry = self.manifest.pop(key)
+            if isinstance(entry, dict):
+                self._remove_run(entry["run_id"])
+            counts["removed"] += 1
+        if counts["removed"]:
+            self._save_manifest()
+
+        for path in paths:
+            path = Path(path)
+            if not full and self._is_current(path):
+                counts["unchanged"] += 1
+                continue
+
+            try:
+                row_count = self.export_file(path)
+            except (OSError, ValueError, KeyError):
+                row_count = None
+            if row_count is None:
+                counts["skipped"] += 1
+                continue
+
+            counts["exported"] += 1
+            counts["rows"] += row_count
+            # 每個檔案完成後即更新清單，中斷後可從斷點繼續
+            self._save_manifest()
+        return counts
+
+    def verify(self) -> List[str]:
+        """讀回資料集，檢查欄位結構與每個執行的列數是否與清單記錄一致
+
+        Returns:
+            不一致的說明（空串列表示資料集與清單一致）
+        """
+        expected: Dict[str, int] = {}
+        for entry in self.manifest.values():
+            if isinstance(entry, dict) and entry["rows"]:
+                expected[entry["run_id"]] = expected.get(entry["run_id"], 0) + entry["rows"]
+        if not expected:
+            return []
+
+        problems = []
+        df = read_rounds(self.root)
+        missing_columns = [name for name in ROUND_SCHEMA.names if name not in df.columns]
+        if missing_columns:
+            problems.append(f"缺少欄位: {', '.join(missing_columns)}")
+
+        actual = df["run_id"].value_counts().to_dict()
+        for run_id in sorted(set(expected) | set(actual)):
+            if expected.get(run_id, 0) != actual.get(run_id, 0):
+                problems.append(f"{run_id}: 清單記錄 {expected.get(run_id, 0)} 列，"
+                                f"資料集讀回 {actual.get(run_id, 0)} 列")
+        return problems
+
+def read_rounds(root: Union[str, Path], columns: Optional[Sequence[str]] = None,
+                filters: Optional[List[Tuple[str, str, Any]]] = None) -> pd.DataFrame:
+    """讀取匯出的資料集，只載入需要的欄位與分割
+
+    Args:
+        root: 資料集根目錄
+        columns: 要讀取的欄位（None 表示全部）
+        filters: 篩選條件，例如 [("model", "=", "gpt-oss_20b"), ("date", ">=", "2025-01-01")]
+    """
+    return pd.read_parquet(root, engine="pyarrow", columns=columns, filters=filters)
@@ -0,0 +1,128 @@
+import re
+from typing import Callable, Dict, List, Any, Iterable, Optional, Tuple
+
+from .token_usage import estimate_message_tokens
+
+# full: 送出完整歷史；sliding: 依 token 預算保留最近的輪次；
+# first-last: 保留第一輪與最近 N 輪；summarize: 超出預算的舊輪次壓縮成摘要附在系統提示詞後
+HISTORY_STRATEGIES = ("full", "sliding", "first-last", "summarize")
+
+# 摘要最多佔用的 token 預算比例
+SUMMARY_BUDGET_RATIO = 0.25
+# 摘要中每段發言保留的字元數上限
+SUMMARY_SNIPPET_CHARS = 60
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?.])\s*|\n+")
+
+def _split_turns(conversation_history: List[Dict[str, str]]) -> List[List[Dict[str, str]]]:
+    """將對話歷史切成輪次（每輪為使用者訊息加上其後的助理回應）"""
+    turns: List[List[Dict[str, str]]] = []
+    for message in conversation_history:
+        if message["role"] == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+def _first_sentence(text: str) -> str:
+    """取出第一句（過長時截斷）作為摘要片段"""
+    text = text.strip()
+    sentence = next((part for part in _SENTENCE_END.split(text) if part.strip()), "")
+    if len(sentence) > SUMMARY_SNIPPET_CHARS:
+        sentence = sentence[:SUMMARY_SNIPPET_CHARS] + "…"
+    return sentence.strip()
+
+class HistoryWindow:
+    """依策略與 token 預算挑選每輪送出的對話歷史
+
+    輪數很多時，完整歷史會讓每輪的請求大小與延遲持續增加，最後超出模型的上下文長度；
+    視窗讓長對話測試的每輪成本維持在預算內。token 數由估算函式計算（預設為粗估），
+    token_budget 是整個提示詞（系統提示詞、歷史與本輪問題）的預算。
+    """
+
+    def __init__(self, strategy: str = "full", token_budget: int = 2000, keep_turns: int = 4,
+                 estimator: Optional[Callable[[Iterable[Dict[str, str]]], int]] = None):
+        """
+        Args:
+            strategy: 歷史策略（見 HISTORY_STRATEGIES）
+            token_budget: 每輪提示詞的 token 預算（sliding 與 summarize 使用）
+            keep_turns: first-last 保留的最近輪數
+            estimator: 訊息列表的 token 估算函式，如未指定則使用 estimate_message_tokens
+        """
+        if strategy not in HISTORY_STRATEGIES:
+            raise ValueError(f"不支援的歷史策略: {strategy}。可用的策略：{list(HISTORY_STRATEGIES)}")
+        self.strategy = strategy
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.estimator = estimator or estimate_message_tokens
+
+    def describe(self) -> Dict[str, Any]:
+        """記錄於結果中的策略設定（讓不同策略的結果可以區分比較）"""
+        description: Dict[str, Any] = {"strategy": self.strategy}
+        if self.strategy in ("sliding", "summarize"):
+            description["token_budget"] = self.token_budget
+        if self.strategy == "first-last":
+            description["keep_turns"] = self.keep_turns
+        return description
+
+    def select(self, system_prompt: str, conversation_history: List[Dict[str, str]],
+               user_message: str) -> Tuple[str, List[Dict[str, str]], Dict[str, Any]]:
+        """挑選本輪送出的歷史
+
+        Returns:
+            (系統提示詞（summarize 可能附上摘要）, 送出的歷史, 本輪的視窗資訊)
+        """
+        turns = _split_turns(conversation_history)
+        if self.strategy == "full":
+            kept = turns
+        elif self.strategy == "first-last":
+            kept = turns
+            if len(turns) > self.keep_turns + 1:
+                kept = [turns[0]] + turns[len(turns) - self.keep_turns:]
+        else:
+            fixed = self.estimator([{"role": "system", "content": system_prompt},
+                                    {"role": "user", "content": user_message}])
+            history_budget = self.token_budget - fixed
+            if self.strategy == "summarize" and self.estimator(conversation_history) > history_budget:
+                # 預留摘要的空間，其餘預算給最近的輪次
+                summary_budget = int(history_budget * SUMMARY_BUDGET_RATIO)
+                kept = self._latest_within(turns, history_budget - summary_budget)
+                summary = self._summarize(turns[:len(turns) - len(kept)], summary_budget)
+                if summary:
+                    system_prompt = f"{system_prompt}\n\n{summary}"
+            else:
+                kept = self._latest_within(turns, history_budget)
+
+        history = [message for turn in kept for message in turn]
+        info = {"turns_sent": len(kept), "turns_dropped": len(turns) - len(kept)}
+        return system_prompt, history, info
+
+    def _latest_within(self, turns: List[List[Dict[str, str]]], budget: int) -> List[List[Dict[str, str]]]:
+        """從最近的輪次往前保留，直到超出預算"""
+        kept: List[List[Dict[str, str]]] = []
+        used = 0
+        for turn in reversed(turns):
+            cost = self.estimator(turn)
+            if used + cost > budget:
+                break
+            kept.insert(0, turn)
+            used += cost
+        return kept
+
+    def _summarize(self, turns: List[List[Dict[str, str]]], budget: int) -> str:
+        """將舊輪次壓縮成摘要（每段發言取第一句；超出預算時捨棄最舊的摘要行）
+
+        以擷取方式摘要，不另外呼叫模型，每輪的請求數與成本維持固定。
+        """
+        header = "先前的對話摘要："
+        lines = []
+        for turn in turns:
+            parts = []
+            for message in turn:
+                speaker = "對方" if message["role"] == "user" else "你"
+                parts.append(f"{speaker}：{_first_sentence(message['content'])}")
+            lines.append("- " + "／".join(parts))
+
+        while lines and self.estimator([{"role": "system", "content": "\n".join([header, *lines])}]) > budget:
+            lines.pop(0)
+        return "\n".join([header, *lines]) if lines else ""
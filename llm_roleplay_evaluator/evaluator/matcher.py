@@ -0,0 +1,103 @@
+from collections import deque
+from typing import Dict, List, Iterable, Mapping, Sequence
+
+class AhoCorasickMatcher:
+    """Aho-Corasick 多模式字串比對器
+
+    一次掃描文字即可取得所有模式的出現次數，成本只取決於文字長度與命中數，
+    與模式數量無關。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Args:
+            patterns: 要比對的模式（空字串會被忽略，重複的模式只保留一個）
+        """
+        self.patterns = list(dict.fromkeys(pattern for pattern in patterns if pattern))
+        self._lengths = [len(pattern) for pattern in self.patterns]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._build()
+
+    def _build(self):
+        """建立字典樹、失敗連結與合併後的輸出表"""
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern_id)
+
+        # 以廣度優先順序設定失敗連結，並把失敗狀態的輸出併入
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def count(self, text: str) -> List[int]:
+        """計算每個模式在文字中不重疊的出現次數（與 str.count 相同）
+
+        Returns:
+            List[int]: 依 self.patterns 順序的出現次數
+        """
+        counts = [0] * len(self.patterns)
+        if not self.patterns:
+            return counts
+
+        # 每個模式下一次可被計入的起始位置（確保不重疊）
+        next_start = [0] * len(self.patterns)
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        lengths = self._lengths
+        state = 0
+
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                start = index - lengths[pattern_id] + 1
+                if start >= next_start[pattern_id]:
+                    counts[pattern_id] += 1
+                    next_start[pattern_id] = index + 1
+        return counts
+
+class PatternSets:
+    """多組具名模式集合共用同一個比對器，一次掃描取得每組的命中次數"""
+
+    def __init__(self, sets: Mapping[str, Sequence[str]]):
+        """
+        Args:
+            sets: 模式集合名稱對應模式列表
+        """
+        self.sets = {name: list(patterns) for name, patterns in sets.items()}
+        self.matcher = AhoCorasickMatcher(
+            pattern for patterns in self.sets.values() for pattern in patterns
+        )
+        pattern_ids = {pattern: pattern_id for pattern_id, pattern in enumerate(self.matcher.patterns)}
+        self._set_ids = {
+            name: [pattern_ids.get(pattern) for pattern in patterns]
+            for name, patterns in self.sets.items()
+        }
+
+    def scan(self, text: str) -> Dict[str, List[int]]:
+        """掃描文字一次，回傳每組模式（依原順序）的不重疊出現次數"""
+        counts = self.matcher.count(text)
+        return {
+            name: [counts[pattern_id] if pattern_id is not None else 0 for pattern_id in ids]
+            for name, ids in self._set_ids.items()
+        }
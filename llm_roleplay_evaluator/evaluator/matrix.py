@@ -0,0 +1,147 @@
+from itertools import product
+from typing import Dict, List, Any, Iterable, Optional, Sequence, Tuple
+
+from config import config
+from .token_usage import merge_token_usage
+
+PROVIDERS = ("ollama", "openrouter")
+
+class MatrixTarget:
+    """評估矩陣中的一個受測對象（服務提供者、模型與取樣參數的組合）"""
+
+    def __init__(self, provider: str, model: str, temperature: float, max_tokens: int):
+        """
+        Args:
+            provider: 服務提供者（ollama 或 openrouter）
+            model: 模型名稱
+            temperature: 溫度參數
+            max_tokens: 最大 token 數
+        """
+        if provider not in PROVIDERS:
+            raise ValueError(f"不支援的服務提供者: {provider}。可用的服務提供者：{list(PROVIDERS)}")
+        self.provider = provider
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    @property
+    def key(self) -> Tuple[str, str, float, int]:
+        return (self.provider, self.model, self.temperature, self.max_tokens)
+
+    @property
+    def label(self) -> str:
+        """可作為檔名一部分的識別字串"""
+        model = self.model.replace(':', '_').replace('/', '_')
+        return f"{self.provider}_{model}_t{self.temperature:g}_m{self.max_tokens}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+
+    def __repr__(self) -> str:
+        return f"MatrixTarget({self.provider}, {self.model}, temperature={self.temperature:g}, max_tokens={self.max_tokens})"
+
+def parse_model_spec(spec: str, default_provider: Optional[str] = None) -> Tuple[str, str]:
+    """解析模型指定字串
+
+    "ollama=qwen2.5:14b" 指定服務提供者；未加前綴時使用 default_provider（預設為設定值）。
+    模型名稱本身可能含有 ":" 或 "/"，因此以 "=" 分隔服務提供者。
+    """
+    if "=" in spec:
+        provider, model = spec.split("=", 1)
+        return provider.strip().lower(), model.strip()
+    return (default_provider or config.provider), spec.strip()
+
+def parse_provider_limits(spec: Optional[str]) -> Dict[str, int]:
+    """解析各服務提供者的並行上限，例如 "ollama=1,openrouter=8" """
+    limits = {}
+    if not spec:
+        return limits
+    for item in spec.split(","):
+        provider, _, value = item.partition("=")
+        if not value:
+            raise ValueError(f"並行上限格式錯誤: {item}（應為 服務提供者=數量）")
+        limits[provider.strip().lower()] = int(value)
+    return limits
+
+def expand_targets(models: Iterable[str], temperatures: Optional[Sequence[float]] = None,
+                   max_tokens_values: Optional[Sequence[int]] = None,
+                   default_provider: Optional[str] = None) -> List[MatrixTarget]:
+    """展開模型 × 溫度 × 最大 token 數的所有組合
+
+    Args:
+        models: 模型指定字串（見 parse_model_spec）
+        temperatures: 溫度參數列表，如未指定則使用設定值
+        max_tokens_values: 最大 token 數列表，如未指定則使用設定值
+        default_provider: 未加前綴的模型使用的服務提供者
+    """
+    temperatures = list(temperatures) if temperatures else [config.temperature]
+    max_tokens_values = list(max_tokens_values) if max_tokens_values else [config.max_tokens]
+
+    targets, seen = [], set()
+    for spec, temperature, max_tokens in product(models, temperatures, max_tokens_values):
+        provider, model = parse_model_spec(spec, default_provider)
+        target = MatrixTarget(provider, model, temperature, max_tokens)
+        if target.key not in seen:
+            seen.add(target.key)
+            targets.append(target)
+    return targets
+
+def group_cells_by_model(cells: Sequence[Tuple[MatrixTarget, str]]
+                         ) -> Tuple[List[Tuple[str, List[int]]], List[int]]:
+    """將格子依 Ollama 模型分批（同一模型的所有溫度與場景放在同一批）
+
+    同一台 Ollama 主機交錯執行不同模型時，GPU 會反覆置換模型權重；
+    依模型分批、逐批執行，每個模型只需載入一次。
+
+    Returns:
+        (依首次出現順序的 [(模型, 格子索引列表)], 其他服務提供者的格子索引列表)
+    """
+    batches: Dict[str, List[int]] = {}
+    others = []
+    for index, (target, _) in enumerate(cells):
+        if target.provider == "ollama":
+            batches.setdefault(target.model, []).append(index)
+        else:
+            others.append(index)
+    return list(batches.items()), others
+
+def summarize_matrix(cells: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """依受測對象彙整各格結果（場景平均分數、成功數、平均回應時間與 token 用量）"""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for cell in cells:
+        group = groups.setdefault(cell["target"], {
+            "target": cell["target"],
+            "provider": cell["provider"],
+            "model": cell["model"],
+            "temperature": cell["temperature"],
+            "max_tokens": cell["max_tokens"],
+            "scenario_scores": {},
+            "total_cells": 0,
+            "successful_cells": 0,
+            "response_times": [],
+            "token_usages": []
+        })
+        group["total_cells"] += 1
+        if "error" in cell:
+            continue
+        group["successful_cells"] += 1
+        group["scenario_scores"][cell["scenario"]] = cell["overall_average_score"]
+        if cell.get("average_response_time") is not None:
+            group["response_times"].append(cell["average_response_time"])
+        if cell.get("token_usage"):
+            group["token_usages"].append(cell["token_usage"])
+
+    summary = []
+    for group in groups.values():
+        scores = list(group["scenario_scores"].values())
+        response_times = group.pop("response_times")
+        group["overall_average_score"] = sum(scores) / len(scores) if scores else None
+        group["average_response_time"] = sum(response_times) / len(response_times) if response_times else None
+        group["token_usage"] = merge_token_usage(group.pop("token_usages"))
+        summary.append(group)
+    return summary
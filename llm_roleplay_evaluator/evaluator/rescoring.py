@@ -0,0 +1,137 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Iterator, Optional
+
+from prompts import get_scenario_prompt
+from .scoring import RoleplayScorer, calculate_overall_score
+from .scoring_pool import get_worker_scorer, init_worker
+from .test_runner import RoleplayTestRunner
+
+def _rescore_scenario_results(scenario_results: List[Dict[str, Any]], scorer: RoleplayScorer):
+    """以目前的評分器批次重新計算多個場景結果的分數（就地更新）
+
+    依 round_results 重建每輪之前的對話歷史，所有輪次一次交給 score_batch，不呼叫 LLM。
+    多次取樣的結果含多段獨立對話，每段從第 1 輪重新累積歷史。
+    """
+    responses, profiles, histories, rounds = [], [], [], []
+    for result in scenario_results:
+        profile = scorer.get_profile(get_scenario_prompt(result["scenario"])["system_prompt"])
+        conversation_history = []
+
+        for round_result in result["round_results"]:
+            if round_result.get("round") == 1:
+                conversation_history = []
+            responses.append(round_result["model_response"])
+            profiles.append(profile)
+            histories.append(list(conversation_history))
+            rounds.append(round_result)
+
+            conversation_history.append({"role": "user", "content": round_result["user_message"]})
+            conversation_history.append({"role": "assistant", "content": round_result["model_response"]})
+
+    for round_result, scores in zip(rounds, scorer.score_batch(responses, profiles, histories)):
+        round_result["scores"] = scores
+        round_result["overall_score"] = calculate_overall_score(scores)
+
+    for result in scenario_results:
+        result["average_scores"] = RoleplayTestRunner._calculate_average_scores(result["round_results"])
+        result["overall_average_score"] = calculate_overall_score(result["average_scores"])
+        if "sample_results" in result:
+            RoleplayTestRunner._combine_sample_scores(result)
+
+def rescore_scenario_result(result: Dict[str, Any], scorer: RoleplayScorer) -> Dict[str, Any]:
+    """以目前的評分器重新計算單一場景結果的分數
+
+    Args:
+        result: RoleplayTestRunner.run_single_test 產生的結果
+        scorer: 評分器
+
+    Returns:
+        更新分數後的結果（原物件會被就地修改）
+    """
+    _rescore_scenario_results([result], scorer)
+    return result
+
+def rescore_result(data: Dict[str, Any], scorer: RoleplayScorer) -> Optional[Dict[str, Any]]:
+    """重新計算結果檔內容的分數（支援單一場景與全面測試結果）
+
+    Returns:
+        更新後的結果；不是 RoleplayTestRunner 格式時回傳 None
+    """
+    if "round_results" in data:
+        rescore_scenario_result(data, scorer)
+    elif "scenario_results" in data:
+        successful_results = [
+            scenario_result for scenario_result in data["scenario_results"].values()
+            if "error" not in scenario_result
+        ]
+        _rescore_scenario_results(successful_results, scorer)
+        data["overall_statistics"] = RoleplayTestRunner._calculate_overall_stats(successful_results)
+    else:
+        return None
+
+    data["rescored_at"] = datetime.now().isoformat()
+    return data
+
+def _rescore_file(task: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作行程中重新評分單一結果檔"""
+    source = Path(task["source"])
+    try:
+        with open(source, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        old_score = _summary_score(data)
+        if rescore_result(data, get_worker_scorer()) is None:
+            return {"source": str(source), "status": "skipped"}
+
+        destination = Path(task["destination"])
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        # 先寫入暫存檔再取代，避免中斷時毀損原檔
+        temp_path = destination.with_suffix(destination.suffix + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, destination)
+
+        return {
+            "source": str(source),
+            "destination": str(destination),
+            "status": "rescored",
+            "old_score": old_score,
+            "new_score": _summary_score(data)
+        }
+    except Exception as e:
+        return {"source": str(source), "status": "error", "error": str(e)}
+
+def _summary_score(data: Dict[str, Any]) -> Optional[float]:
+    """取得結果檔的總體平均分數"""
+    if "overall_average_score" in data:
+        return data["overall_average_score"]
+    return data.get("overall_statistics", {}).get("overall_average_score")
+
+def rescore_files(paths: Iterable[Path], output_dir: Optional[Path] = None, in_place: bool = False,
+                  workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """以行程池重新評分多個結果檔（逐檔讀取，不一次載入全部）
+
+    Args:
+        paths: 結果檔路徑
+        output_dir: 新結果檔的輸出目錄（in_place 為 False 時使用）
+        in_place: 是否直接覆寫原結果檔
+        workers: 工作行程數，如未指定則使用 CPU 數
+
+    Yields:
+        每個檔案的處理摘要（依輸入順序）
+    """
+    if not in_place and output_dir is None:
+        raise ValueError("未指定輸出目錄，且未啟用就地更新")
+
+    def tasks() -> Iterator[Dict[str, Any]]:
+        for path in paths:
+            path = Path(path)
+            destination = path if in_place else Path(output_dir) / path.name
+            yield {"source": str(path), "destination": str(destination)}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        yield from executor.map(_rescore_file, tasks(), chunksize=8)
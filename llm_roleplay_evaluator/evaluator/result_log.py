@@ -0,0 +1,111 @@
+import atexit
+import json
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, Any, Union
+
+class BackgroundWriter:
+    """以背景執行緒附加寫入文字檔的緩衝寫入器
+
+    write() 只把內容放進佇列，不阻塞呼叫端；背景執行緒寫入緩衝檔案，
+    並在佇列清空時 flush，讓連續寫入合併成較少的系統呼叫，同時盡快落盤。
+    """
+
+    def __init__(self, path: Union[str, Path], buffer_size: int = 64 * 1024):
+        """
+        Args:
+            path: 輸出檔案路徑（以附加模式開啟）
+            buffer_size: 檔案緩衝區大小（位元組）
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=buffer_size)
+        # 佇列內容為待寫入的文字，None 表示結束
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"writer-{self.path.name}", daemon=True)
+        self._thread.start()
+        # 程式結束前確保佇列中的內容都已寫入
+        atexit.register(self.close)
+
+    def _run(self):
+        """背景執行緒：依序寫入佇列內容"""
+        while True:
+            text = self._queue.get()
+            if text is None:
+                break
+            self._file.write(text)
+            if self._queue.empty():
+                self._file.flush()
+        self._file.flush()
+        self._file.close()
+
+    def write(self, text: str):
+        """將文字排入寫入佇列"""
+        if self._closed:
+            raise ValueError(f"寫入器已關閉: {self.path}")
+        self._queue.put(text)
+
+    def close(self):
+        """寫完佇列中的內容並關閉檔案"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+class JsonlResultLog:
+    """只附加的 JSONL 結果記錄（每筆結果一行，寫入成本與已寫入的筆數無關）
+
+    檔案格式：
+        第一行 {"type": "session", ...}: 工作階段資訊
+        之後每行 {"type": "test", ...}: 單一測試結果
+        最後一行 {"type": "summary", ...}: 結束時寫入的摘要（程式中斷時不存在）
+    """
+
+    def __init__(self, path: Union[str, Path], session: Dict[str, Any]):
+        """
+        Args:
+            path: JSONL 檔案路徑
+            session: 工作階段資訊（寫入為第一行）
+        """
+        self.path = Path(path)
+        self._writer = BackgroundWriter(self.path)
+        self.write_record("session", session)
+
+    def write_record(self, record_type: str, record: Dict[str, Any]):
+        """附加一筆紀錄"""
+        line = json.dumps({"type": record_type, **record}, ensure_ascii=False)
+        self._writer.write(line + "\n")
+
+    def add_test(self, result: Dict[str, Any]):
+        """附加一筆測試結果"""
+        self.write_record("test", result)
+
+    def finalize(self, summary: Dict[str, Any]):
+        """寫入摘要並關閉檔案"""
+        self.write_record("summary", summary)
+        self._writer.close()
+
+def load_session(path: Union[str, Path]) -> Dict[str, Any]:
+    """讀取 JSONL 結果記錄，組合成單一工作階段結果
+
+    Returns:
+        工作階段資訊、"tests" 測試結果列表與摘要欄位合併後的字典；
+        程式中斷造成的不完整最後一行會被略過
+    """
+    data: Dict[str, Any] = {"tests": []}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            record_type = record.pop("type", None)
+            if record_type == "test":
+                data["tests"].append(record)
+            elif record_type in ("session", "summary"):
+                data.update(record)
+    return data
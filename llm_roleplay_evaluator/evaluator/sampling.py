@@ -0,0 +1,91 @@
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .scoring import calculate_overall_score
+
+# 信賴區間的預設信心水準與 bootstrap 重抽次數
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_BOOTSTRAP_ITERATIONS = 2000
+
+# 計算信賴區間所需的最少樣本數（樣本太少時 bootstrap 區間嚴重低估不確定性，不予報告）
+MIN_CI_SAMPLES = 5
+
+def bootstrap_ci(values: Sequence[float], confidence: float = DEFAULT_CONFIDENCE,
+                 iterations: int = DEFAULT_BOOTSTRAP_ITERATIONS,
+                 seed: Optional[int] = 0,
+                 min_samples: int = MIN_CI_SAMPLES) -> Tuple[Optional[float], Optional[float]]:
+    """以百分位數 bootstrap 估計平均值的信賴區間
+
+    只有少數樣本時，重抽的組合很少，區間會過窄；樣本數剛達門檻時區間仍只是粗略參考。
+    固定亂數種子讓同一組分數的區間可重現。
+
+    Returns:
+        (下界, 上界)；少於 min_samples 個樣本時回傳 (None, None)
+    """
+    data = np.asarray(values, dtype=float)
+    if data.size < max(min_samples, 2):
+        return None, None
+    rng = np.random.default_rng(seed)
+    means = rng.choice(data, size=(iterations, data.size), replace=True).mean(axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+def describe_values(values: Sequence[float], confidence: float = DEFAULT_CONFIDENCE) -> Dict[str, Optional[float]]:
+    """平均值、標準差（樣本標準差）與 bootstrap 信賴區間"""
+    data = np.asarray(values, dtype=float)
+    ci_low, ci_high = bootstrap_ci(data, confidence)
+    return {
+        "mean": float(data.mean()) if data.size else None,
+        "std": float(data.std(ddof=1)) if data.size > 1 else None,
+        "ci_low": ci_low,
+        "ci_high": ci_high
+    }
+
+def summarize_samples(sample_results: List[Dict[str, Any]],
+                      confidence: float = DEFAULT_CONFIDENCE) -> Dict[str, Any]:
+    """彙整同一場景多次獨立對話的分數分布
+
+    每次對話先取各輪平均作為一個樣本，再計算樣本間的平均值、標準差與信賴區間；
+    同一對話內的各輪彼此相關，不當作獨立樣本。
+
+    Args:
+        sample_results: 各次對話的場景結果（使用 average_scores 與 overall_average_score）
+        confidence: 信賴區間的信心水準
+    """
+    successful = [result for result in sample_results if "error" not in result]
+    summary: Dict[str, Any] = {
+        "samples": len(sample_results),
+        "successful_samples": len(successful),
+        "confidence": confidence,
+        "min_ci_samples": MIN_CI_SAMPLES,
+        "score_stats": {},
+        "overall_score_stats": None
+    }
+    if not successful:
+        return summary
+
+    for key in successful[0]["average_scores"]:
+        summary["score_stats"][key] = describe_values(
+            [result["average_scores"][key] for result in successful], confidence
+        )
+    summary["overall_score_stats"] = describe_values(
+        [result["overall_average_score"] for result in successful], confidence
+    )
+    return summary
+
+def mean_scores(sample_results: List[Dict[str, Any]]) -> Dict[str, float]:
+    """各評分維度在所有成功樣本間的平均值"""
+    successful = [result for result in sample_results if "error" not in result]
+    if not successful:
+        return {}
+    return {
+        key: sum(result["average_scores"][key] for result in successful) / len(successful)
+        for key in successful[0]["average_scores"]
+    }
+
+def overall_from_samples(sample_results: List[Dict[str, Any]]) -> Optional[float]:
+    """以各維度的樣本平均計算總分（與單次對話的總分算法一致）"""
+    scores = mean_scores(sample_results)
+    return calculate_overall_score(scores) if scores else None
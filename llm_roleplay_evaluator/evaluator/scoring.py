@@ -1,40 +1,147 @@
 import re
-from typing import Dict, List, Any
-from sklearn.feature_extraction.text import TfidfVectorizer
+import math
+import hashlib
+from collections import Counter
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Union
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
+from telemetry import span
+from .matcher import PatternSets
+
+# 第一人稱指標
+FIRST_PERSON_INDICATORS = ['我', '我的', '我們', '我們的', '本人', '俺', '咱']
+
+# AI 相關表述（負面指標）
+AI_INDICATORS = [
+    '作為AI', '作為人工智能', '作為語言模型', '我是AI', '我是人工智能',
+    'OpenAI', 'GPT', '語言模型', '大語言模型', 'LLM'
+]
+
+# 常見的性格特質關鍵詞
+COMMON_TRAITS = [
+    '樂觀', '開朗', '焦慮', '內向', '自信', '穩重', '創意', '敏感',
+    '耐心', '細心', '務實', '理想主義', '熱情', '冷靜', '活潑', '沉穩'
+]
+
+# 兩份文件的 TF-IDF（smooth_idf）中，只出現在其中一份的詞之 idf 值；兩份都出現的詞 idf 為 1
+_PAIR_IDF_UNSHARED = math.log(3 / 2) + 1
+
+class ScenarioProfile:
+    """預先編譯的場景評分資料（同一系統提示詞只需建立一次）
+    
+    包含角色關鍵詞、角色特質、提示詞的詞頻向量，以及合併所有比對模式的比對器，
+    讓每輪評分的成本只取決於回應本身。
+    """
+    
+    def __init__(self, system_prompt: str, role_keywords: List[str], character_traits: List[str],
+                 term_counts: Dict[str, int]):
+        self.system_prompt = system_prompt
+        self.prompt_hash = ScenarioProfile.hash_prompt(system_prompt)
+        self.role_keywords = role_keywords
+        self.character_traits = character_traits
+        # 第一人稱、AI 表述、角色關鍵詞與特質共用一個比對器（比對對象為小寫後的回應）
+        self.matcher = PatternSets({
+            "first_person": FIRST_PERSON_INDICATORS,
+            "ai_mentions": [indicator.lower() for indicator in AI_INDICATORS],
+            "role_keywords": role_keywords,
+            "character_traits": character_traits
+        })
+        # 提示詞的詞頻向量與其平方和（供語義相似度使用）
+        self.term_counts = term_counts
+        self.term_norm_sq = float(sum(count * count for count in term_counts.values()))
+    
+    @staticmethod
+    def hash_prompt(system_prompt: str) -> str:
+        """計算系統提示詞的雜湊值"""
+        return hashlib.sha1(system_prompt.encode('utf-8')).hexdigest()
+
 class RoleplayScorer:
     """角色扮演評分器"""
     
     def __init__(self):
         self.vectorizer = TfidfVectorizer(stop_words='english')
+        self._analyzer = self.vectorizer.build_analyzer()
+        self._profiles: Dict[str, ScenarioProfile] = {}
+    
+    def get_profile(self, system_prompt: str) -> ScenarioProfile:
+        """取得系統提示詞的場景評分資料（依提示詞雜湊快取）"""
+        prompt_hash = ScenarioProfile.hash_prompt(system_prompt)
+        profile = self._profiles.get(prompt_hash)
+        if profile is None:
+            profile = ScenarioProfile(
+                system_prompt,
+                self._extract_role_keywords(system_prompt),
+                self._extract_character_traits(system_prompt),
+                dict(Counter(self._analyzer(system_prompt)))
+            )
+            self._profiles[prompt_hash] = profile
+        return profile
+    
+    def _resolve_profile(self, scenario: Union[str, ScenarioProfile]) -> ScenarioProfile:
+        """接受系統提示詞或場景評分資料，一律回傳場景評分資料"""
+        if isinstance(scenario, ScenarioProfile):
+            return scenario
+        return self.get_profile(scenario)
     
-    def calculate_role_consistency_score(self, response: str, system_prompt: str) -> float:
+    def score_response(self, response: str, system_prompt: Union[str, ScenarioProfile],
+                       conversation_history: List[Dict]) -> Dict[str, float]:
+        """計算單一回應的各項評分
+        
+        Args:
+            response: 模型回應
+            system_prompt: 系統提示詞（角色設定）或其場景評分資料
+            conversation_history: 本輪之前的對話歷史
+            
+        Returns:
+            Dict[str, float]: 角色一致性、流暢度與上下文連貫性分數
+        """
+        with span("score.role_consistency", "scoring"):
+            role_consistency = self.calculate_role_consistency_score(response, system_prompt)
+        with span("score.fluency", "scoring"):
+            fluency = self.calculate_fluency_score(response)
+        with span("score.context_coherence", "scoring"):
+            context_coherence = self.calculate_context_coherence_score(conversation_history, response)
+        return {
+            "role_consistency": role_consistency,
+            "fluency": fluency,
+            "context_coherence": context_coherence
+        }
+    
+    def calculate_role_consistency_score(self, response: str, profile: Union[str, ScenarioProfile]) -> float:
         """計算角色一致性分數
         
         Args:
             response: 模型回應
-            system_prompt: 系統提示詞（角色設定）
+            profile: 場景評分資料（傳入系統提示詞時會自動取得並快取）
             
         Returns:
             float: 一致性分數 (0-1)
         """
+        profile = self._resolve_profile(profile)
+        
+        # 計算語義相似度
+        semantic_score = self._profile_similarity(response, profile)
+        
+        return self._combine_role_consistency(response, profile, semantic_score)
+    
+    def _combine_role_consistency(self, response: str, profile: ScenarioProfile, semantic_score: float) -> float:
+        """以已計算的語義相似度結合其餘指標，得出角色一致性分數"""
+        # 一次掃描回應，取得所有模式的命中次數
+        hits = profile.matcher.scan(response.lower())
+        
         # 檢查是否使用第一人稱（角色扮演的重要指標）
-        first_person_score = self._check_first_person_usage(response)
+        first_person_score = self._check_first_person_usage(response, sum(hits["first_person"]))
         
         # 檢查是否出現AI相關表述（負面指標）
-        ai_mention_penalty = self._check_ai_mentions(response)
+        ai_mention_penalty = self._check_ai_mentions(hits["ai_mentions"])
         
         # 檢查回應是否包含角色相關關鍵詞
-        role_keywords = self._extract_role_keywords(system_prompt)
-        keyword_score = self._calculate_keyword_score(response, role_keywords)
-        
-        # 計算語義相似度
-        semantic_score = self._calculate_semantic_similarity(response, system_prompt)
+        keyword_score = self._calculate_keyword_score(hits["role_keywords"])
         
         # 檢查角色特質表現
-        trait_score = self._check_character_traits(response, system_prompt)
+        trait_score = self._check_character_traits(hits["character_traits"])
         
         # 綜合評分（第一人稱使用最重要）
         consistency_score = (
@@ -46,15 +153,12 @@ class RoleplayScorer:
         )
         return max(0, min(consistency_score, 1.0))
     
-    def _check_first_person_usage(self, response: str) -> float:
-        """檢查第一人稱使用情況"""
-        first_person_indicators = ['我', '我的', '我們', '我們的', '本人', '俺', '咱']
+    def _check_first_person_usage(self, response: str, first_person_count: int) -> float:
+        """檢查第一人稱使用情況（first_person_count 為各第一人稱指標的出現次數總和）"""
         total_words = len(response)
         if total_words == 0:
             return 0.0
         
-        first_person_count = sum(response.count(indicator) for indicator in first_person_indicators)
-        
         # 適度的第一人稱使用（每50字約1-3次）
         ideal_ratio = 0.02  # 2%的字是第一人稱
         actual_ratio = first_person_count / total_words
@@ -63,37 +167,22 @@ class RoleplayScorer:
         score = 1.0 - min(abs(actual_ratio - ideal_ratio) / ideal_ratio, 1.0)
         return score
     
-    def _check_ai_mentions(self, response: str) -> float:
-        """檢查是否出現AI相關表述（懲罰分數）"""
-        ai_indicators = [
-            '作為AI', '作為人工智能', '作為語言模型', '我是AI', '我是人工智能',
-            'OpenAI', 'GPT', '語言模型', '大語言模型', 'LLM'
-        ]
-        
-        penalty = 0
-        for indicator in ai_indicators:
-            if indicator.lower() in response.lower():
-                penalty += 0.3  # 每次出現扣0.3分
+    def _check_ai_mentions(self, ai_hits: Sequence[int]) -> float:
+        """檢查是否出現AI相關表述（懲罰分數；ai_hits 為各 AI 指標的出現次數）"""
+        # 每種表述出現即扣0.3分
+        penalty = 0.3 * sum(1 for count in ai_hits if count)
         
         return min(penalty, 1.0)  # 最多扣1分
     
-    def _check_character_traits(self, response: str, system_prompt: str) -> float:
-        """檢查角色特質表現"""
+    def _check_character_traits(self, trait_hits: Sequence[int]) -> float:
+        """檢查角色特質表現（trait_hits 為各角色特質在回應中的出現次數）"""
         traits_score = 0.5  # 基礎分
         
-        # 從系統提示詞中提取角色特質關鍵詞
-        trait_keywords = self._extract_character_traits(system_prompt)
-        
         # 檢查回應中是否體現這些特質
-        response_lower = response.lower()
-        matched_traits = 0
-        
-        for trait in trait_keywords:
-            if trait in response_lower:
-                matched_traits += 1
+        matched_traits = sum(1 for count in trait_hits if count)
         
-        if trait_keywords:
-            traits_score += (matched_traits / len(trait_keywords)) * 0.5
+        if trait_hits:
+            traits_score += (matched_traits / len(trait_hits)) * 0.5
         
         return min(traits_score, 1.0)
     
@@ -101,14 +190,8 @@ class RoleplayScorer:
         """從系統提示詞中提取角色特質關鍵詞"""
         traits = []
         
-        # 常見的性格特質關鍵詞
-        common_traits = [
-            '樂觀', '開朗', '焦慮', '內向', '自信', '穩重', '創意', '敏感',
-            '耐心', '細心', '務實', '理想主義', '熱情', '冷靜', '活潑', '沉穩'
-        ]
-        
         prompt_lower = system_prompt.lower()
-        for trait in common_traits:
+        for trait in COMMON_TRAITS:
             if trait in prompt_lower:
                 traits.append(trait)
         
@@ -133,7 +216,7 @@ class RoleplayScorer:
             return 0.8  # 對話剛開始，給予基礎分
         
         # 檢查是否回應了上一個問題
-        last_user_message = conversation_history[-1]["content"] if conversation_history[-1]["role"] == "user" else ""
+        last_user_message = self._last_user_message(conversation_history)
         response_similarity = self._calculate_semantic_similarity(current_response, last_user_message)
         
         # 檢查是否保持了對話主題
@@ -141,6 +224,124 @@ class RoleplayScorer:
         
         return 0.6 * response_similarity + 0.4 * topic_consistency
     
+    @staticmethod
+    def _last_user_message(conversation_history: List[Dict]) -> str:
+        """取得對話歷史最後一則使用者訊息（最後一則不是使用者訊息時為空字串）"""
+        return conversation_history[-1]["content"] if conversation_history[-1]["role"] == "user" else ""
+    
+    @staticmethod
+    def _topic_text(conversation_history: List[Dict]) -> str:
+        """取得用於判斷主題一致性的最近三則訊息"""
+        return " ".join([msg["content"] for msg in conversation_history[-3:]])
+    
+    def score_batch(self, responses: Sequence[str], system_prompts: Sequence[Union[str, ScenarioProfile]],
+                    histories: Sequence[List[Dict]]) -> List[Dict[str, float]]:
+        """批次計算多個回應的各項評分
+        
+        所有語義相似度一次建立稀疏詞頻矩陣並以矩陣運算求得，
+        結果與逐一呼叫 score_response 相同。
+        
+        Args:
+            responses: 模型回應列表
+            system_prompts: 對應的系統提示詞（或場景評分資料）列表
+            histories: 對應的（本輪之前的）對話歷史列表
+            
+        Returns:
+            List[Dict[str, float]]: 每個回應的評分，順序與輸入相同
+        """
+        if not (len(responses) == len(system_prompts) == len(histories)):
+            raise ValueError("responses、system_prompts 與 histories 的長度必須相同")
+        
+        profiles = [self._resolve_profile(system_prompt) for system_prompt in system_prompts]
+        
+        # 收集所有需要計算的文字對
+        pairs: List[Tuple[str, str]] = []
+        role_index = []
+        coherence_index: List[Optional[Tuple[int, Optional[int]]]] = []
+        for response, profile, history in zip(responses, profiles, histories):
+            role_index.append(len(pairs))
+            pairs.append((response, profile.system_prompt))
+            
+            if len(history) < 2:
+                coherence_index.append(None)
+                continue
+            
+            response_pair = len(pairs)
+            pairs.append((response, self._last_user_message(history)))
+            topic_pair = None
+            if len(history) >= 3:
+                topic_pair = len(pairs)
+                pairs.append((self._topic_text(history), response))
+            coherence_index.append((response_pair, topic_pair))
+        
+        similarities = self._batch_semantic_similarity(pairs)
+        
+        results = []
+        for i, (response, profile) in enumerate(zip(responses, profiles)):
+            role_consistency = self._combine_role_consistency(response, profile, similarities[role_index[i]])
+            
+            if coherence_index[i] is None:
+                context_coherence = 0.8  # 對話剛開始，給予基礎分
+            else:
+                response_pair, topic_pair = coherence_index[i]
+                topic_consistency = similarities[topic_pair] if topic_pair is not None else 0.8
+                context_coherence = 0.6 * similarities[response_pair] + 0.4 * topic_consistency
+            
+            results.append({
+                "role_consistency": role_consistency,
+                "fluency": self.calculate_fluency_score(response),
+                "context_coherence": context_coherence
+            })
+        return results
+    
+    def _batch_semantic_similarity(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+        """批次計算多組文字對的語義相似度
+        
+        只建立一次詞彙表與稀疏詞頻矩陣，再依「每組文字對各自擬合 TF-IDF」的
+        idf 規則（兩邊都出現的詞 idf=1，否則為 ln(3/2)+1）以矩陣運算求出餘弦相似度，
+        與 _calculate_semantic_similarity 的結果一致。
+        """
+        similarities = np.zeros(len(pairs))
+        valid = [i for i, (text1, text2) in enumerate(pairs) if text1 and text2]
+        if not valid:
+            return similarities
+        
+        # 文字去重後建立一次詞頻矩陣
+        text_index: Dict[str, int] = {}
+        for i in valid:
+            for text in pairs[i]:
+                text_index.setdefault(text, len(text_index))
+        
+        counter = CountVectorizer(stop_words='english')
+        try:
+            counts = counter.fit_transform(list(text_index)).astype(np.float64).tocsr()
+        except ValueError:
+            # 所有文字都沒有可用詞彙（與逐對計算失敗時相同，給予中等分數）
+            similarities[valid] = 0.5
+            return similarities
+        
+        left = counts[[text_index[pairs[i][0]] for i in valid]]
+        right = counts[[text_index[pairs[i][1]] for i in valid]]
+        
+        # 共同出現的詞 idf 為 1，只出現在一邊的詞 idf 為 c
+        shared = (left > 0).multiply(right > 0)
+        dot = np.asarray(left.multiply(right).sum(axis=1)).ravel()
+        left_sq = left.multiply(left)
+        right_sq = right.multiply(right)
+        c2 = _PAIR_IDF_UNSHARED ** 2
+        left_norm = c2 * np.asarray(left_sq.sum(axis=1)).ravel() - (c2 - 1) * np.asarray(left_sq.multiply(shared).sum(axis=1)).ravel()
+        right_norm = c2 * np.asarray(right_sq.sum(axis=1)).ravel() - (c2 - 1) * np.asarray(right_sq.multiply(shared).sum(axis=1)).ravel()
+        
+        denominator = np.sqrt(left_norm * right_norm)
+        pair_similarity = np.divide(dot, denominator, out=np.zeros_like(dot), where=denominator > 0)
+        
+        # 兩邊都沒有可用詞彙時，逐對計算會失敗並給予中等分數
+        empty = (np.diff(left.indptr) == 0) & (np.diff(right.indptr) == 0)
+        pair_similarity[empty] = 0.5
+        
+        similarities[valid] = pair_similarity
+        return similarities
+    
     def _extract_role_keywords(self, system_prompt: str) -> List[str]:
         """從系統提示詞中提取角色關鍵詞"""
         # 簡單的關鍵詞提取
@@ -150,14 +351,13 @@ class RoleplayScorer:
         role_words = [word for word in keywords if word not in common_words and len(word) > 3]
         return list(set(role_words))
     
-    def _calculate_keyword_score(self, response: str, keywords: List[str]) -> float:
-        """計算關鍵詞匹配分數"""
-        if not keywords:
+    def _calculate_keyword_score(self, keyword_hits: Sequence[int]) -> float:
+        """計算關鍵詞匹配分數（keyword_hits 為各關鍵詞在回應中的出現次數）"""
+        if not keyword_hits:
             return 0.5
         
-        response_lower = response.lower()
-        matches = sum(1 for keyword in keywords if keyword in response_lower)
-        return matches / len(keywords)
+        matches = sum(1 for count in keyword_hits if count)
+        return matches / len(keyword_hits)
     
     def _calculate_semantic_similarity(self, text1: str, text2: str) -> float:
         """計算兩個文本的語義相似度"""
@@ -172,6 +372,35 @@ class RoleplayScorer:
         except:
             return 0.5  # 如果計算失敗，返回中等分數
     
+    def _profile_similarity(self, response: str, profile: ScenarioProfile) -> float:
+        """計算回應與場景提示詞的語義相似度
+        
+        使用預先計算的提示詞詞頻向量，依逐對 TF-IDF 的 idf 規則求餘弦相似度，
+        結果與 _calculate_semantic_similarity(response, system_prompt) 一致。
+        """
+        if not response or not profile.system_prompt:
+            return 0.0
+        
+        response_counts = Counter(self._analyzer(response))
+        if not response_counts and not profile.term_counts:
+            return 0.5  # 兩邊都沒有可用詞彙（與逐對計算失敗時相同）
+        
+        dot = 0.0
+        shared_response_sq = 0.0
+        shared_prompt_sq = 0.0
+        for term, count in response_counts.items():
+            prompt_count = profile.term_counts.get(term)
+            if prompt_count:
+                dot += count * prompt_count
+                shared_response_sq += count * count
+                shared_prompt_sq += prompt_count * prompt_count
+        
+        c2 = _PAIR_IDF_UNSHARED ** 2
+        response_norm_sq = c2 * sum(count * count for count in response_counts.values()) - (c2 - 1) * shared_response_sq
+        prompt_norm_sq = c2 * profile.term_norm_sq - (c2 - 1) * shared_prompt_sq
+        denominator = math.sqrt(response_norm_sq * prompt_norm_sq)
+        return dot / denominator if denominator > 0 else 0.0
+    
     def _check_sentence_structure(self, response: str) -> float:
         """檢查句子結構完整性"""
         sentences = re.split(r'[.!?]+', response)
@@ -232,7 +461,7 @@ class RoleplayScorer:
             return 0.8
         
         # 提取對話主題關鍵詞
-        all_messages = " ".join([msg["content"] for msg in conversation_history[-3:]])
+        all_messages = self._topic_text(conversation_history)
         current_topic_similarity = self._calculate_semantic_similarity(all_messages, current_response)
         
         return current_topic_similarity
@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from telemetry import Tracer, get_tracer, set_tracer
+from .scoring import RoleplayScorer
+
+# 每個工作行程各自持有的評分器（由 init_worker 建立）
+_worker_scorer: Optional[RoleplayScorer] = None
+
+def init_worker():
+    """工作行程初始化：建立行程內的評分器"""
+    global _worker_scorer
+    _worker_scorer = RoleplayScorer()
+
+def get_worker_scorer() -> RoleplayScorer:
+    """取得目前行程的評分器（尚未建立時即時建立）"""
+    if _worker_scorer is None:
+        init_worker()
+    return _worker_scorer
+
+def score_in_worker(response: str, system_prompt: str, conversation_history: List[Dict]) -> Dict[str, float]:
+    """在工作行程中計算單一回應的評分（場景評分資料由行程內的評分器快取）"""
+    scorer = get_worker_scorer()
+    return scorer.score_response(response, scorer.get_profile(system_prompt), conversation_history)
+
+def score_in_worker_traced(response: str, system_prompt: str,
+                           conversation_history: List[Dict]) -> Tuple[Dict[str, float], List[Dict[str, Any]]]:
+    """與 score_in_worker 相同，另回傳工作行程內記錄的追蹤區段，供主行程合併"""
+    tracer = Tracer(enabled=True)
+    previous = set_tracer(tracer)
+    try:
+        with tracer.span("score.worker", "scoring"):
+            scores = score_in_worker(response, system_prompt, conversation_history)
+    finally:
+        set_tracer(previous)
+    return scores, tracer.events
+
+class ScoringPool:
+    """以行程池非同步計算評分，讓 CPU 密集的評分不阻塞事件迴圈上的 LLM 請求"""
+
+    def __init__(self, workers: Optional[int] = None):
+        """
+        Args:
+            workers: 工作行程數，如未指定則使用 CPU 數
+        """
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """取得（必要時建立）行程池"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+        return self._executor
+
+    async def score(self, response: str, system_prompt: str, conversation_history: List[Dict]) -> Dict[str, float]:
+        """將評分工作送到行程池並等待結果"""
+        loop = asyncio.get_running_loop()
+        tracer = get_tracer()
+        if not tracer.enabled:
+            return await loop.run_in_executor(
+                self._get_executor(), score_in_worker, response, system_prompt, conversation_history
+            )
+        scores, events = await loop.run_in_executor(
+            self._get_executor(), score_in_worker_traced, response, system_prompt, conversation_history
+        )
+        tracer.merge(events, lane="scoring")
+        return scores
+
+    def shutdown(self):
+        """關閉行程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -1,70 +1,248 @@
 import asyncio
 import json
-import time
 from datetime import datetime
+from functools import partial
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 
 from config import config
-from providers import OllamaClient, OpenRouterClient
+from providers import AdaptiveRateLimiter, CachedProvider, OllamaClient, OpenRouterClient, ResponseCache
 from prompts import get_scenario_prompt, get_all_scenarios
-from .scoring import RoleplayScorer, calculate_overall_score
+from telemetry import get_metrics, span, set_lane, reset_lane
+from .scoring import RoleplayScorer, ScenarioProfile, calculate_overall_score
+from .catalog import ResultCatalog
+from .scoring_pool import ScoringPool
+from .history_window import HistoryWindow
+from .sampling import mean_scores, overall_from_samples, summarize_samples
+from .matrix import MatrixTarget, group_cells_by_model, summarize_matrix
+from .token_usage import estimate_message_tokens, estimate_tokens, merge_token_usage, summarize_token_usage
 
 class RoleplayTestRunner:
     """角色扮演測試執行器"""
     
-    def __init__(self):
+    def __init__(self, cache_mode: Optional[str] = None, scoring_workers: Optional[int] = None,
+                 history_window: Optional[HistoryWindow] = None):
+        """
+        Args:
+            cache_mode: 回應快取模式（read-through、write-only 或 bypass），如未指定則使用設定值
+            scoring_workers: 評分行程池的工作行程數（0 表示在事件迴圈內直接評分），如未指定則使用設定值
+            history_window: 每輪送出的對話歷史策略，如未指定則使用設定值
+        """
         self.scorer = RoleplayScorer()
-        self.llm_client = self._create_llm_client()
+        if scoring_workers is None:
+            scoring_workers = config.scoring_workers
+        self.scoring_pool = ScoringPool(scoring_workers) if scoring_workers > 0 else None
+        self.cache_mode = cache_mode if cache_mode is not None else config.response_cache_mode
+        if history_window is None:
+            history_window = HistoryWindow(
+                config.history_strategy, config.history_token_budget, config.history_keep_turns
+            )
+        self.history_window = history_window
+        # 所有客戶端共用同一個回應快取，容量上限以整個快取檔計算
+        self.response_cache = None
+        if self.cache_mode != "bypass":
+            self.response_cache = ResponseCache(
+                config.response_cache_path, max_bytes=config.response_cache_max_mb * 1024 * 1024
+            )
+        self.llm_client = self._wrap_with_cache(self._create_llm_client(), self.cache_mode)
+        # 評估矩陣中各受測對象的客戶端，以及同一服務提供者共用的速率限制器
+        self._target_clients: Dict[tuple, Any] = {}
+        self._provider_limiters: Dict[str, AdaptiveRateLimiter] = {}
+        # 各模型的預先載入工作（並行的場景共用同一次載入）
+        self._model_loads: Dict[str, asyncio.Future] = {}
         self.results_dir = Path("data/results")
         self.results_dir.mkdir(parents=True, exist_ok=True)
+        self.catalog = ResultCatalog(config.result_catalog_path)
     
-    def _create_llm_client(self):
-        """根據設定建立 LLM 客戶端"""
-        if config.provider == "ollama":
+    def _create_llm_client(self, target: Optional[MatrixTarget] = None,
+                           rate_limiter: Optional[AdaptiveRateLimiter] = None):
+        """根據設定（或指定的受測對象）建立 LLM 客戶端"""
+        if target is None:
+            config.validate()
+            provider = config.provider
+            model = config.current_model
+            max_tokens = config.max_tokens
+            temperature = config.temperature
+        else:
+            provider, model, temperature, max_tokens = target.key
+        if rate_limiter is None:
+            rate_limiter = self._create_rate_limiter()
+        
+        if provider == "ollama":
             return OllamaClient(
                 base_url=config.ollama_base_url,
-                model=config.ollama_model,
-                max_tokens=config.max_tokens,
-                temperature=config.temperature
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                pool_size=config.http_pool_size,
+                timeout=config.http_timeout,
+                connect_timeout=config.http_connect_timeout,
+                rate_limiter=rate_limiter,
+                api=config.ollama_api,
+                keep_alive=config.ollama_keep_alive
             )
-        elif config.provider == "openrouter":
+        elif provider == "openrouter":
             if not config.openrouter_api_key:
                 raise ValueError("OpenRouter API 金鑰未設定")
             return OpenRouterClient(
                 api_key=config.openrouter_api_key,
-                model=config.openrouter_model,
-                max_tokens=config.max_tokens,
-                temperature=config.temperature
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                pool_size=config.http_pool_size,
+                timeout=config.http_timeout,
+                connect_timeout=config.http_connect_timeout,
+                rate_limiter=rate_limiter
             )
         else:
-            raise ValueError(f"不支援的服務提供者: {config.provider}")
+            raise ValueError(f"不支援的服務提供者: {provider}")
     
-    async def run_single_test(self, scenario_key: str, test_rounds: Optional[int] = None) -> Dict[str, Any]:
+    def _get_target_client(self, target: MatrixTarget):
+        """取得（必要時建立）受測對象的客戶端；同一服務提供者的客戶端共用速率限制器"""
+        if target.key not in self._target_clients:
+            if target.provider not in self._provider_limiters:
+                self._provider_limiters[target.provider] = self._create_rate_limiter()
+            self._target_clients[target.key] = self._wrap_with_cache(
+                self._create_llm_client(target, self._provider_limiters[target.provider]),
+                self.cache_mode
+            )
+        return self._target_clients[target.key]
+    
+    def _wrap_with_cache(self, llm_client, cache_mode: str):
+        """依快取模式為 LLM 客戶端加上磁碟回應快取（共用 self.response_cache，由 close() 關閉）"""
+        if cache_mode == "bypass":
+            return llm_client
+        return CachedProvider(llm_client, self.response_cache, mode=cache_mode, close_cache=False)
+
+    async def _ensure_model_loaded(self, llm_client) -> Optional[Dict[str, Optional[float]]]:
+        """預先載入模型（僅 Ollama），讓權重載入時間不被算進第一輪的回應時間
+        
+        Returns:
+            由本次呼叫實際執行的載入時間；模型已載入、不支援或已停用預先載入時回傳 None
+        """
+        load_model = getattr(llm_client, "load_model", None)
+        if load_model is None or not config.ollama_preload:
+            return None
+        
+        model = llm_client.model
+        if model in self._model_loads:
+            try:
+                await self._model_loads[model]
+            except Exception:
+                pass
+            return None
+        
+        self._model_loads[model] = asyncio.ensure_future(load_model(config.ollama_keep_alive))
+        try:
+            with span("model.load", "provider", model=model):
+                model_load = await self._model_loads[model]
+        except Exception as e:
+            # 載入失敗不中斷測試，第一輪請求時服務端仍會載入模型
+            print(f"預先載入模型 {model} 失敗: {str(e)}")
+            return None
+        print(f"已預先載入模型 {model}: {model_load['load_time']:.2f}s")
+        return model_load
+    
+    async def _unload_model(self, llm_client):
+        """卸載模型並釋放顯示記憶體（僅 Ollama）"""
+        unload_model = getattr(llm_client, "unload_model", None)
+        if unload_model is None:
+            return
+        self._model_loads.pop(llm_client.model, None)
+        try:
+            await unload_model()
+            print(f"已卸載模型 {llm_client.model}")
+        except Exception as e:
+            print(f"卸載模型 {llm_client.model} 失敗: {str(e)}")
+
+    def _create_rate_limiter(self) -> AdaptiveRateLimiter:
+        """根據設定建立自適應速率限制器"""
+        return AdaptiveRateLimiter(
+            initial_concurrency=config.rate_limit_initial_concurrency,
+            max_concurrency=config.rate_limit_max_concurrency,
+            max_retries=config.rate_limit_max_retries
+        )
+
+    async def close(self):
+        """關閉 LLM 客戶端的連線池、評分行程池與結果索引"""
+        await self.llm_client.close()
+        for llm_client in self._target_clients.values():
+            await llm_client.close()
+        self._target_clients.clear()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        self.catalog.close()
+        if self.scoring_pool is not None:
+            self.scoring_pool.shutdown()
+
+    async def run_single_test(self, scenario_key: str, test_rounds: Optional[int] = None,
+                              target: Optional[MatrixTarget] = None, sample: Optional[int] = None,
+                              first_response: Optional[Any] = None) -> Dict[str, Any]:
         """執行單一場景測試
         
         Args:
             scenario_key: 場景鍵值
             test_rounds: 測試輪數，如未指定則使用設定值
+            target: 受測對象（服務提供者、模型與取樣參數），如未指定則使用設定值
+            sample: 多次取樣時的樣本編號（不經過回應快取，否則各樣本會得到相同的回應）
+            first_response: 已預先取得的第一輪 (回應內容, 延遲指標) 或例外（多次取樣以 n 參數批次取得）
             
         Returns:
             測試結果字典
         """
+        # 並行的場景各自一條追蹤軌道
+        lane = scenario_key if target is None else f"{target.label}/{scenario_key}"
+        lane_token = set_lane(lane if sample is None else f"{lane}#{sample}")
+        try:
+            with span("scenario", scenario=scenario_key, sample=sample):
+                return await self._run_scenario_rounds(scenario_key, test_rounds, target, sample, first_response)
+        finally:
+            # 依序執行的場景共用同一個工作，結束後還原軌道，之後的區段才不會記到此場景
+            reset_lane(lane_token)
+    
+    def _scenario_client(self, target: Optional[MatrixTarget], sampled: bool = False):
+        """取得場景使用的 LLM 客戶端與服務提供者名稱（多次取樣時略過回應快取）"""
+        if target is None:
+            llm_client, provider = self.llm_client, config.provider
+        else:
+            llm_client, provider = self._get_target_client(target), target.provider
+        if sampled and isinstance(llm_client, CachedProvider):
+            llm_client = llm_client.provider
+        return llm_client, provider
+    
+    async def _run_scenario_rounds(self, scenario_key: str, test_rounds: Optional[int],
+                                   target: Optional[MatrixTarget], sample: Optional[int] = None,
+                                   first_response: Optional[Any] = None) -> Dict[str, Any]:
+        """執行單一場景的多輪對話並彙整結果"""
+        llm_client, provider = self._scenario_client(target, sampled=sample is not None)
+        model = llm_client.model
+        
         if test_rounds is None:
             test_rounds = config.test_rounds
         
         scenario = get_scenario_prompt(scenario_key)
+        # 同一場景的關鍵詞、特質與提示詞向量只需計算一次
+        profile = self.scorer.get_profile(scenario["system_prompt"])
         conversation_history = []
         test_results = []
+        score_tasks = []
         
         print(f"開始測試場景: {scenario['name']}")
-        print(f"使用模型: {config.current_model}")
+        print(f"使用模型: {model}")
         print(f"測試輪數: {test_rounds}")
+        if self.history_window.strategy != "full":
+            print(f"歷史策略: {self.history_window.describe()}")
         print("-" * 50)
         
         # 健康檢查
-        if not await self.llm_client.health_check():
-            raise RuntimeError(f"{config.provider} 服務不可用")
+        with span("health_check", "provider"):
+            healthy = await llm_client.health_check()
+        if not healthy:
+            raise RuntimeError(f"{provider} 服務不可用")
+        
+        # 預先載入模型，載入時間與生成延遲分開記錄
+        model_load = await self._ensure_model_loaded(llm_client)
+        conversation = self._start_conversation(llm_client, scenario["system_prompt"])
         
         # 執行多輪對話測試
         for round_num in range(test_rounds):
@@ -79,63 +257,210 @@ class RoleplayTestRunner:
                 ]
             
             # 建立訊息 - 只傳遞使用者與助理的對話歷史，不重複系統提示詞
-            messages = self._build_roleplay_messages(
-                scenario["system_prompt"],
-                user_message,
-                conversation_history
-            )
+            # （增量對話模式由服務端保留歷史，只送出新的使用者訊息；完整訊息仍用於估算提示詞長度）
+            # 依歷史策略挑選本輪送出的歷史（評分仍使用完整歷史）
+            with span("build_messages", round=round_num + 1):
+                system_prompt, history, history_info = self.history_window.select(
+                    scenario["system_prompt"], conversation_history, user_message
+                )
+                messages = self._build_roleplay_messages(system_prompt, user_message, history)
             
-            # 發送請求並計時
-            start_time = time.time()
+            # 以串流方式發送請求，分別量測首 token 延遲與解碼速度
             try:
-                response = await self.llm_client.chat_completion(messages)
-                response_time = time.time() - start_time
+                if round_num == 0 and first_response is not None:
+                    if isinstance(first_response, Exception):
+                        raise first_response
+                    response, latency = first_response
+                elif conversation is not None:
+                    response, latency = await conversation.timed_send(user_message)
+                else:
+                    response, latency = await llm_client.timed_stream_completion(messages)
+                response_time = latency["response_time"]
             except Exception as e:
                 print(f"第 {round_num + 1} 輪測試失敗: {str(e)}")
                 response = f"錯誤: {str(e)}"
                 response_time = 0
+                latency = {}
             
-            # 計算評分
-            scores = self._calculate_scores(response, scenario["system_prompt"], conversation_history)
-            
-            # 記錄本輪結果
+            # 記錄本輪結果（分數稍後填入）
             round_result = {
                 "round": round_num + 1,
                 "user_message": user_message,
                 "model_response": response,
                 "response_time": response_time,
-                "scores": scores,
-                "overall_score": calculate_overall_score(scores)
+                "time_to_first_token": latency.get("time_to_first_token"),
+                "inter_token_latency": latency.get("inter_token_latency"),
+                "decode_tokens_per_sec": latency.get("decode_tokens_per_sec"),
+                "server_timings": latency.get("server_timings"),
+                "context_reuse": latency.get("context_reuse"),
+                "usage": latency.get("usage"),
+                "sampled_with_n": latency.get("sampled_with_n", False),
+                "estimated_prompt_tokens": estimate_message_tokens(messages),
+                "history": history_info,
+                "cache_hit": latency.get("cache_hit", False)
             }
             
             test_results.append(round_result)
+            get_metrics().inc("rounds_completed_total", scenario=scenario_key, model=model)
+            
+            # 評分送到背景計算，下一輪請求不必等待評分完成；評分完成時即填入分數並輸出本輪結果
+            score_task = asyncio.ensure_future(
+                self._calculate_scores_async(response, profile, list(conversation_history))
+            )
+            score_task.add_done_callback(partial(self._finish_round, round_result))
+            score_tasks.append(score_task)
             
             # 更新對話歷史
             conversation_history.append({"role": "user", "content": user_message})
             conversation_history.append({"role": "assistant", "content": response})
-            
-            # 輸出本輪結果
-            self._print_round_result(round_result)
+        
+        # 等待剩餘的評分完成（此區段只含最後仍需等待的評分時間；評分失敗時在此拋出）
+        with span("scoring.wait"):
+            await asyncio.gather(*score_tasks)
         
         # 計算平均分數
         avg_scores = self._calculate_average_scores(test_results)
         
         # 建立最終結果
+        # 矩陣中同一場景會在同一秒內完成多次，以受測對象區分結果檔名
+        test_id_prefix = scenario_key if target is None else f"{scenario_key}_{target.label}"
+        if sample is not None:
+            test_id_prefix = f"{test_id_prefix}_s{sample}"
         final_result = {
-            "test_id": f"{scenario_key}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "test_id": f"{test_id_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
             "timestamp": datetime.now().isoformat(),
             "scenario": scenario_key,
             "scenario_name": scenario["name"],
-            "model": config.current_model,
-            "provider": config.provider,
+            "model": model,
+            "provider": provider,
+            "temperature": llm_client.temperature,
+            "max_tokens": llm_client.max_tokens,
             "test_rounds": test_rounds,
+            "sample": sample,
+            "model_load": model_load,
+            "incremental_context": conversation is not None,
+            "history_strategy": self.history_window.describe(),
             "round_results": test_results,
             "average_scores": avg_scores,
-            "overall_average_score": calculate_overall_score(avg_scores)
+            "overall_average_score": calculate_overall_score(avg_scores),
+            "token_usage": summarize_token_usage(test_results, estimate_tokens(scenario["system_prompt"]))
         }
         
         return final_result
     
+    async def run_sampled_test(self, scenario_key: str, samples: int, test_rounds: Optional[int] = None,
+                               target: Optional[MatrixTarget] = None) -> Dict[str, Any]:
+        """同一場景同時執行多次獨立對話，彙整各評分維度的平均值、標準差與信賴區間
+        
+        各次對話的第一輪提示詞相同，先以 n 參數在一次請求中取得多個回應（服務端支援時），
+        不足的數量與之後的輪次（各次對話的歷史已不同）以並行請求執行，
+        總耗時接近單次對話而不是 samples 倍。多次取樣不經過回應快取。
+        
+        Args:
+            scenario_key: 場景鍵值
+            samples: 獨立對話的次數（1 表示一般的單次測試）
+            test_rounds: 每次對話的測試輪數，如未指定則使用設定值
+            target: 受測對象，如未指定則使用設定值
+            
+        Returns:
+            合併的測試結果（round_results 含各次對話的所有輪次，以 sample 欄位區分）
+        """
+        if samples <= 1:
+            return await self.run_single_test(scenario_key, test_rounds, target)
+        
+        llm_client, provider = self._scenario_client(target, sampled=True)
+        scenario = get_scenario_prompt(scenario_key)
+        print(f"開始多次取樣: {scenario['name']}（{samples} 次獨立對話）")
+        
+        # 第一輪的提示詞在各次對話間相同，可一次取得多個回應；
+        # 增量對話需要由第一輪建立服務端的 context，因此不使用 n 參數
+        first_responses: List[Any] = []
+        incremental = getattr(llm_client, "start_conversation", None) is not None and config.ollama_incremental_context
+        if not incremental:
+            messages = self._build_roleplay_messages(scenario["system_prompt"], scenario["conversation_starter"])
+            try:
+                with span("sample_completions", "provider", n=samples):
+                    first_responses = (await llm_client.sample_completions(messages, samples))[:samples]
+            except Exception as e:
+                print(f"以 n 參數取樣失敗，改為個別請求: {str(e)}")
+        print(f"第一輪以 n 參數取得 {len(first_responses)} 個回應，其餘 {samples - len(first_responses)} 次對話個別請求")
+        first_responses += [None] * (samples - len(first_responses))
+        
+        outcomes = await asyncio.gather(
+            *(self.run_single_test(scenario_key, test_rounds, target, sample, first_response)
+              for sample, first_response in enumerate(first_responses)),
+            return_exceptions=True
+        )
+        
+        sample_results = []
+        round_results = []
+        for sample, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                print(f"第 {sample + 1} 次對話失敗: {str(outcome)}")
+                sample_results.append({"sample": sample, "error": str(outcome)})
+                continue
+            sample_results.append({
+                "sample": sample,
+                "average_scores": outcome["average_scores"],
+                "overall_average_score": outcome["overall_average_score"],
+                "token_usage": outcome["token_usage"]
+            })
+            round_results.extend({**round_result, "sample": sample} for round_result in outcome["round_results"])
+        
+        successful = [outcome for outcome in outcomes if not isinstance(outcome, Exception)]
+        if not successful:
+            raise outcomes[0]
+        
+        test_id_prefix = scenario_key if target is None else f"{scenario_key}_{target.label}"
+        final_result = {
+            "test_id": f"{test_id_prefix}_samples{samples}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "timestamp": datetime.now().isoformat(),
+            "scenario": scenario_key,
+            "scenario_name": scenario["name"],
+            "model": llm_client.model,
+            "provider": provider,
+            "temperature": llm_client.temperature,
+            "max_tokens": llm_client.max_tokens,
+            "test_rounds": successful[0]["test_rounds"],
+            "samples": samples,
+            "used_n_parameter": sum(1 for first_response in first_responses if first_response is not None),
+            "model_load": next((outcome["model_load"] for outcome in successful if outcome.get("model_load")), None),
+            "incremental_context": successful[0]["incremental_context"],
+            "history_strategy": self.history_window.describe(),
+            "sample_results": sample_results,
+            "round_results": round_results,
+            "token_usage": merge_token_usage([outcome["token_usage"] for outcome in successful])
+        }
+        self._combine_sample_scores(final_result)
+        return final_result
+    
+    @classmethod
+    def _combine_sample_scores(cls, result: Dict[str, Any]):
+        """由各輪分數重新計算各次對話與整體的平均分數及分數分布（就地更新，重新評分後也使用）"""
+        for sample_result in result["sample_results"]:
+            if "error" in sample_result:
+                continue
+            rounds = [r for r in result["round_results"] if r["sample"] == sample_result["sample"]]
+            sample_result["average_scores"] = cls._calculate_average_scores(rounds)
+            sample_result["overall_average_score"] = calculate_overall_score(sample_result["average_scores"])
+        result["average_scores"] = mean_scores(result["sample_results"])
+        result["overall_average_score"] = overall_from_samples(result["sample_results"])
+        result["sample_statistics"] = summarize_samples(result["sample_results"])
+    
+    def _start_conversation(self, llm_client, system_prompt: str):
+        """建立增量對話（僅 Ollama 且已啟用時），否則回傳 None
+        
+        增量對話直接使用服務端保留的 context，不經過回應快取；
+        服務端保留的是完整歷史，因此使用歷史視窗策略時不採用增量對話。
+        """
+        start_conversation = getattr(llm_client, "start_conversation", None)
+        if start_conversation is None or not config.ollama_incremental_context:
+            return None
+        if self.history_window.strategy != "full":
+            print(f"歷史策略 {self.history_window.strategy} 與增量對話模式不相容，改為每輪送出視窗內的歷史")
+            return None
+        return start_conversation(system_prompt)
+    
     def _build_roleplay_messages(self, system_prompt: str, user_message: str, conversation_history: List[Dict] = None) -> List[Dict]:
         """建立角色扮演專用的訊息格式
         
@@ -155,15 +480,24 @@ class RoleplayTestRunner:
         messages.append({"role": "user", "content": user_message})
         return messages
 
-    def _calculate_scores(self, response: str, system_prompt: str, conversation_history: List[Dict]) -> Dict[str, float]:
+    def _calculate_scores(self, response: str, profile: ScenarioProfile, conversation_history: List[Dict]) -> Dict[str, float]:
         """計算各項評分"""
-        return {
-            "role_consistency": self.scorer.calculate_role_consistency_score(response, system_prompt),
-            "fluency": self.scorer.calculate_fluency_score(response),
-            "context_coherence": self.scorer.calculate_context_coherence_score(conversation_history, response)
-        }
+        return self.scorer.score_response(response, profile, conversation_history)
     
-    def _calculate_average_scores(self, test_results: List[Dict]) -> Dict[str, float]:
+    async def _calculate_scores_async(self, response: str, profile: ScenarioProfile, conversation_history: List[Dict]) -> Dict[str, float]:
+        """計算各項評分（有行程池時交由工作行程計算，不阻塞事件迴圈）"""
+        registry = get_metrics()
+        registry.inc("scoring_queue_depth")
+        try:
+            with span("scoring", "scoring", pooled=self.scoring_pool is not None):
+                if self.scoring_pool is None:
+                    return self._calculate_scores(response, profile, conversation_history)
+                return await self.scoring_pool.score(response, profile.system_prompt, conversation_history)
+        finally:
+            registry.dec("scoring_queue_depth")
+    
+    @staticmethod
+    def _calculate_average_scores(test_results: List[Dict]) -> Dict[str, float]:
         """計算平均分數"""
         if not test_results:
             return {}
@@ -177,21 +511,52 @@ class RoleplayTestRunner:
         
         return avg_scores
     
+    def _finish_round(self, round_result: Dict, score_task: asyncio.Future):
+        """評分完成時填入本輪分數並輸出本輪結果（評分失敗由等待評分的一方處理）"""
+        if score_task.cancelled() or score_task.exception() is not None:
+            return
+        scores = score_task.result()
+        round_result["scores"] = scores
+        round_result["overall_score"] = calculate_overall_score(scores)
+        self._print_round_result(round_result)
+    
     def _print_round_result(self, round_result: Dict):
         """輸出單輪測試結果"""
         print(f"輪次 {round_result['round']}:")
         print(f"  問題: {round_result['user_message']}")
         print(f"  回應: {round_result['model_response'][:100]}...")
-        print(f"  回應時間: {round_result['response_time']:.2f}s")
+        if round_result.get('cache_hit'):
+            print("  回應時間: -（快取命中）")
+        else:
+            print(f"  回應時間: {round_result['response_time']:.2f}s")
+        if round_result.get('time_to_first_token') is not None:
+            print(f"  首 token 延遲: {round_result['time_to_first_token']:.2f}s")
+        if round_result.get('decode_tokens_per_sec') is not None:
+            print(f"  解碼速度: {round_result['decode_tokens_per_sec']:.1f} tokens/s")
+        server_timings = round_result.get('server_timings')
+        if server_timings and server_timings.get('prompt_eval_duration') is not None:
+            print(f"  提示詞處理: {server_timings['prompt_eval_count']} tokens，{server_timings['prompt_eval_duration']:.2f}s")
+        context_reuse = round_result.get('context_reuse')
+        if context_reuse and context_reuse.get('reused_tokens') is not None:
+            print(f"  沿用 context: {context_reuse['reused_tokens']} tokens"
+                  + (f"（約省下 {context_reuse['estimated_prompt_eval_saved']:.2f}s 提示詞處理）"
+                     if context_reuse.get('estimated_prompt_eval_saved') is not None else ""))
+        usage = round_result.get('usage')
+        if usage:
+            print(f"  Token 用量: 提示詞 {usage['prompt_tokens']}，回應 {usage['completion_tokens']}"
+                  + (f"（快取命中 {usage['cached_tokens']}）" if usage.get('cached_tokens') else ""))
         print(f"  評分: {round_result['overall_score']:.2f}")
         print(f"  詳細分數: {round_result['scores']}")
         print("-" * 30)
     
-    async def run_comprehensive_test(self, scenarios: Optional[List[str]] = None) -> Dict[str, Any]:
+    async def run_comprehensive_test(self, scenarios: Optional[List[str]] = None, concurrency: int = 1,
+                                     samples: int = 1) -> Dict[str, Any]:
         """執行全面測試（多個場景）
         
         Args:
             scenarios: 要測試的場景列表，如未指定則測試所有場景
+            concurrency: 同時執行的場景數上限（各場景內的輪次仍依序進行）
+            samples: 每個場景的獨立對話次數（見 run_sampled_test）
             
         Returns:
             全面測試結果
@@ -203,20 +568,32 @@ class RoleplayTestRunner:
         all_scenario_results = []
         
         print("開始全面測試")
+        if concurrency > 1:
+            print(f"並行場景數: {concurrency}")
         print("=" * 60)
         
-        for scenario in scenarios:
-            try:
-                result = await self.run_single_test(scenario)
-                comprehensive_results[scenario] = result
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def run_scenario(scenario: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    result = await self.run_sampled_test(scenario, samples)
+                    
+                    # 儲存單一場景結果
+                    self._save_results(result)
+                    return result
+                    
+                except Exception as e:
+                    print(f"場景 {scenario} 測試失敗: {str(e)}")
+                    return {"error": str(e)}
+        
+        # 場景之間互相獨立，可同時執行；結果依原始場景順序彙整
+        scenario_outcomes = await asyncio.gather(*(run_scenario(scenario) for scenario in scenarios))
+        
+        for scenario, result in zip(scenarios, scenario_outcomes):
+            comprehensive_results[scenario] = result
+            if "error" not in result:
                 all_scenario_results.append(result)
-                
-                # 儲存單一場景結果
-                self._save_results(result)
-                
-            except Exception as e:
-                print(f"場景 {scenario} 測試失敗: {str(e)}")
-                comprehensive_results[scenario] = {"error": str(e)}
         
         # 計算總體統計
         overall_stats = self._calculate_overall_stats(all_scenario_results)
@@ -227,6 +604,8 @@ class RoleplayTestRunner:
             "model": config.current_model,
             "provider": config.provider,
             "tested_scenarios": scenarios,
+            "samples": samples,
+            "history_strategy": self.history_window.describe(),
             "scenario_results": comprehensive_results,
             "overall_statistics": overall_stats
         }
@@ -236,7 +615,108 @@ class RoleplayTestRunner:
         
         return final_comprehensive_result
     
-    def _calculate_overall_stats(self, all_results: List[Dict]) -> Dict[str, Any]:
+    async def run_matrix_test(self, targets: List[MatrixTarget], scenarios: Optional[List[str]] = None,
+                              test_rounds: Optional[int] = None, concurrency: int = 1,
+                              provider_concurrency: Optional[Dict[str, int]] = None,
+                              unload_models: bool = True, samples: int = 1) -> Dict[str, Any]:
+        """執行評估矩陣（受測對象 × 場景）
+        
+        所有格子在同一個行程內排程：場景的評分資料、評分行程池與結果索引只建立一次，
+        同一服務提供者的請求共用自適應速率限制器。
+        Ollama 的格子依模型分批逐批執行（每批開始時預先載入模型、結束後卸載），
+        避免交錯請求不同模型造成反覆置換權重；其他服務提供者的格子與之同時進行。
+        
+        Args:
+            targets: 受測對象列表（見 matrix.expand_targets）
+            scenarios: 要測試的場景列表，如未指定則測試所有場景
+            test_rounds: 每格的測試輪數，如未指定則使用設定值
+            concurrency: 同時執行的格子數上限
+            provider_concurrency: 各服務提供者同時執行的格子數上限（例如單機 Ollama 設為 1）
+            unload_models: 每批 Ollama 模型完成後是否卸載模型
+            samples: 每格的獨立對話次數（見 run_sampled_test）
+            
+        Returns:
+            彙整的矩陣結果
+        """
+        if scenarios is None:
+            scenarios = get_all_scenarios()
+        if test_rounds is None:
+            test_rounds = config.test_rounds
+        provider_concurrency = provider_concurrency or {}
+        cells = [(target, scenario) for target in targets for scenario in scenarios]
+        
+        print("開始評估矩陣")
+        print(f"受測對象: {len(targets)}，場景: {len(scenarios)}，共 {len(cells)} 格")
+        print("=" * 60)
+        
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        provider_semaphores = {
+            target.provider: asyncio.Semaphore(max(1, provider_concurrency.get(target.provider, len(cells))))
+            for target in targets
+        }
+        
+        async def run_cell(target: MatrixTarget, scenario: str) -> Dict[str, Any]:
+            cell = {"target": target.label, **target.to_dict(), "scenario": scenario}
+            # 先取得服務提供者的名額，等待中的格子才不會佔用整體名額
+            async with provider_semaphores[target.provider], semaphore:
+                try:
+                    result = await self.run_sampled_test(scenario, samples, test_rounds, target)
+                    self._save_results(result)
+                except Exception as e:
+                    print(f"{target.label} / {scenario} 測試失敗: {str(e)}")
+                    cell["error"] = str(e)
+                    return cell
+            
+            response_times = [r["response_time"] for r in result["round_results"] if r["response_time"]]
+            cell.update({
+                "test_id": result["test_id"],
+                "model_load": result.get("model_load"),
+                "average_scores": result["average_scores"],
+                "overall_average_score": result["overall_average_score"],
+                "token_usage": result.get("token_usage"),
+                "sample_statistics": result.get("sample_statistics"),
+                "average_response_time": sum(response_times) / len(response_times) if response_times else None
+            })
+            return cell
+        
+        cell_results: List[Optional[Dict[str, Any]]] = [None] * len(cells)
+        
+        async def run_cells(indices: List[int]):
+            outcomes = await asyncio.gather(*(run_cell(*cells[index]) for index in indices))
+            for index, outcome in zip(indices, outcomes):
+                cell_results[index] = outcome
+        
+        async def run_model_batches(batches: List[tuple]):
+            for model, indices in batches:
+                print(f"開始模型批次: {model}（{len(indices)} 格）")
+                await run_cells(indices)
+                if unload_models:
+                    await self._unload_model(self._get_target_client(cells[indices[0]][0]))
+        
+        model_batches, other_cells = group_cells_by_model(cells)
+        await asyncio.gather(run_model_batches(model_batches), run_cells(other_cells))
+        
+        final_matrix_result = {
+            "matrix_test_id": f"matrix_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "timestamp": datetime.now().isoformat(),
+            "targets": [target.to_dict() for target in targets],
+            "scenarios": scenarios,
+            "test_rounds": test_rounds,
+            "samples": samples,
+            "history_strategy": self.history_window.describe(),
+            "model_loads": {
+                cell["model"]: cell["model_load"] for cell in cell_results if cell.get("model_load") is not None
+            },
+            "cells": cell_results,
+            "summary": summarize_matrix(cell_results)
+        }
+        
+        self._save_matrix_results(final_matrix_result)
+        
+        return final_matrix_result
+    
+    @classmethod
+    def _calculate_overall_stats(cls, all_results: List[Dict]) -> Dict[str, Any]:
         """計算總體統計數據"""
         if not all_results:
             return {}
@@ -254,35 +734,120 @@ class RoleplayTestRunner:
             scores = [result["average_scores"][key] for result in successful_results]
             avg_scores[key] = sum(scores) / len(scores)
         
-        # 計算回應時間統計
+        # 計算回應時間統計（快取命中的輪次沒有實際請求，不計入）
         response_times = []
         for result in successful_results:
             for round_result in result["round_results"]:
-                response_times.append(round_result["response_time"])
+                if round_result["response_time"] is not None:
+                    response_times.append(round_result["response_time"])
         
         return {
             "average_scores": avg_scores,
             "overall_average_score": calculate_overall_score(avg_scores),
             "response_time_stats": {
-                "average": sum(response_times) / len(response_times),
-                "min": min(response_times),
-                "max": max(response_times)
+                "average": sum(response_times) / len(response_times) if response_times else None,
+                "min": min(response_times) if response_times else None,
+                "max": max(response_times) if response_times else None,
+                "cache_hits": sum(
+                    1 for result in successful_results for round_result in result["round_results"]
+                    if round_result.get("cache_hit")
+                )
             },
+            "streaming_stats": cls._calculate_streaming_stats(successful_results),
+            "server_timing_stats": cls._calculate_server_timing_stats(successful_results),
+            "context_reuse_stats": cls._calculate_context_reuse_stats(successful_results),
+            "token_usage_stats": merge_token_usage(
+                [result["token_usage"] for result in successful_results if result.get("token_usage")]
+            ),
+            # 模型載入時間不計入回應時間，另外加總
+            "model_load_time": sum(
+                result["model_load"]["load_time"] for result in successful_results if result.get("model_load")
+            ),
             "success_rate": len(successful_results) / len(all_results)
         }
     
+    @staticmethod
+    def _calculate_streaming_stats(results: List[Dict]) -> Dict[str, Optional[float]]:
+        """計算串流延遲指標的平均值（忽略沒有串流資料的輪次）"""
+        stats = {}
+        for key in ("time_to_first_token", "inter_token_latency", "decode_tokens_per_sec"):
+            values = [
+                round_result[key]
+                for result in results
+                for round_result in result["round_results"]
+                if round_result.get(key) is not None
+            ]
+            stats[f"average_{key}"] = sum(values) / len(values) if values else None
+        return stats
+    
+    @staticmethod
+    def _calculate_server_timing_stats(results: List[Dict]) -> Dict[str, Optional[float]]:
+        """計算服務端時間統計（Ollama 原生 API）的平均值與總計（忽略沒有服務端資料的輪次）"""
+        timings = [
+            round_result["server_timings"]
+            for result in results
+            for round_result in result["round_results"]
+            if round_result.get("server_timings")
+        ]
+        stats = {"rounds": len(timings)}
+        if not timings:
+            return stats
+        for key in timings[0]:
+            values = [timing[key] for timing in timings if timing.get(key) is not None]
+            stats[f"average_{key}"] = sum(values) / len(values) if values else None
+        # 以總量計算的速度（較不受單輪長度差異影響）
+        for prefix in ("prompt_eval", "eval"):
+            count = sum(timing.get(f"{prefix}_count") or 0 for timing in timings)
+            duration = sum(timing.get(f"{prefix}_duration") or 0 for timing in timings)
+            stats[f"total_{prefix}_count"] = count
+            stats[f"total_{prefix}_duration"] = duration
+            stats[f"overall_{prefix}_tokens_per_sec"] = count / duration if duration else None
+        return stats
+    
+    @staticmethod
+    def _calculate_context_reuse_stats(results: List[Dict]) -> Dict[str, Any]:
+        """計算增量對話模式沿用 context 的總量（忽略沒有沿用資料的輪次）"""
+        reuses = [
+            round_result["context_reuse"]
+            for result in results
+            for round_result in result["round_results"]
+            if round_result.get("context_reuse") and round_result["context_reuse"].get("reused_tokens") is not None
+        ]
+        prompt_tokens = sum(reuse["prompt_tokens"] for reuse in reuses)
+        reused_tokens = sum(reuse["reused_tokens"] for reuse in reuses)
+        return {
+            "rounds": len(reuses),
+            "total_prompt_tokens": prompt_tokens,
+            "total_reused_tokens": reused_tokens,
+            "reused_ratio": reused_tokens / prompt_tokens if prompt_tokens else None,
+            "estimated_prompt_eval_saved": sum(reuse.get("estimated_prompt_eval_saved") or 0 for reuse in reuses)
+        }
+    
     def _save_results(self, result: Dict, filename: Optional[str] = None):
         """儲存測試結果到檔案"""
         if filename is None:
             filename = f"{result['test_id']}.json"
         
         file_path = self.results_dir / filename
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        with span("persist", "io", file=filename):
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.catalog.record(file_path, result)
         
         print(f"結果已儲存至: {file_path}")
     
     def _save_comprehensive_results(self, result: Dict):
         """儲存全面測試結果"""
         filename = f"{result['comprehensive_test_id']}.json"
-        self._save_results(result, filename)
\ No newline at end of file
+        self._save_results(result, filename)
+    
+    def _save_matrix_results(self, result: Dict):
+        """儲存評估矩陣結果（各格的場景結果已個別儲存並登錄索引）"""
+        matrix_dir = self.results_dir / "matrix"
+        matrix_dir.mkdir(parents=True, exist_ok=True)
+        file_path = matrix_dir / f"{result['matrix_test_id']}.json"
+        with span("persist", "io", file=file_path.name):
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+        
+        print(f"矩陣結果已儲存至: {file_path}")
\ No newline at end of file
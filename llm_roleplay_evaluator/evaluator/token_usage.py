@@ -0,0 +1,84 @@
+import re
+from typing import Dict, List, Any, Iterable, Optional
+
+# 拉丁字母詞（每 4 個字元切成一段，每段約一個 token）
+_LATIN_CHUNK = re.compile(r"[A-Za-z0-9\u00c0-\u024f']{1,4}")
+
+# 聊天模板為每則訊息加上的角色標記等固定 token 數（粗估）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """粗估文字的 token 數（服務端沒有回報用量，或需要與模型無關的長度時使用）
+
+    中日韓文字每字約一個 token，拉丁字母詞每 4 個字元約一個 token，其餘標點與符號各算一個。
+    以空白切詞計算長度會把整段中文算成一個詞，因此不適用於中文場景。
+    """
+    # 拉丁字母詞切段計數後移除，剩下的非空白字元（中日韓文字與標點）各算一個；
+    # 不逐一比對每個字元，評分迴圈中呼叫時的成本接近 split()
+    stripped, latin_tokens = _LATIN_CHUNK.subn("", text)
+    return latin_tokens + len("".join(stripped.split()))
+
+def estimate_message_tokens(messages: Iterable[Dict[str, str]]) -> int:
+    """粗估訊息列表的 token 數（每則訊息另加角色標記的固定開銷）"""
+    return sum(estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def summarize_token_usage(round_results: Iterable[Dict[str, Any]],
+                          system_prompt_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """彙整各輪的 token 用量（忽略服務端沒有回報用量的輪次）
+
+    completion_tokens_per_sec 以總回應時間計算（含首 token 延遲），反映端到端的產出速度；
+    system_prompt_share 為每輪重新送出的系統提示詞佔提示詞的比例。各模型分詞器不同，
+    佔比的分子與分母都使用粗估值（estimated_prompt_tokens），不與服務端回報的用量混用。
+
+    Args:
+        round_results: 各輪結果（使用 usage、response_time 與 estimated_prompt_tokens 欄位）
+        system_prompt_tokens: 系統提示詞的 token 數（粗估），如未指定則不計算系統提示詞佔比
+    """
+    round_results = list(round_results)
+    rounds = [round_result for round_result in round_results if round_result.get("usage")]
+    prompt_tokens = sum(round_result["usage"].get("prompt_tokens") or 0 for round_result in rounds)
+    completion_tokens = sum(round_result["usage"].get("completion_tokens") or 0 for round_result in rounds)
+    cached_tokens = sum(round_result["usage"].get("cached_tokens") or 0 for round_result in rounds)
+    response_time = sum(round_result.get("response_time") or 0 for round_result in rounds)
+
+    summary = {
+        "rounds": len(rounds),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "response_time": response_time,
+        "prompt_completion_ratio": prompt_tokens / completion_tokens if completion_tokens else None,
+        "completion_tokens_per_sec": completion_tokens / response_time if response_time else None,
+        "total_tokens_per_sec": (prompt_tokens + completion_tokens) / response_time if response_time else None
+    }
+    if system_prompt_tokens is not None:
+        estimated = [round_result["estimated_prompt_tokens"] for round_result in round_results
+                     if round_result.get("estimated_prompt_tokens")]
+        summary["system_prompt_tokens"] = system_prompt_tokens
+        summary["estimated_rounds"] = len(estimated)
+        summary["estimated_prompt_tokens"] = sum(estimated)
+        summary["system_prompt_share"] = system_prompt_tokens * len(estimated) / sum(estimated) if estimated else None
+    return summary
+
+def merge_token_usage(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """合併多個場景的 token 用量彙整（比例與速度以總量重新計算）"""
+    totals = {
+        key: sum(summary.get(key) or 0 for summary in summaries)
+        for key in ("rounds", "prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens", "response_time")
+    }
+    response_time = totals["response_time"]
+    system_tokens = sum(
+        summary["system_prompt_tokens"] * summary["estimated_rounds"]
+        for summary in summaries if summary.get("system_prompt_tokens") is not None
+    )
+    estimated_prompt_tokens = sum(summary.get("estimated_prompt_tokens") or 0 for summary in summaries)
+    return {
+        **totals,
+        "prompt_completion_ratio": (
+            totals["prompt_tokens"] / totals["completion_tokens"] if totals["completion_tokens"] else None
+        ),
+        "completion_tokens_per_sec": totals["completion_tokens"] / response_time if response_time else None,
+        "total_tokens_per_sec": totals["total_tokens"] / response_time if response_time else None,
+        "system_prompt_share": system_tokens / estimated_prompt_tokens if estimated_prompt_tokens else None
+    }
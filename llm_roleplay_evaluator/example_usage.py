@@ -24,7 +24,10 @@ async def example_single_scenario_test():
     test_runner = RoleplayTestRunner()
     
     # 執行歷史人物場景測試
-    result = await test_runner.run_single_test("historical_figure", test_rounds=2)
+    try:
+        result = await test_runner.run_single_test("historical_figure", test_rounds=2)
+    finally:
+        await test_runner.close()
     
     print(f"測試完成！總體分數: {result['overall_average_score']:.3f}")
     return result
@@ -37,7 +40,10 @@ async def example_comprehensive_test():
     test_runner = RoleplayTestRunner()
     
     # 執行所有場景的測試
-    result = await test_runner.run_comprehensive_test()
+    try:
+        result = await test_runner.run_comprehensive_test()
+    finally:
+        await test_runner.close()
     
     print(f"全面測試完成！總體平均分數: {result['overall_statistics']['overall_average_score']:.3f}")
     return result
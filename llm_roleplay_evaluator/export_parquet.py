@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+將測試結果匯出為 Parquet 資料集（每輪一列，依模型與日期分割）
+預設為增量匯出，只處理新增或修改過的結果檔
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 添加專案路徑到 Python 路徑
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+def main():
+    """Parquet 匯出程式入口點"""
+    parser = argparse.ArgumentParser(description="將測試結果匯出為分割的 Parquet 資料集")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="要匯出的結果檔（預設: data/results 中的 *.json 與 *.jsonl）"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="data/parquet/rounds",
+        help="資料集根目錄（預設: data/parquet/rounds）"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="忽略匯出清單，全部重新匯出"
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="匯出後讀回資料集，檢查欄位與各執行的列數是否與匯出清單一致"
+    )
+
+    args = parser.parse_args()
+
+    if args.paths:
+        paths = [Path(p) for p in args.paths]
+    else:
+        results_dir = Path("data/results")
+        paths = sorted(list(results_dir.glob("*.json")) + list(results_dir.glob("*.jsonl")))
+
+    if not paths:
+        print("找不到任何結果檔")
+        return
+
+    # pandas 與 pyarrow 只在實際匯出時才匯入
+    from evaluator.export import ParquetExporter
+
+    exporter = ParquetExporter(args.output_dir)
+    counts = exporter.export(paths, full=args.full)
+    print(f"完成: {counts['exported']} 個結果檔已匯出（{counts['rows']} 列），"
+          f"{counts['unchanged']} 個未變更略過，{counts['skipped']} 個無法辨識，"
+          f"{counts['removed']} 個來源已刪除而移除")
+    print(f"資料集位置: {args.output_dir}")
+
+    if args.verify:
+        problems = exporter.verify()
+        if problems:
+            print("讀回檢查失敗:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print("讀回檢查通過")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+查詢測試結果歷史
+透過結果索引（SQLite）篩選，不必載入每個結果檔
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 添加專案路徑到 Python 路徑
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from config import config
+from evaluator.catalog import RESULT_KINDS, ResultCatalog
+
+def main():
+    """歷史查詢程式入口點"""
+    parser = argparse.ArgumentParser(description="查詢測試結果歷史")
+    parser.add_argument("--model", help="只列出此模型的結果")
+    parser.add_argument("--provider", help="只列出此服務提供者的結果")
+    parser.add_argument("--scenario", help="只列出包含此場景的結果")
+    parser.add_argument(
+        "--kind",
+        choices=list(RESULT_KINDS),
+        action="append",
+        help="結果種類，可重複指定（預設: 全部）"
+    )
+    parser.add_argument("--since", help="只列出此時間之後的結果（ISO 格式，例如 2025-01-01）")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="最多列出筆數（預設: 20）"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="從結果目錄重建索引"
+    )
+    parser.add_argument(
+        "--results-dir",
+        default="data/results",
+        help="結果目錄（預設: data/results）"
+    )
+
+    args = parser.parse_args()
+
+    catalog = ResultCatalog(config.result_catalog_path)
+    try:
+        if args.rebuild:
+            counts = catalog.rebuild(args.results_dir)
+            print(f"索引已重建: {counts['indexed']} 個結果，{counts['skipped']} 個檔案略過")
+            return
+
+        # 登錄新增或修改過的結果檔（例如從其他機器複製到結果目錄）
+        catalog.sync(args.results_dir)
+        runs = catalog.query(
+            model=args.model,
+            provider=args.provider,
+            scenario=args.scenario,
+            kinds=args.kind,
+            since=args.since,
+            limit=args.limit
+        )
+        if not runs:
+            print("找不到符合條件的結果")
+            return
+
+        print(f"{'時間':<21}{'種類':<16}{'模型':<24}{'服務提供者':<12}{'總體分數':>10}  結果檔")
+        for run in runs:
+            score = f"{run['overall_score']:.3f}" if run["overall_score"] is not None else "N/A"
+            print(f"{(run['timestamp'] or '')[:19]:<21}{run['kind']:<16}{run['model'] or '-':<24}"
+                  f"{run['provider'] or '-':<12}{score:>10}  {Path(run['path']).name}")
+            if args.scenario is not None:
+                scenario_score = catalog.scenario_scores(run["path"]).get(args.scenario)
+                if scenario_score is not None:
+                    print(f"{'':<21}{args.scenario}: {scenario_score:.3f}")
+    finally:
+        catalog.close()
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ LLM 角色扮演能力評估程式主程式
 import asyncio
 import argparse
 import sys
+from datetime import datetime
 from pathlib import Path
 
 # 添加專案路徑到 Python 路徑
@@ -14,8 +15,10 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from config import config
-from evaluator import RoleplayTestRunner
+from evaluator.history_window import HISTORY_STRATEGIES, HistoryWindow
 from prompts import get_all_scenarios, get_scenario_prompt
+from providers import CACHE_MODES
+from telemetry import MetricsFileWriter, MetricsServer, enable_tracing, get_metrics
 
 async def main():
     """主程式入口點"""
@@ -31,11 +34,75 @@ async def main():
         default=config.test_rounds,
         help=f"測試輪數（預設: {config.test_rounds}）"
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=config.test_concurrency,
+        help=f"全面測試時同時執行的場景數（預設: {config.test_concurrency}）"
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=1,
+        help="每個場景同時執行的獨立對話次數，輸出各評分維度的平均值、標準差與信賴區間（預設: 1）"
+    )
+    parser.add_argument(
+        "--scoring-workers",
+        type=int,
+        default=config.scoring_workers,
+        help=f"評分行程池的工作行程數，0 表示不使用行程池（預設: {config.scoring_workers}）"
+    )
+    parser.add_argument(
+        "--cache",
+        choices=list(CACHE_MODES),
+        default=config.response_cache_mode,
+        help=f"回應快取模式（預設: {config.response_cache_mode}）"
+    )
+    parser.add_argument(
+        "--history-strategy",
+        choices=list(HISTORY_STRATEGIES),
+        default=config.history_strategy,
+        help=f"每輪送出的對話歷史策略（預設: {config.history_strategy}）"
+    )
+    parser.add_argument(
+        "--history-budget",
+        type=int,
+        default=config.history_token_budget,
+        help=f"sliding 與 summarize 策略的每輪提示詞 token 預算（預設: {config.history_token_budget}）"
+    )
+    parser.add_argument(
+        "--history-turns",
+        type=int,
+        default=config.history_keep_turns,
+        help=f"first-last 策略保留的最近輪數（預設: {config.history_keep_turns}）"
+    )
     parser.add_argument(
         "--comprehensive",
         action="store_true",
         help="執行全面測試（所有場景）"
     )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="記錄各階段耗時並輸出 Chrome 追蹤格式檔（預設: data/traces/trace_<時間>.json）"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="啟動指標端點（/metrics 為 Prometheus 格式，/metrics.json 為 JSON 快照）"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="定期將指標快照寫入此 JSON 檔"
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=10.0,
+        help="指標檔的寫入間隔秒數（預設: 10）"
+    )
     parser.add_argument(
         "--list-scenarios",
         action="store_true",
@@ -52,28 +119,64 @@ async def main():
             print(f"  {scenario_key}: {scenario['name']}")
         return
     
+    # 評估器依賴 scikit-learn 等套件，只在實際執行測試時才匯入
+    from evaluator import RoleplayTestRunner
+    
+    tracer = enable_tracing() if args.trace is not None else None
+    
     # 建立測試執行器
     try:
-        test_runner = RoleplayTestRunner()
+        test_runner = RoleplayTestRunner(
+            cache_mode=args.cache,
+            scoring_workers=args.scoring_workers,
+            history_window=HistoryWindow(args.history_strategy, args.history_budget, args.history_turns)
+        )
     except Exception as e:
         print(f"初始化測試執行器失敗: {e}")
         return
     
+    # 長時間執行時可即時觀察吞吐量與服務端負載
+    metrics_server = MetricsServer(get_metrics()) if args.metrics_port is not None else None
+    metrics_writer = MetricsFileWriter(get_metrics(), args.metrics_file, args.metrics_interval) if args.metrics_file else None
+    if metrics_server is not None:
+        print(f"指標端點: {await metrics_server.start(port=args.metrics_port)}")
+    if metrics_writer is not None:
+        metrics_writer.start()
+    
     # 執行測試
     try:
         if args.comprehensive or args.scenario is None:
             # 全面測試
             print("執行全面測試...")
-            result = await test_runner.run_comprehensive_test()
+            result = await test_runner.run_comprehensive_test(concurrency=args.concurrency, samples=args.samples)
             print_comprehensive_results(result)
         else:
             # 單一場景測試
-            result = await test_runner.run_single_test(args.scenario, args.rounds)
+            result = await test_runner.run_sampled_test(args.scenario, args.samples, args.rounds)
             print_single_scenario_results(result)
             
     except Exception as e:
         print(f"測試執行失敗: {e}")
         return
+    finally:
+        await test_runner.close()
+        if metrics_writer is not None:
+            await metrics_writer.stop()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        if tracer is not None:
+            write_trace(tracer, args.trace)
+
+def write_trace(tracer, path: str):
+    """輸出各階段耗時摘要並寫入追蹤檔"""
+    if not path:
+        path = f"data/traces/trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    print("\n" + "="*60)
+    print("各階段耗時")
+    print("="*60)
+    print(tracer.format_summary())
+    trace_path = tracer.export(path)
+    print(f"追蹤檔已儲存至: {trace_path}（可用 chrome://tracing 或 https://ui.perfetto.dev 開啟）")
 
 def print_single_scenario_results(result: dict):
     """輸出單一場景測試結果"""
@@ -86,22 +189,83 @@ def print_single_scenario_results(result: dict):
     print(f"服務提供者: {result['provider']}")
     print(f"測試時間: {result['timestamp']}")
     print(f"測試輪數: {result['test_rounds']}")
+    history_strategy = result.get('history_strategy') or {}
+    if history_strategy.get('strategy', 'full') != 'full':
+        print(f"歷史策略: {history_strategy}")
     
     print("\n平均分數:")
     for score_name, score_value in result['average_scores'].items():
         print(f"  {score_name.replace('_', ' ').title()}: {score_value:.3f}")
     
     print(f"總體平均分數: {result['overall_average_score']:.3f}")
+    print_sample_statistics(result.get('sample_statistics'))
+    print_token_usage(result.get('token_usage'))
     
     print("\n各輪詳細結果:")
     for round_result in result['round_results']:
-        print(f"輪次 {round_result['round']}:")
+        if round_result.get('sample') is not None:
+            print(f"第 {round_result['sample'] + 1} 次對話，輪次 {round_result['round']}:")
+        else:
+            print(f"輪次 {round_result['round']}:")
         print(f"  問題: {round_result['user_message']}")
-        print(f"  回應時間: {round_result['response_time']:.2f}s")
+        if round_result.get('cache_hit'):
+            print("  回應時間: -（快取命中）")
+        else:
+            print(f"  回應時間: {round_result['response_time']:.2f}s")
+        if round_result.get('time_to_first_token') is not None:
+            print(f"  首 token 延遲: {round_result['time_to_first_token']:.2f}s")
+        if round_result.get('decode_tokens_per_sec') is not None:
+            print(f"  解碼速度: {round_result['decode_tokens_per_sec']:.1f} tokens/s")
+        server_timings = round_result.get('server_timings')
+        if server_timings and server_timings.get('prompt_eval_duration') is not None:
+            print(f"  提示詞處理: {server_timings['prompt_eval_count']} tokens，{server_timings['prompt_eval_duration']:.2f}s")
+        context_reuse = round_result.get('context_reuse')
+        if context_reuse and context_reuse.get('reused_tokens') is not None:
+            print(f"  沿用 context: {context_reuse['reused_tokens']}/{context_reuse['prompt_tokens']} tokens")
+        usage = round_result.get('usage')
+        if usage:
+            print(f"  Token 用量: 提示詞 {usage['prompt_tokens']}，回應 {usage['completion_tokens']}")
+        history = round_result.get('history')
+        if history and history['turns_dropped']:
+            print(f"  歷史: 送出 {history['turns_sent']} 輪，省略 {history['turns_dropped']} 輪")
         print(f"  總體分數: {round_result['overall_score']:.3f}")
         print(f"  詳細分數: { {k: f'{v:.3f}' for k, v in round_result['scores'].items()} }")
         print()
 
+def print_sample_statistics(sample_statistics: dict):
+    """輸出多次取樣的分數分布（平均值 ± 標準差與信賴區間；單次測試時不輸出，樣本不足時信賴區間標示 n/a）"""
+    if not sample_statistics or not sample_statistics.get('overall_score_stats'):
+        return
+    print(f"\n多次取樣: 成功 {sample_statistics['successful_samples']}/{sample_statistics['samples']} 次對話，"
+          f"{sample_statistics['confidence']:.0%} bootstrap 信賴區間"
+          f"（少於 {sample_statistics['min_ci_samples']} 次成功對話時不計算）")
+    rows = [(name.replace('_', ' ').title(), stats) for name, stats in sample_statistics['score_stats'].items()]
+    rows.append(("總體分數", sample_statistics['overall_score_stats']))
+    for name, stats in rows:
+        line = f"  {name}: {stats['mean']:.3f}"
+        if stats['std'] is not None:
+            line += f" ± {stats['std']:.3f}"
+        if stats['ci_low'] is not None:
+            line += f"  [{stats['ci_low']:.3f}, {stats['ci_high']:.3f}]"
+        else:
+            line += "  CI n/a"
+        print(line)
+
+def print_token_usage(token_usage: dict):
+    """輸出 token 用量彙整（服務端沒有回報用量時不輸出）"""
+    if not token_usage or not token_usage.get('rounds'):
+        return
+    print("\nToken 用量:")
+    print(f"  提示詞 tokens: {token_usage['prompt_tokens']}，回應 tokens: {token_usage['completion_tokens']}")
+    if token_usage.get('cached_tokens'):
+        print(f"  提示詞快取命中: {token_usage['cached_tokens']} tokens")
+    if token_usage.get('prompt_completion_ratio') is not None:
+        print(f"  提示詞:回應 比例: {token_usage['prompt_completion_ratio']:.1f}")
+    if token_usage.get('completion_tokens_per_sec') is not None:
+        print(f"  回應 tokens/s（含首 token 延遲）: {token_usage['completion_tokens_per_sec']:.1f}")
+    if token_usage.get('system_prompt_share') is not None:
+        print(f"  系統提示詞佔提示詞（粗估）: {token_usage['system_prompt_share']:.0%}")
+
 def print_comprehensive_results(result: dict):
     """輸出全面測試結果"""
     print("\n" + "="*80)
@@ -128,9 +292,39 @@ def print_comprehensive_results(result: dict):
     
     print("\n回應時間統計:")
     rt_stats = stats['response_time_stats']
-    print(f"  平均: {rt_stats['average']:.2f}s")
-    print(f"  最小: {rt_stats['min']:.2f}s")
-    print(f"  最大: {rt_stats['max']:.2f}s")
+    if rt_stats['average'] is not None:
+        print(f"  平均: {rt_stats['average']:.2f}s")
+        print(f"  最小: {rt_stats['min']:.2f}s")
+        print(f"  最大: {rt_stats['max']:.2f}s")
+    if rt_stats.get('cache_hits'):
+        print(f"  快取命中（不計入回應時間）: {rt_stats['cache_hits']} 輪")
+    
+    streaming_stats = stats.get('streaming_stats', {})
+    if streaming_stats.get('average_time_to_first_token') is not None:
+        print(f"  平均首 token 延遲: {streaming_stats['average_time_to_first_token']:.2f}s")
+    if streaming_stats.get('average_decode_tokens_per_sec') is not None:
+        print(f"  平均解碼速度: {streaming_stats['average_decode_tokens_per_sec']:.1f} tokens/s")
+    
+    server_stats = stats.get('server_timing_stats', {})
+    if server_stats.get('rounds'):
+        print("\n服務端時間統計（Ollama 原生 API）:")
+        if server_stats.get('average_prompt_eval_count') is not None:
+            print(f"  平均提示詞 tokens: {server_stats['average_prompt_eval_count']:.0f}")
+            print(f"  平均提示詞處理時間: {server_stats['average_prompt_eval_duration']:.2f}s")
+        if server_stats.get('overall_prompt_eval_tokens_per_sec') is not None:
+            print(f"  提示詞處理速度: {server_stats['overall_prompt_eval_tokens_per_sec']:.1f} tokens/s")
+        if server_stats.get('overall_eval_tokens_per_sec') is not None:
+            print(f"  解碼速度: {server_stats['overall_eval_tokens_per_sec']:.1f} tokens/s")
+    reuse_stats = stats.get('context_reuse_stats', {})
+    if reuse_stats.get('rounds'):
+        print("\n增量對話（沿用服務端 context）:")
+        print(f"  沿用 tokens: {reuse_stats['total_reused_tokens']}/{reuse_stats['total_prompt_tokens']}")
+        if reuse_stats['reused_ratio'] is not None:
+            print(f"  沿用比例: {reuse_stats['reused_ratio']:.0%}")
+        print(f"  估計省下的提示詞處理時間: {reuse_stats['estimated_prompt_eval_saved']:.2f}s")
+    if stats.get('model_load_time'):
+        print(f"  模型載入時間（不計入回應時間）: {stats['model_load_time']:.2f}s")
+    print_token_usage(stats.get('token_usage_stats'))
     
     print("\n各場景表現:")
     for scenario_key in result['tested_scenarios']:
@@ -139,7 +333,15 @@ def print_comprehensive_results(result: dict):
             print(f"  {scenario_key}: 失敗 - {scenario_result['error']}")
         else:
             score = scenario_result['overall_average_score']
-            print(f"  {scenario_key}: {score:.3f}")
+            overall_stats = (scenario_result.get('sample_statistics') or {}).get('overall_score_stats')
+            line = f"  {scenario_key}: {score:.3f}"
+            if overall_stats and overall_stats['std'] is not None:
+                line += f" ± {overall_stats['std']:.3f}"
+                if overall_stats['ci_low'] is not None:
+                    line += f"  [{overall_stats['ci_low']:.3f}, {overall_stats['ci_high']:.3f}]"
+                else:
+                    line += "  CI n/a"
+            print(line)
 
 def print_configuration():
     """輸出當前設定"""
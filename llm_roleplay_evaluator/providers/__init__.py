@@ -1,13 +1,47 @@
 # LLM 提供者模組初始化檔案
-from .base import BaseLLMProvider, LLMError, ProviderUnavailableError, RateLimitError
-from .ollama_client import OllamaClient
-from .openrouter_client import OpenRouterClient
+# HTTP 傳輸層與各客戶端依賴 aiohttp，在第一次存取時才匯入對應的子模組
+import importlib
+
+from .base import AdaptiveRateLimiter, BaseLLMProvider, LLMError, ProviderUnavailableError, RateLimitError, parse_usage
+from .cache import CACHE_MODES, CachedProvider, ResponseCache
+
+_LAZY_ATTRIBUTES = {
+    'AsyncHTTPTransport': '.http_transport',
+    'HTTPResponse': '.http_transport',
+    'HTTPStatusError': '.http_transport',
+    'OllamaClient': '.ollama_client',
+    'OllamaConversation': '.ollama_client',
+    'OLLAMA_APIS': '.ollama_client',
+    'parse_ollama_timings': '.ollama_client',
+    'OpenRouterClient': '.openrouter_client'
+}
 
 __all__ = [
     'BaseLLMProvider',
+    'AdaptiveRateLimiter',
+    'CachedProvider',
+    'ResponseCache',
+    'CACHE_MODES',
+    'AsyncHTTPTransport',
+    'HTTPResponse',
+    'HTTPStatusError',
     'OllamaClient', 
+    'OllamaConversation',
+    'OLLAMA_APIS',
+    'parse_ollama_timings',
     'OpenRouterClient',
     'LLMError',
     'ProviderUnavailableError',
-    'RateLimitError'
-]
\ No newline at end of file
+    'RateLimitError',
+    'parse_usage'
+]
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,5 +1,30 @@
+import asyncio
+import random
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Mapping, Optional, Tuple
+
+from telemetry import get_metrics, span
+
+def parse_usage(usage: Optional[Dict[str, Any]]) -> Optional[Dict[str, Optional[int]]]:
+    """整理 OpenAI 相容回應的 usage 區塊（含提示詞快取命中的 token 數）
+
+    Returns:
+        {"prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens"}；沒有用量資料時回傳 None
+    """
+    if not usage:
+        return None
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": usage.get("total_tokens", (prompt_tokens or 0) + (completion_tokens or 0)),
+        "cached_tokens": details.get("cached_tokens")
+    }
 
 class BaseLLMProvider(ABC):
     """LLM 服務提供者基礎類別"""
@@ -8,6 +33,8 @@ class BaseLLMProvider(ABC):
         self.model = model
         self.max_tokens = max_tokens
         self.temperature = temperature
+        # 自適應速率限制器（由子類別設定；None 表示不限制）
+        self.rate_limiter: Optional["AdaptiveRateLimiter"] = None
     
     @abstractmethod
     async def chat_completion(self, messages: List[Dict[str, str]]) -> str:
@@ -30,6 +57,190 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    async def stream_chat_completion(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """以串流方式發送聊天完成請求
+
+        預設實作會等待完整回應後一次輸出；支援串流的子類別應覆寫此方法。
+
+        Args:
+            messages: 訊息列表，包含角色和內容
+
+        Yields:
+            回應內容的增量片段
+        """
+        yield await self.chat_completion(messages)
+
+    async def timed_stream_completion(self, messages: List[Dict[str, str]]) -> Tuple[str, Dict[str, Optional[float]]]:
+        """以串流方式取得完整回應，並量測延遲指標
+
+        每個串流片段視為一個 token（OpenAI 相容串流通常每個片段一個 token）。
+
+        Args:
+            messages: 訊息列表，包含角色和內容
+
+        Returns:
+            (完整回應內容, 延遲指標)；指標包含 response_time、time_to_first_token、
+            inter_token_latency、decode_tokens_per_sec、streamed_tokens，
+            以及服務端回報的 token 用量 usage（見 parse_usage；沒有回報時為 None）
+        """
+        usage: Dict[str, Any] = {}
+        content, metrics = await self._time_stream(self._stream_chat(messages, usage))
+        metrics["usage"] = usage or None
+        return content, metrics
+
+    def _stream_chat(self, messages: List[Dict[str, str]], usage: Dict[str, Any]) -> AsyncIterator[str]:
+        """串流對話完成，串流結束時將服務端回報的 token 用量寫入 usage
+
+        預設實作不取得用量；能讀取 usage 區塊的子類別應覆寫此方法。
+        """
+        return self.stream_chat_completion(messages)
+
+    async def _time_stream(self, stream: AsyncIterator[str]) -> Tuple[str, Dict[str, Optional[float]]]:
+        """消耗串流並量測延遲指標（指標內容見 timed_stream_completion）"""
+        registry = get_metrics()
+        registry.inc("llm_requests_in_flight", model=self.model)
+        try:
+            with span("llm.stream", "provider", model=self.model) as trace_args:
+                start_time = time.perf_counter()
+                first_token_time = None
+                last_token_time = None
+                parts = []
+
+                async for delta in stream:
+                    now = time.perf_counter()
+                    if first_token_time is None:
+                        first_token_time = now
+                    last_token_time = now
+                    parts.append(delta)
+
+                end_time = time.perf_counter()
+                trace_args["tokens"] = len(parts)
+        except Exception:
+            registry.inc("llm_request_errors_total", model=self.model)
+            raise
+        finally:
+            registry.dec("llm_requests_in_flight", model=self.model)
+        registry.inc("llm_requests_total", model=self.model)
+        registry.inc("llm_tokens_generated_total", len(parts), model=self.model)
+        registry.observe("llm_request_duration_seconds", end_time - start_time, model=self.model)
+        if first_token_time is not None:
+            registry.observe("llm_time_to_first_token_seconds", first_token_time - start_time, model=self.model)
+        decode_time = (last_token_time - first_token_time) if first_token_time is not None else 0.0
+        decode_intervals = len(parts) - 1
+
+        metrics = {
+            "response_time": end_time - start_time,
+            "time_to_first_token": (first_token_time - start_time) if first_token_time is not None else None,
+            "inter_token_latency": decode_time / decode_intervals if decode_intervals > 0 else None,
+            "decode_tokens_per_sec": decode_intervals / decode_time if decode_intervals > 0 and decode_time > 0 else None,
+            "streamed_tokens": len(parts)
+        }
+        return "".join(parts), metrics
+
+    async def sample_completions(self, messages: List[Dict[str, str]], n: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """在一次請求中取得多個獨立回應（OpenAI 相容的 n 參數）
+
+        預設實作不支援 n 參數並回傳空列表；服務端回傳的選項也可能少於 n，
+        呼叫端應以個別請求補足不足的數量。
+
+        Returns:
+            [(回應內容, 延遲指標)]
+        """
+        return []
+
+    @staticmethod
+    def _parse_choices(result: Dict[str, Any], response_time: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """將含多個選項的非串流回應拆成各自的 (回應內容, 延遲指標)
+
+        所有選項在同一個請求中產生，只有完整回應時間；用量為整個請求的總和，
+        記在第一個選項，加總時才不會重複計算提示詞 tokens。
+        """
+        usage = parse_usage(result.get("usage"))
+        samples = []
+        choices = sorted(result.get("choices") or [], key=lambda choice: choice.get("index", 0))
+        for position, choice in enumerate(choices):
+            samples.append((choice["message"]["content"], {
+                "response_time": response_time,
+                "time_to_first_token": None,
+                "inter_token_latency": None,
+                "decode_tokens_per_sec": None,
+                "streamed_tokens": None,
+                "usage": usage if position == 0 else None,
+                "sampled_with_n": True
+            }))
+        return samples
+
+    async def close(self):
+        """釋放連線等資源（子類別視需要覆寫）"""
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _send_with_rate_limit(self, send: Callable[[], Awaitable[Any]]) -> Any:
+        """透過速率限制器送出請求
+
+        Args:
+            send: 送出請求的協程函式，回傳具 status 與 headers 的回應
+
+        Returns:
+            最後一次請求的回應（重試用盡時可能仍為 429/503）
+        """
+        if self.rate_limiter is None:
+            return await send()
+        return await self.rate_limiter.run(send)
+
+    @asynccontextmanager
+    async def _stream_with_rate_limit(self, open_stream: Callable[[], Any]):
+        """透過速率限制器開啟串流回應，串流期間持續佔用一個並行名額
+
+        Args:
+            open_stream: 回傳非同步 context manager（產生具 status 與 headers 的回應）的函式
+        """
+        limiter = self.rate_limiter
+        if limiter is None:
+            async with open_stream() as response:
+                yield response
+            return
+
+        attempt = 0
+        while True:
+            await limiter.acquire()
+            try:
+                async with open_stream() as response:
+                    throttled = response.status in limiter.THROTTLE_STATUSES
+                    if throttled:
+                        delay = limiter.on_throttled(response.headers, attempt)
+                    else:
+                        limiter.on_success(response.headers)
+
+                    if not throttled or attempt >= limiter.max_retries:
+                        yield response
+                        return
+            finally:
+                await limiter.release()
+
+            attempt += 1
+            limiter.retry_count += 1
+            with span("rate_limit.backoff", "provider", attempt=attempt):
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _stream_options() -> Dict[str, Any]:
+        """OpenAI 相容串流請求的選項：要求在最後一個片段附上 usage"""
+        return {"include_usage": True}
+
+    @staticmethod
+    def _extract_stream_delta(chunk: Dict[str, Any]) -> str:
+        """從 OpenAI 相容的串流片段中取出增量文字"""
+        choices = chunk.get("choices") or []
+        if not choices:
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+
     def _build_messages(self, system_prompt: str, user_message: str, conversation_history: List[Dict] = None) -> List[Dict]:
         """建立訊息格式
         
@@ -59,4 +270,186 @@ class ProviderUnavailableError(LLMError):
 
 class RateLimitError(LLMError):
     """速率限制錯誤"""
-    pass
\ No newline at end of file
+    pass
+
+class AdaptiveRateLimiter:
+    """自適應速率限制器（AIMD 並行視窗 + 抖動退避重試）
+
+    成功的請求讓並行視窗以加法遞增（每個完整視窗約 +1），
+    遇到 429/503 時視窗乘法遞減並依 Retry-After 或指數退避加抖動後重試。
+    回應中的 x-ratelimit-remaining / x-ratelimit-reset 標頭會讓所有請求暫停到配額重置。
+    """
+
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, initial_concurrency: int = 4, min_concurrency: int = 1, max_concurrency: int = 16,
+                 increase_step: float = 1.0, decrease_factor: float = 0.5, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        Args:
+            initial_concurrency: 初始並行視窗
+            min_concurrency: 並行視窗下限
+            max_concurrency: 並行視窗上限
+            increase_step: 每個完整視窗成功後增加的並行數
+            decrease_factor: 遭到限流時視窗的縮小比例
+            max_retries: 遭到限流時的最大重試次數
+            base_delay: 指數退避的基礎秒數
+            max_delay: 單次退避的最長秒數
+        """
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        self.in_flight = 0
+        self.throttled_count = 0
+        self.retry_count = 0
+        self._resume_at = 0.0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self._condition_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def window(self) -> int:
+        """目前允許同時進行的請求數"""
+        return max(self.min_concurrency, int(self.limit))
+
+    def _get_condition(self) -> asyncio.Condition:
+        """取得目前事件迴圈上的條件變數"""
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    async def acquire(self):
+        """等待可用的並行名額（並遵守配額重置前的暫停）"""
+        condition = self._get_condition()
+        with span("rate_limit.wait", "provider"):
+            while True:
+                pause = self._resume_at - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                async with condition:
+                    if self.in_flight < self.window and time.monotonic() >= self._resume_at:
+                        self.in_flight += 1
+                        return
+                    await condition.wait()
+
+    async def release(self):
+        """釋放並行名額"""
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        """取得一個並行名額的 context manager"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    async def run(self, send: Callable[[], Awaitable[Any]]) -> Any:
+        """送出請求，遭到限流時自動退避並重試
+
+        Args:
+            send: 送出請求的協程函式，回傳具 status 與 headers 的回應
+
+        Returns:
+            成功的回應，或重試用盡後最後一次的限流回應
+        """
+        attempt = 0
+        while True:
+            async with self.slot():
+                response = await send()
+                throttled = response.status in self.THROTTLE_STATUSES
+                if throttled:
+                    delay = self.on_throttled(response.headers, attempt)
+                else:
+                    self.on_success(response.headers)
+
+            if not throttled or attempt >= self.max_retries:
+                return response
+
+            attempt += 1
+            self.retry_count += 1
+            with span("rate_limit.backoff", "provider", attempt=attempt):
+                await asyncio.sleep(delay)
+
+    def on_success(self, headers: Mapping[str, str]):
+        """成功回應：加法遞增並行視窗，並檢查剩餘配額"""
+        self.limit = min(float(self.max_concurrency), self.limit + self.increase_step / self.limit)
+
+        remaining = headers.get("x-ratelimit-remaining")
+        if remaining is not None:
+            try:
+                exhausted = float(remaining) <= 0
+            except ValueError:
+                exhausted = False
+            if exhausted:
+                reset_delay = self._parse_reset(headers.get("x-ratelimit-reset"))
+                if reset_delay:
+                    self._pause(reset_delay)
+
+    def on_throttled(self, headers: Mapping[str, str], attempt: int) -> float:
+        """遭到限流：乘法遞減並行視窗，並計算下次重試前的等待秒數"""
+        self.throttled_count += 1
+        get_metrics().inc("llm_rate_limited_total")
+        now = time.monotonic()
+        # 同一波限流只縮小一次視窗，避免多個並行請求同時把視窗壓到最小
+        if now - self._last_decrease >= self.base_delay:
+            self.limit = max(float(self.min_concurrency), self.limit * self.decrease_factor)
+            self._last_decrease = now
+
+        server_delay = self._parse_retry_after(headers.get("retry-after"))
+        if server_delay is None:
+            server_delay = self._parse_reset(headers.get("x-ratelimit-reset"))
+
+        if server_delay:
+            delay = min(self.max_delay, server_delay) + random.uniform(0, self.base_delay)
+            self._pause(delay)
+        else:
+            # 指數退避 + full jitter
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return delay
+
+    def _pause(self, delay: float):
+        """暫停所有新請求直到指定秒數之後"""
+        self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """解析 Retry-After 標頭（秒數或 HTTP 日期）"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
+
+    @staticmethod
+    def _parse_reset(value: Optional[str]) -> Optional[float]:
+        """解析 x-ratelimit-reset 標頭（毫秒/秒時間戳或相對秒數）"""
+        if not value:
+            return None
+        try:
+            reset = float(value)
+        except ValueError:
+            return None
+        if reset > 1e12:
+            return max(0.0, reset / 1000 - time.time())
+        if reset > 1e9:
+            return max(0.0, reset - time.time())
+        return max(0.0, reset)
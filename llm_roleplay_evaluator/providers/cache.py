@@ -0,0 +1,213 @@
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+from telemetry import span
+from .base import BaseLLMProvider
+
+CACHE_MODES = ("read-through", "write-only", "bypass")
+
+# 每次請求實際量測的指標（快取命中時沒有請求，這些欄位為 None）
+MEASURED_FIELDS = ("response_time", "time_to_first_token", "inter_token_latency", "decode_tokens_per_sec",
+                   "streamed_tokens", "server_timings", "context_reuse", "usage")
+
+class ResponseCache:
+    """以請求內容雜湊為鍵的磁碟回應快取（SQLite + zlib 壓縮，超過容量時依 LRU 淘汰）"""
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            path: 快取資料庫檔案路徑
+            max_bytes: 快取內容（壓縮後）總容量上限
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+        self._total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        """計算請求內容的穩定雜湊值（鍵排序、無多餘空白）"""
+        canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """讀取快取項目並更新其最近存取時間"""
+        row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """寫入快取項目，必要時淘汰最久未使用的項目"""
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if previous is not None:
+            self._total_size -= previous[0]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, blob, len(blob), time.time())
+        )
+        self._total_size += len(blob)
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self):
+        """淘汰最久未使用的項目直到總容量低於上限"""
+        if self._total_size <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC")
+        evicted = []
+        for key, size in rows:
+            if self._total_size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._total_size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def total_size(self) -> int:
+        """取得快取內容總容量（位元組）"""
+        return self._total_size
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def clear(self):
+        """清除所有快取項目"""
+        self._conn.execute("DELETE FROM responses")
+        self._conn.commit()
+        self._total_size = 0
+
+    def close(self):
+        """關閉快取資料庫"""
+        self._conn.close()
+
+class CachedProvider(BaseLLMProvider):
+    """為任意 LLM 服務提供者加上磁碟回應快取
+
+    快取模式：
+        read-through: 命中時直接回傳快取內容，未命中時呼叫模型並寫入快取
+        write-only: 一律呼叫模型，並以最新回應覆寫快取
+        bypass: 不讀也不寫快取
+    """
+
+    def __init__(self, provider: BaseLLMProvider, cache: ResponseCache, mode: str = "read-through",
+                 close_cache: bool = True):
+        """
+        Args:
+            provider: 被包裝的服務提供者
+            cache: 回應快取（多個客戶端可共用同一個快取）
+            mode: 快取模式
+            close_cache: close() 時是否一併關閉快取（共用快取時由建立者負責關閉）
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"不支援的快取模式: {mode}。可用的模式：{list(CACHE_MODES)}")
+        super().__init__(provider.model, provider.max_tokens, provider.temperature)
+        self.provider = provider
+        self.cache = cache
+        self.mode = mode
+        self.close_cache = close_cache
+
+    def __getattr__(self, name: str) -> Any:
+        # 其餘方法（如 list_models）直接交給被包裝的服務提供者
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
+
+    def _cache_key(self, messages: List[Dict[str, str]]) -> str:
+        """以服務提供者、端點、API 形式、模型、訊息與取樣參數計算快取鍵"""
+        return ResponseCache.make_key({
+            "provider": type(self.provider).__name__,
+            "base_url": getattr(self.provider, "base_url", None),
+            "api": getattr(self.provider, "api", None),
+            "model": self.provider.model,
+            "messages": messages,
+            "temperature": self.provider.temperature,
+            "max_tokens": self.provider.max_tokens
+        })
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """依快取模式讀取快取項目"""
+        if self.mode != "read-through":
+            return None
+        with span("cache.lookup", "io"):
+            return self.cache.get(key)
+
+    def _store(self, key: str, content: str, metrics: Optional[Dict[str, Any]] = None):
+        """依快取模式寫入快取項目"""
+        if self.mode == "bypass":
+            return
+        with span("cache.store", "io"):
+            self.cache.put(key, {"content": content, "metrics": metrics or {}})
+
+    async def chat_completion(self, messages: List[Dict[str, str]]) -> str:
+        """讀取快取或呼叫模型取得完整回應"""
+        key = self._cache_key(messages)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached["content"]
+
+        content = await self.provider.chat_completion(messages)
+        self._store(key, content)
+        return content
+
+    async def stream_chat_completion(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """讀取快取（一次輸出）或串流呼叫模型"""
+        key = self._cache_key(messages)
+        cached = self._lookup(key)
+        if cached is not None:
+            yield cached["content"]
+            return
+
+        parts = []
+        async for delta in self.provider.stream_chat_completion(messages):
+            parts.append(delta)
+            yield delta
+        self._store(key, "".join(parts))
+
+    async def timed_stream_completion(self, messages: List[Dict[str, str]]) -> Tuple[str, Dict[str, Any]]:
+        """讀取快取或串流呼叫模型；命中時標記 cache_hit
+        
+        命中時沒有實際呼叫模型，延遲、吞吐量與 token 用量都為 None（不沿用原始量測值），
+        回應時間統計與 token 彙整因此只計入實際送出的請求。
+        """
+        key = self._cache_key(messages)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached["content"], {**dict.fromkeys(cached["metrics"]), **dict.fromkeys(MEASURED_FIELDS),
+                                       "cache_hit": True}
+
+        content, metrics = await self.provider.timed_stream_completion(messages)
+        self._store(key, content, metrics)
+        return content, dict(metrics, cache_hit=False)
+
+    async def health_check(self) -> bool:
+        """檢查被包裝服務提供者的健康狀態"""
+        return await self.provider.health_check()
+
+    async def close(self):
+        """關閉被包裝的服務提供者與快取資料庫（共用快取時不關閉快取）"""
+        await self.provider.close()
+        if self.close_cache:
+            self.cache.close()
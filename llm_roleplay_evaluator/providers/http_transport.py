@@ -0,0 +1,148 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+class HTTPStatusError(Exception):
+    """HTTP 狀態碼錯誤（4xx/5xx）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class HTTPResponse:
+    """HTTP 回應內容（讀取完畢後與連線脫鉤，標頭鍵一律為小寫）"""
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        """將回應內容解析為 JSON"""
+        return json.loads(self.body.decode('utf-8'))
+
+    def raise_for_status(self):
+        """狀態碼為 4xx/5xx 時拋出 HTTPStatusError"""
+        if self.status >= 400:
+            detail = self.body[:200].decode('utf-8', errors='replace')
+            raise HTTPStatusError(self.status, f"HTTP {self.status}: {detail}")
+
+class AsyncHTTPTransport:
+    """非同步 HTTP 傳輸層
+
+    每個客戶端持有一個持久的 keep-alive 連線池（aiohttp.ClientSession），
+    讓多個請求能同時在同一台主機上進行，而不會阻塞事件迴圈。
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float = 60.0, connect_timeout: float = 10.0,
+                 keepalive_timeout: float = 30.0, headers: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            pool_size: 連線池上限（同時開啟的連線數）
+            timeout: 單一請求的總逾時秒數
+            connect_timeout: 建立連線的逾時秒數
+            keepalive_timeout: 閒置連線保留秒數
+            headers: 每個請求都會帶上的預設標頭
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.headers = headers or {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _client_timeout(self, timeout: Optional[float] = None) -> aiohttp.ClientTimeout:
+        """建立 aiohttp 逾時設定"""
+        return aiohttp.ClientTimeout(
+            total=timeout if timeout is not None else self.timeout,
+            connect=self.connect_timeout
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """取得（必要時建立）目前事件迴圈上的連線池"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=self._client_timeout()
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def request(self, method: str, url: str, json: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None) -> HTTPResponse:
+        """送出請求並完整讀取回應
+
+        Args:
+            method: HTTP 方法
+            url: 請求網址
+            json: JSON 請求內容
+            timeout: 覆寫預設的總逾時秒數
+
+        Returns:
+            HTTPResponse: 狀態碼、標頭與回應內容
+        """
+        session = self._get_session()
+        async with session.request(method, url, json=json, timeout=self._client_timeout(timeout)) as response:
+            body = await response.read()
+            headers = {key.lower(): value for key, value in response.headers.items()}
+            return HTTPResponse(response.status, headers, body)
+
+    async def get(self, url: str, timeout: Optional[float] = None) -> HTTPResponse:
+        """送出 GET 請求"""
+        return await self.request("GET", url, timeout=timeout)
+
+    async def post(self, url: str, json: Dict[str, Any], timeout: Optional[float] = None) -> HTTPResponse:
+        """送出 POST 請求"""
+        return await self.request("POST", url, json=json, timeout=timeout)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, json: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[float] = None) -> AsyncIterator[aiohttp.ClientResponse]:
+        """送出請求並保留連線以串流讀取回應內容"""
+        session = self._get_session()
+        async with session.request(method, url, json=json, timeout=self._client_timeout(timeout)) as response:
+            yield response
+
+    async def close(self):
+        """關閉連線池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+async def check_stream_status(response: aiohttp.ClientResponse):
+    """串流回應狀態碼為 4xx/5xx 時拋出 HTTPStatusError"""
+    if response.status >= 400:
+        body = await response.read()
+        detail = body[:200].decode('utf-8', errors='replace')
+        raise HTTPStatusError(response.status, f"HTTP {response.status}: {detail}")
+
+async def iter_sse_data(response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+    """逐筆讀取 Server-Sent Events 的 data 欄位（遇到 [DONE] 結束）"""
+    async for raw_line in response.content:
+        line = raw_line.decode('utf-8').strip()
+        # 空行為事件分隔，冒號開頭為註解（例如 OpenRouter 的 keep-alive）
+        if not line or line.startswith(':') or not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            break
+        yield data
+
+async def iter_ndjson(response: aiohttp.ClientResponse) -> AsyncIterator[Dict[str, Any]]:
+    """逐行讀取換行分隔的 JSON 串流（Ollama 原生 API 的串流格式）"""
+    async for raw_line in response.content:
+        line = raw_line.decode('utf-8').strip()
+        if line:
+            yield json.loads(line)
@@ -1,20 +1,125 @@
-import requests
+import asyncio
 import json
-from typing import List, Dict, Any
-from .base import BaseLLMProvider, LLMError, ProviderUnavailableError
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+import aiohttp
+
+from .base import AdaptiveRateLimiter, BaseLLMProvider, LLMError, ProviderUnavailableError, RateLimitError, parse_usage
+from .http_transport import AsyncHTTPTransport, HTTPStatusError, check_stream_status, iter_ndjson, iter_sse_data
+
+# 對話使用的 API：openai 為 OpenAI 相容端點，native 為 Ollama 原生 /api/chat（回傳服務端時間統計）
+OLLAMA_APIS = ("openai", "native")
+
+def parse_ollama_timings(data: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """將 Ollama 原生 API 的時間統計（奈秒）轉為秒，並計算提示詞處理與解碼速度
+
+    提示詞完全命中服務端快取時 Ollama 會省略 prompt_eval_count，此時對應欄位為 None。
+    """
+    def seconds(key: str) -> Optional[float]:
+        value = data.get(key)
+        return value / 1e9 if value is not None else None
+
+    timings = {
+        "total_duration": seconds("total_duration"),
+        "load_duration": seconds("load_duration"),
+        "prompt_eval_count": data.get("prompt_eval_count"),
+        "prompt_eval_duration": seconds("prompt_eval_duration"),
+        "eval_count": data.get("eval_count"),
+        "eval_duration": seconds("eval_duration")
+    }
+    for prefix in ("prompt_eval", "eval"):
+        count, duration = timings[f"{prefix}_count"], timings[f"{prefix}_duration"]
+        timings[f"{prefix}_tokens_per_sec"] = count / duration if count is not None and duration else None
+    return timings
+
+def context_reuse_stats(reused_context: int, context: Optional[List[int]], timings: Dict[str, Any],
+                        prompt_eval_tokens_per_sec: Optional[float] = None) -> Dict[str, Optional[float]]:
+    """計算增量對話模式單輪沿用服務端 context 省下的提示詞處理量
+
+    回傳的 context 包含本輪完整提示詞與回應，扣掉解碼 token 數即為完整提示詞長度；
+    其中沒有被重新處理（prompt_eval_count 以外）的部分就是沿用的 token。
+
+    Args:
+        reused_context: 本輪送出的 context 長度
+        context: 服務端回傳的新 context
+        timings: 服務端時間統計（見 parse_ollama_timings）
+        prompt_eval_tokens_per_sec: 估算省下時間使用的提示詞處理速度，如未指定則使用本輪的速度
+    """
+    stats: Dict[str, Optional[float]] = {
+        "sent_context_tokens": reused_context,
+        "prompt_tokens": None,
+        "reused_tokens": None,
+        "estimated_prompt_eval_saved": None
+    }
+    if context is None or timings.get("eval_count") is None:
+        return stats
+    prompt_tokens = len(context) - timings["eval_count"]
+    reused_tokens = max(0, prompt_tokens - (timings.get("prompt_eval_count") or 0))
+    stats["prompt_tokens"] = prompt_tokens
+    stats["reused_tokens"] = reused_tokens
+    # 以實測的提示詞處理速度估算重新處理這些 token 需要的時間
+    tokens_per_sec = prompt_eval_tokens_per_sec or timings.get("prompt_eval_tokens_per_sec")
+    if tokens_per_sec:
+        stats["estimated_prompt_eval_saved"] = reused_tokens / tokens_per_sec
+    return stats
+
+def ollama_usage(timings: Dict[str, Any], prompt_tokens: Optional[int] = None,
+                 cached_tokens: Optional[int] = None) -> Optional[Dict[str, Optional[int]]]:
+    """由原生 API 的時間統計取得 token 用量（格式同 parse_usage）
+
+    Args:
+        timings: 服務端時間統計（見 parse_ollama_timings）
+        prompt_tokens: 完整提示詞長度，如未指定則使用 prompt_eval_count（實際處理的 token 數）
+        cached_tokens: 沿用服務端快取、未重新處理的提示詞 token 數
+    """
+    if timings.get("eval_count") is None:
+        return None
+    if prompt_tokens is None:
+        prompt_tokens = timings.get("prompt_eval_count")
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": timings["eval_count"],
+        "total_tokens": (prompt_tokens or 0) + timings["eval_count"],
+        "cached_tokens": cached_tokens
+    }
 
 class OllamaClient(BaseLLMProvider):
     """Ollama API 客戶端"""
-    
-    def __init__(self, base_url: str, model: str, max_tokens: int = 500, temperature: float = 0.7):
+
+    def __init__(self, base_url: str, model: str, max_tokens: int = 500, temperature: float = 0.7,
+                 pool_size: int = 10, timeout: float = 60.0, connect_timeout: float = 10.0,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None, api: str = "openai",
+                 keep_alive: Optional[str] = None):
+        """
+        Args:
+            api: 對話使用的 API（openai 或 native）
+            keep_alive: 原生 API 請求附帶的模型保留時間，如未指定則使用服務端預設值
+        """
+        if api not in OLLAMA_APIS:
+            raise ValueError(f"不支援的 Ollama API: {api}。可用的 API：{list(OLLAMA_APIS)}")
         super().__init__(model, max_tokens, temperature)
         self.base_url = base_url.rstrip('/')
+        self.api = api
+        self.keep_alive = keep_alive
         # 使用 OpenAI 兼容的 endpoint (角色扮演效果更好)
         self.chat_url = f"{self.base_url}/v1/chat/completions"
+        # 原生 API 額外回傳載入、提示詞處理與解碼的時間統計
+        self.native_chat_url = f"{self.base_url}/api/chat"
         self.generate_url = f"{self.base_url}/api/generate"
+        # 持久的 keep-alive 連線池，允許多個請求同時進行
+        self.transport = AsyncHTTPTransport(
+            pool_size=pool_size,
+            timeout=timeout,
+            connect_timeout=connect_timeout
+        )
+        # 依限流回應自動調整並行數與退避重試
+        self.rate_limiter = rate_limiter if rate_limiter is not None else AdaptiveRateLimiter()
 
     async def chat_completion(self, messages: List[Dict[str, str]]) -> str:
         """使用 Ollama Chat API 進行對話完成 (OpenAI 兼容格式)"""
+        if self.api == "native":
+            return (await self.native_chat_completion(messages))["content"]
         try:
             # 使用 OpenAI 格式 (直接傳遞 messages,包含 system role)
             payload = {
@@ -25,36 +130,361 @@ class OllamaClient(BaseLLMProvider):
                 "temperature": self.temperature
             }
 
-            response = requests.post(self.chat_url, json=payload, timeout=60)
+            response = await self._send_with_rate_limit(
+                lambda: self.transport.post(self.chat_url, json=payload)
+            )
+            if response.status in AdaptiveRateLimiter.THROTTLE_STATUSES:
+                raise RateLimitError("Ollama 服務忙碌（佇列已滿），重試後仍無法處理")
+
             response.raise_for_status()
 
             result = response.json()
             # OpenAI 格式的回應結構
             return result["choices"][0]["message"]["content"]
-            
-        except requests.exceptions.ConnectionError:
+
+        except aiohttp.ClientConnectionError:
             raise ProviderUnavailableError("無法連線到 Ollama 服務")
-        except requests.exceptions.Timeout:
+        except asyncio.TimeoutError:
             raise LLMError("Ollama 請求超時")
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, HTTPStatusError) as e:
             raise LLMError(f"Ollama 請求錯誤: {str(e)}")
         except KeyError as e:
             raise LLMError(f"Ollama 回應格式錯誤: {str(e)}")
-    
+
+    async def stream_chat_completion(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """使用 Ollama Chat API 進行串流對話完成 (OpenAI 兼容 SSE 格式)"""
+        if self.api == "native":
+            stream = self._stream_native_chat(messages)
+        else:
+            stream = self._stream_chat(messages, {})
+        async for delta in stream:
+            yield delta
+
+    async def _stream_chat(self, messages: List[Dict[str, str]], usage: Dict[str, Any]) -> AsyncIterator[str]:
+        """使用 OpenAI 相容端點串流對話完成，最後一個片段的 usage 寫入 usage"""
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "stream_options": self._stream_options(),
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature
+        }
+
+        try:
+            async with self._stream_with_rate_limit(
+                lambda: self.transport.stream("POST", self.chat_url, json=payload)
+            ) as response:
+                if response.status in AdaptiveRateLimiter.THROTTLE_STATUSES:
+                    raise RateLimitError("Ollama 服務忙碌（佇列已滿），重試後仍無法處理")
+
+                await check_stream_status(response)
+
+                async for data in iter_sse_data(response):
+                    chunk = json.loads(data)
+                    if chunk.get("usage"):
+                        usage.update(parse_usage(chunk["usage"]))
+                    delta = self._extract_stream_delta(chunk)
+                    if delta:
+                        yield delta
+
+        except aiohttp.ClientConnectionError:
+            raise ProviderUnavailableError("無法連線到 Ollama 服務")
+        except asyncio.TimeoutError:
+            raise LLMError("Ollama 請求超時")
+        except (aiohttp.ClientError, HTTPStatusError) as e:
+            raise LLMError(f"Ollama 請求錯誤: {str(e)}")
+        except json.JSONDecodeError as e:
+            raise LLMError(f"Ollama 串流格式錯誤: {str(e)}")
+
+    def _native_payload(self, messages: List[Dict[str, str]], stream: bool) -> Dict[str, Any]:
+        """原生 /api/chat 的請求內容（取樣參數放在 options）"""
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "options": {"temperature": self.temperature, "num_predict": self.max_tokens}
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    async def native_chat_completion(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """使用 Ollama 原生 /api/chat 進行對話完成
+
+        Returns:
+            {"content": 回應內容, "timings": 服務端時間統計（見 parse_ollama_timings）}
+        """
+        try:
+            payload = self._native_payload(messages, stream=False)
+            response = await self._send_with_rate_limit(
+                lambda: self.transport.post(self.native_chat_url, json=payload)
+            )
+            if response.status in AdaptiveRateLimiter.THROTTLE_STATUSES:
+                raise RateLimitError("Ollama 服務忙碌（佇列已滿），重試後仍無法處理")
+
+            response.raise_for_status()
+
+            result = response.json()
+            return {"content": result["message"]["content"], "timings": parse_ollama_timings(result)}
+
+        except aiohttp.ClientConnectionError:
+            raise ProviderUnavailableError("無法連線到 Ollama 服務")
+        except asyncio.TimeoutError:
+            raise LLMError("Ollama 請求超時")
+        except (aiohttp.ClientError, HTTPStatusError) as e:
+            raise LLMError(f"Ollama 請求錯誤: {str(e)}")
+        except KeyError as e:
+            raise LLMError(f"Ollama 回應格式錯誤: {str(e)}")
+
+    async def _stream_native_chat(self, messages: List[Dict[str, str]],
+                                  timings: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """使用 Ollama 原生 /api/chat 串流對話完成
+
+        Args:
+            timings: 串流結束時寫入服務端時間統計的字典
+        """
+        payload = self._native_payload(messages, stream=True)
+
+        try:
+            async with self._stream_with_rate_limit(
+                lambda: self.transport.stream("POST", self.native_chat_url, json=payload)
+            ) as response:
+                if response.status in AdaptiveRateLimiter.THROTTLE_STATUSES:
+                    raise RateLimitError("Ollama 服務忙碌（佇列已滿），重試後仍無法處理")
+
+                await check_stream_status(response)
+
+                async for chunk in iter_ndjson(response):
+                    if "error" in chunk:
+                        raise LLMError(f"Ollama 請求錯誤: {chunk['error']}")
+                    delta = (chunk.get("message") or {}).get("content")
+                    if delta:
+                        yield delta
+                    if chunk.get("done"):
+                        if timings is not None:
+                            timings.update(parse_ollama_timings(chunk))
+                        break
+
+        except aiohttp.ClientConnectionError:
+            raise ProviderUnavailableError("無法連線到 Ollama 服務")
+        except asyncio.TimeoutError:
+            raise LLMError("Ollama 請求超時")
+        except (aiohttp.ClientError, HTTPStatusError) as e:
+            raise LLMError(f"Ollama 請求錯誤: {str(e)}")
+        except json.JSONDecodeError as e:
+            raise LLMError(f"Ollama 串流格式錯誤: {str(e)}")
+
+    async def timed_stream_completion(self, messages: List[Dict[str, str]]) -> Tuple[str, Dict[str, Any]]:
+        """以串流方式取得完整回應並量測延遲指標
+
+        使用原生 API 時，指標另含 server_timings（服務端回報的載入、提示詞處理與解碼時間），
+        token 用量則由時間統計中的 token 數取得。
+        """
+        if self.api != "native":
+            return await super().timed_stream_completion(messages)
+        timings: Dict[str, Any] = {}
+        content, metrics = await self._time_stream(self._stream_native_chat(messages, timings))
+        metrics["server_timings"] = timings or None
+        metrics["usage"] = ollama_usage(timings)
+        return content, metrics
+
+    async def sample_completions(self, messages: List[Dict[str, str]], n: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """以 n 參數在一次請求中取得多個回應（OpenAI 相容端點）
+
+        Ollama 本身會忽略 n 只回傳一個選項，相容 n 的服務（例如 vLLM）則一次回傳全部；
+        原生 API 不支援 n，回傳空列表。
+        """
+        if self.api == "native":
+            return []
+        try:
+            payload = {
+                "model": self.model,
+                "messages": messages,
+                "stream": False,
+                "n": n,
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature
+            }
+
+            start_time = time.perf_counter()
+            response = await self._send_with_rate_limit(
+                lambda: self.transport.post(self.chat_url, json=payload)
+            )
+            if response.status in AdaptiveRateLimiter.THROTTLE_STATUSES:
+                raise RateLimitError("Ollama 服務忙碌（佇列已滿），重試後仍無法處理")
+
+            response.raise_for_status()
+
+            return self._parse_choices(response.json(), time.perf_counter() - start_time)
+
+        except aiohttp.ClientConnectionError:
+            raise ProviderUnavailableError("無法連線到 Ollama 服務")
+        except asyncio.TimeoutError:
+            raise LLMError("Ollama 請求超時")
+        except (aiohttp.ClientError, HTTPStatusError) as e:
+            raise LLMError(f"Ollama 請求錯誤: {str(e)}")
+        except KeyError as e:
+            raise LLMError(f"Ollama 回應格式錯誤: {str(e)}")
+
+    def start_conversation(self, system_prompt: str) -> "OllamaConversation":
+        """開始一段增量對話（服務端保留 context，每輪只送出新的使用者訊息）"""
+        return OllamaConversation(self, system_prompt)
+
+    async def _stream_generate(self, payload: Dict[str, Any], result: Dict[str, Any]) -> AsyncIterator[str]:
+        """使用 Ollama 原生 /api/generate 串流生成
+
+        Args:
+            result: 串流結束時寫入 timings（服務端時間統計）與 context（新的 context）的字典
+        """
+        try:
+            async with self._stream_with_rate_limit(
+                lambda: self.transport.stream("POST", self.generate_url, json=payload)
+            ) as response:
+                if response.status in AdaptiveRateLimiter.THROTTLE_STATUSES:
+                    raise RateLimitError("Ollama 服務忙碌（佇列已滿），重試後仍無法處理")
+
+                await check_stream_status(response)
+
+                async for chunk in iter_ndjson(response):
+                    if "error" in chunk:
+                        raise LLMError(f"Ollama 請求錯誤: {chunk['error']}")
+                    delta = chunk.get("response")
+                    if delta:
+                        yield delta
+                    if chunk.get("done"):
+                        result["timings"] = parse_ollama_timings(chunk)
+                        result["context"] = chunk.get("context")
+                        break
+
+        except aiohttp.ClientConnectionError:
+            raise ProviderUnavailableError("無法連線到 Ollama 服務")
+        except asyncio.TimeoutError:
+            raise LLMError("Ollama 請求超時")
+        except (aiohttp.ClientError, HTTPStatusError) as e:
+            raise LLMError(f"Ollama 請求錯誤: {str(e)}")
+        except json.JSONDecodeError as e:
+            raise LLMError(f"Ollama 串流格式錯誤: {str(e)}")
+
     async def health_check(self) -> bool:
         """檢查 Ollama 服務健康狀態"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=10)
-            return response.status_code == 200
-        except requests.exceptions.RequestException:
+            response = await self.transport.get(f"{self.base_url}/api/tags", timeout=10)
+            return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
             return False
-    
-    def list_models(self) -> List[str]:
+
+    async def load_model(self, keep_alive: Optional[str] = None) -> Dict[str, Optional[float]]:
+        """預先載入模型（送出不含提示詞的原生 /api/generate 請求）
+
+        模型權重載入的時間因此不會被算進第一輪的回應時間。
+
+        Args:
+            keep_alive: 閒置後模型保留在記憶體中的時間（例如 "30m"），如未指定則使用服務端預設值
+
+        Returns:
+            {"load_time": 載入請求的耗時秒數, "load_duration": 服務端回報的載入秒數（未回報時為 None）}
+        """
+        payload: Dict[str, Any] = {"model": self.model, "stream": False}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        start_time = time.perf_counter()
+        result = await self._post_generate(payload, "載入模型")
+        load_duration = result.get("load_duration")
+        return {
+            "load_time": time.perf_counter() - start_time,
+            "load_duration": load_duration / 1e9 if load_duration is not None else None
+        }
+
+    async def unload_model(self):
+        """立即從記憶體卸載模型（keep_alive 設為 0）"""
+        await self._post_generate({"model": self.model, "keep_alive": 0, "stream": False}, "卸載模型")
+
+    async def _post_generate(self, payload: Dict[str, Any], action: str) -> Dict[str, Any]:
+        """送出原生 /api/generate 請求並回傳 JSON 結果"""
+        try:
+            response = await self.transport.post(self.generate_url, json=payload)
+            response.raise_for_status()
+            return response.json()
+        except aiohttp.ClientConnectionError:
+            raise ProviderUnavailableError("無法連線到 Ollama 服務")
+        except asyncio.TimeoutError:
+            raise LLMError(f"Ollama {action}超時")
+        except (aiohttp.ClientError, HTTPStatusError) as e:
+            raise LLMError(f"Ollama {action}錯誤: {str(e)}")
+
+    async def list_models(self) -> List[str]:
         """列出可用的模型"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=10)
+            response = await self.transport.get(f"{self.base_url}/api/tags", timeout=10)
             response.raise_for_status()
             models_data = response.json()
             return [model["name"] for model in models_data.get("models", [])]
-        except requests.exceptions.RequestException:
-            return []
\ No newline at end of file
+        except (aiohttp.ClientError, asyncio.TimeoutError, HTTPStatusError):
+            return []
+
+    async def close(self):
+        """關閉連線池"""
+        await self.transport.close()
+
+class OllamaConversation:
+    """在服務端沿用 KV 快取的增量多輪對話（原生 /api/generate 的 context）
+
+    第一輪送出系統提示詞與使用者訊息；之後每輪只送出新的使用者訊息與上一輪回傳的 context，
+    Ollama 直接沿用已處理的前綴，不必每輪重新處理越來越長的完整歷史。
+    帶有 context 的請求不會再套用系統提示詞，但模型檔內建的 SYSTEM 仍會被加入，
+    因此適用於沒有內建系統提示詞的模型。
+    """
+
+    def __init__(self, client: OllamaClient, system_prompt: str):
+        """
+        Args:
+            client: Ollama 客戶端（共用連線池與速率限制器）
+            system_prompt: 系統提示詞（只在第一輪送出）
+        """
+        self.client = client
+        self.system_prompt = system_prompt
+        self.context: Optional[List[int]] = None
+        # 處理過最多提示詞 token 的一輪（通常是第一輪）的處理速度；
+        # 只處理幾個新 token 的輪次主要是固定開銷，不適合拿來估算
+        self._prefill_sample: Tuple[int, Optional[float]] = (0, None)
+
+    def _payload(self, user_message: str) -> Dict[str, Any]:
+        """本輪 /api/generate 的請求內容"""
+        payload: Dict[str, Any] = {
+            "model": self.client.model,
+            "prompt": user_message,
+            "stream": True,
+            "options": {"temperature": self.client.temperature, "num_predict": self.client.max_tokens}
+        }
+        if self.context:
+            payload["context"] = self.context
+        else:
+            payload["system"] = self.system_prompt
+        if self.client.keep_alive is not None:
+            payload["keep_alive"] = self.client.keep_alive
+        return payload
+
+    async def timed_send(self, user_message: str) -> Tuple[str, Dict[str, Any]]:
+        """送出新的使用者訊息，以串流方式取得完整回應並量測延遲指標
+
+        指標另含 server_timings（服務端時間統計）、context_reuse（見 context_reuse_stats）
+        與 usage（完整提示詞長度，沿用的部分記為 cached_tokens）。
+        請求失敗時 context 保持不變，下一輪仍從上一次成功的回應繼續。
+        """
+        sent_context = len(self.context) if self.context else 0
+        result: Dict[str, Any] = {}
+        content, metrics = await self.client._time_stream(
+            self.client._stream_generate(self._payload(user_message), result)
+        )
+        timings = result.get("timings") or {}
+        if result.get("context"):
+            self.context = result["context"]
+        prompt_eval_count = timings.get("prompt_eval_count") or 0
+        if prompt_eval_count > self._prefill_sample[0] and timings.get("prompt_eval_tokens_per_sec"):
+            self._prefill_sample = (prompt_eval_count, timings["prompt_eval_tokens_per_sec"])
+        context_reuse = context_reuse_stats(sent_context, result.get("context"), timings, self._prefill_sample[1])
+        metrics["server_timings"] = timings or None
+        metrics["context_reuse"] = context_reuse
+        metrics["usage"] = ollama_usage(timings, context_reuse["prompt_tokens"], context_reuse["reused_tokens"])
+        return content, metrics
@@ -1,12 +1,19 @@
-import requests
+import asyncio
 import json
-from typing import List, Dict, Any
-from .base import BaseLLMProvider, LLMError, RateLimitError
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+import aiohttp
+
+from .base import AdaptiveRateLimiter, BaseLLMProvider, LLMError, RateLimitError, parse_usage
+from .http_transport import AsyncHTTPTransport, HTTPStatusError, check_stream_status, iter_sse_data
 
 class OpenRouterClient(BaseLLMProvider):
     """OpenRouter API 客戶端"""
-    
-    def __init__(self, api_key: str, model: str, max_tokens: int = 500, temperature: float = 0.7):
+
+    def __init__(self, api_key: str, model: str, max_tokens: int = 500, temperature: float = 0.7,
+                 pool_size: int = 10, timeout: float = 60.0, connect_timeout: float = 10.0,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None):
         super().__init__(model, max_tokens, temperature)
         self.api_key = api_key
         self.base_url = "https://openrouter.ai/api/v1"
@@ -16,7 +23,16 @@ class OpenRouterClient(BaseLLMProvider):
             "HTTP-Referer": "https://github.com/your-repo/llm-roleplay-evaluator",
             "X-Title": "LLM Roleplay Evaluator"
         }
-    
+        # 持久的 keep-alive 連線池，允許多個請求同時進行
+        self.transport = AsyncHTTPTransport(
+            pool_size=pool_size,
+            timeout=timeout,
+            connect_timeout=connect_timeout,
+            headers=self.headers
+        )
+        # 依限流回應自動調整並行數與退避重試
+        self.rate_limiter = rate_limiter if rate_limiter is not None else AdaptiveRateLimiter()
+
     async def chat_completion(self, messages: List[Dict[str, str]]) -> str:
         """使用 OpenRouter API 進行對話完成"""
         try:
@@ -27,63 +43,126 @@ class OpenRouterClient(BaseLLMProvider):
                 "temperature": self.temperature,
                 "stream": False
             }
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=60
+
+            response = await self._send_with_rate_limit(
+                lambda: self.transport.post(f"{self.base_url}/chat/completions", json=payload)
             )
-            
-            if response.status_code == 429:
+
+            if response.status == 429:
                 raise RateLimitError("OpenRouter 速率限制，請稍後再試")
-            
+
             response.raise_for_status()
-            
+
             result = response.json()
             return result["choices"][0]["message"]["content"]
-            
-        except requests.exceptions.Timeout:
+
+        except asyncio.TimeoutError:
             raise LLMError("OpenRouter 請求超時")
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, HTTPStatusError) as e:
             raise LLMError(f"OpenRouter 請求錯誤: {str(e)}")
         except KeyError as e:
             raise LLMError(f"OpenRouter 回應格式錯誤: {str(e)}")
-    
+
+    async def stream_chat_completion(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """使用 OpenRouter API 進行串流對話完成 (SSE)"""
+        async for delta in self._stream_chat(messages, {}):
+            yield delta
+
+    async def _stream_chat(self, messages: List[Dict[str, str]], usage: Dict[str, Any]) -> AsyncIterator[str]:
+        """串流對話完成，最後一個片段的 usage 寫入 usage"""
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": True,
+            "stream_options": self._stream_options()
+        }
+
+        try:
+            async with self._stream_with_rate_limit(
+                lambda: self.transport.stream("POST", f"{self.base_url}/chat/completions", json=payload)
+            ) as response:
+                if response.status == 429:
+                    raise RateLimitError("OpenRouter 速率限制，請稍後再試")
+
+                await check_stream_status(response)
+
+                async for data in iter_sse_data(response):
+                    chunk = json.loads(data)
+                    # 串流中途的錯誤會以 error 欄位回傳
+                    if "error" in chunk:
+                        raise LLMError(f"OpenRouter 串流錯誤: {chunk['error']}")
+                    if chunk.get("usage"):
+                        usage.update(parse_usage(chunk["usage"]))
+                    delta = self._extract_stream_delta(chunk)
+                    if delta:
+                        yield delta
+
+        except asyncio.TimeoutError:
+            raise LLMError("OpenRouter 請求超時")
+        except (aiohttp.ClientError, HTTPStatusError) as e:
+            raise LLMError(f"OpenRouter 請求錯誤: {str(e)}")
+        except json.JSONDecodeError as e:
+            raise LLMError(f"OpenRouter 串流格式錯誤: {str(e)}")
+
+    async def sample_completions(self, messages: List[Dict[str, str]], n: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """以 n 參數在一次請求中取得多個回應（不支援 n 的上游模型只會回傳一個選項）"""
+        try:
+            payload = {
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature,
+                "n": n,
+                "stream": False
+            }
+
+            start_time = time.perf_counter()
+            response = await self._send_with_rate_limit(
+                lambda: self.transport.post(f"{self.base_url}/chat/completions", json=payload)
+            )
+
+            if response.status == 429:
+                raise RateLimitError("OpenRouter 速率限制，請稍後再試")
+
+            response.raise_for_status()
+
+            return self._parse_choices(response.json(), time.perf_counter() - start_time)
+
+        except asyncio.TimeoutError:
+            raise LLMError("OpenRouter 請求超時")
+        except (aiohttp.ClientError, HTTPStatusError) as e:
+            raise LLMError(f"OpenRouter 請求錯誤: {str(e)}")
+        except KeyError as e:
+            raise LLMError(f"OpenRouter 回應格式錯誤: {str(e)}")
+
     async def health_check(self) -> bool:
         """檢查 OpenRouter 服務健康狀態"""
         try:
-            response = requests.get(
-                f"{self.base_url}/models",
-                headers=self.headers,
-                timeout=10
-            )
-            return response.status_code == 200
-        except requests.exceptions.RequestException:
+            response = await self.transport.get(f"{self.base_url}/models", timeout=10)
+            return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
             return False
-    
-    def get_available_models(self) -> List[Dict[str, Any]]:
+
+    async def get_available_models(self) -> List[Dict[str, Any]]:
         """取得可用的模型列表"""
         try:
-            response = requests.get(
-                f"{self.base_url}/models",
-                headers=self.headers,
-                timeout=10
-            )
+            response = await self.transport.get(f"{self.base_url}/models", timeout=10)
             response.raise_for_status()
             return response.json().get("data", [])
-        except requests.exceptions.RequestException:
+        except (aiohttp.ClientError, asyncio.TimeoutError, HTTPStatusError):
             return []
-    
-    def get_model_info(self, model_id: str) -> Dict[str, Any]:
+
+    async def get_model_info(self, model_id: str) -> Dict[str, Any]:
         """取得特定模型的詳細資訊"""
         try:
-            response = requests.get(
-                f"{self.base_url}/models/{model_id}",
-                headers=self.headers,
-                timeout=10
-            )
+            response = await self.transport.get(f"{self.base_url}/models/{model_id}", timeout=10)
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException:
-            return {}
\ No newline at end of file
+        except (aiohttp.ClientError, asyncio.TimeoutError, HTTPStatusError):
+            return {}
+
+    async def close(self):
+        """關閉連線池"""
+        await self.transport.close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+以目前的評分器重新計算已儲存測試結果的分數
+不呼叫 LLM，直接使用結果檔中的模型回應
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加專案路徑到 Python 路徑
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from config import config
+
+def main():
+    """重新評分程式入口點"""
+    parser = argparse.ArgumentParser(description="重新評分已儲存的測試結果（不呼叫 LLM）")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="要重新評分的結果檔（預設: data/results/*.json）"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="data/rescored",
+        help="新結果檔的輸出目錄（預設: data/rescored）"
+    )
+    parser.add_argument(
+        "--in-place",
+        action="store_true",
+        help="直接覆寫原結果檔"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="工作行程數（預設: CPU 數）"
+    )
+
+    args = parser.parse_args()
+
+    if args.paths:
+        paths = [Path(p) for p in args.paths]
+    else:
+        paths = sorted(Path("data/results").glob("*.json"))
+
+    if not paths:
+        print("找不到任何結果檔")
+        return
+
+    # 評分器依賴 scikit-learn 等套件，確定有檔案要處理時才匯入
+    from evaluator.catalog import ResultCatalog
+    from evaluator.rescoring import rescore_files
+
+    print(f"重新評分 {len(paths)} 個結果檔...")
+    start_time = time.time()
+    counts = {"rescored": 0, "skipped": 0, "error": 0}
+
+    # 就地更新時，結果索引中的分數也要同步更新
+    catalog = ResultCatalog(config.result_catalog_path) if args.in_place else None
+
+    for summary in rescore_files(paths, Path(args.output_dir), args.in_place, args.workers):
+        counts[summary["status"]] += 1
+        if summary["status"] == "rescored":
+            if catalog is not None:
+                catalog.record_file(summary["destination"])
+            old_score = summary["old_score"]
+            new_score = summary["new_score"]
+            old_text = f"{old_score:.3f}" if old_score is not None else "N/A"
+            new_text = f"{new_score:.3f}" if new_score is not None else "N/A"
+            print(f"  {Path(summary['source']).name}: {old_text} -> {new_text}")
+        elif summary["status"] == "error":
+            print(f"  {Path(summary['source']).name}: 失敗 - {summary['error']}")
+
+    if catalog is not None:
+        catalog.close()
+
+    elapsed = time.time() - start_time
+    print("-" * 40)
+    print(f"完成: {counts['rescored']} 個已重新評分，{counts['skipped']} 個略過（非測試執行器格式），"
+          f"{counts['error']} 個失敗，耗時 {elapsed:.1f}s")
+    if not args.in_place:
+        print(f"結果已儲存至: {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
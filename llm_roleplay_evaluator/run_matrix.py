@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+評估矩陣
+在同一個行程內執行 模型 × 場景 × 取樣參數 的所有組合，並輸出一份彙整結果
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加專案路徑到 Python 路徑
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from config import config
+from evaluator.history_window import HISTORY_STRATEGIES, HistoryWindow
+from prompts import get_all_scenarios
+from providers import CACHE_MODES
+
+def parse_list(value: str, item_type=str) -> list:
+    """解析逗號分隔的列表"""
+    return [item_type(item.strip()) for item in value.split(",") if item.strip()]
+
+async def main():
+    """評估矩陣程式入口點"""
+    parser = argparse.ArgumentParser(description="執行 模型 × 場景 × 取樣參數 的評估矩陣")
+    parser.add_argument(
+        "--models",
+        type=parse_list,
+        default=None,
+        help="模型列表，以逗號分隔；可用 服務提供者=模型 指定服務提供者，"
+             "例如 ollama=qwen2.5:14b,openrouter=openai/gpt-oss-20b（預設: 目前設定的模型）"
+    )
+    parser.add_argument(
+        "--scenarios",
+        type=parse_list,
+        default=None,
+        help="場景列表，以逗號分隔（預設: 所有場景）"
+    )
+    parser.add_argument(
+        "--temperatures",
+        type=lambda value: parse_list(value, float),
+        default=None,
+        help=f"溫度參數列表，以逗號分隔（預設: {config.temperature}）"
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=lambda value: parse_list(value, int),
+        default=None,
+        help=f"最大 token 數列表，以逗號分隔（預設: {config.max_tokens}）"
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=config.test_rounds,
+        help=f"每格的測試輪數（預設: {config.test_rounds}）"
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=1,
+        help="每格同時執行的獨立對話次數，輸出總分的標準差與信賴區間（預設: 1）"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=config.test_concurrency,
+        help=f"同時執行的格子數（預設: {config.test_concurrency}）"
+    )
+    parser.add_argument(
+        "--provider-concurrency",
+        help="各服務提供者同時執行的格子數上限，例如 ollama=1,openrouter=8（預設: 不另外限制）"
+    )
+    parser.add_argument(
+        "--keep-loaded",
+        action="store_true",
+        help="每批 Ollama 模型完成後不卸載模型（預設會卸載以釋放顯示記憶體）"
+    )
+    parser.add_argument(
+        "--history-strategy",
+        choices=list(HISTORY_STRATEGIES),
+        default=config.history_strategy,
+        help=f"每輪送出的對話歷史策略（預設: {config.history_strategy}）"
+    )
+    parser.add_argument(
+        "--history-budget",
+        type=int,
+        default=config.history_token_budget,
+        help=f"sliding 與 summarize 策略的每輪提示詞 token 預算（預設: {config.history_token_budget}）"
+    )
+    parser.add_argument(
+        "--history-turns",
+        type=int,
+        default=config.history_keep_turns,
+        help=f"first-last 策略保留的最近輪數（預設: {config.history_keep_turns}）"
+    )
+    parser.add_argument(
+        "--scoring-workers",
+        type=int,
+        default=config.scoring_workers,
+        help=f"評分行程池的工作行程數，0 表示不使用行程池（預設: {config.scoring_workers}）"
+    )
+    parser.add_argument(
+        "--cache",
+        choices=list(CACHE_MODES),
+        default=config.response_cache_mode,
+        help=f"回應快取模式（預設: {config.response_cache_mode}）"
+    )
+
+    args = parser.parse_args()
+
+    scenarios = args.scenarios or get_all_scenarios()
+    unknown = [scenario for scenario in scenarios if scenario not in get_all_scenarios()]
+    if unknown:
+        print(f"未知的場景: {', '.join(unknown)}")
+        return
+
+    # 評估器依賴 scikit-learn 等套件，解析參數後才匯入
+    from evaluator import RoleplayTestRunner
+    from evaluator.matrix import expand_targets, parse_provider_limits
+
+    try:
+        targets = expand_targets(args.models or [config.current_model], args.temperatures, args.max_tokens)
+        provider_concurrency = parse_provider_limits(args.provider_concurrency)
+        test_runner = RoleplayTestRunner(
+            cache_mode=args.cache,
+            scoring_workers=args.scoring_workers,
+            history_window=HistoryWindow(args.history_strategy, args.history_budget, args.history_turns)
+        )
+    except Exception as e:
+        print(f"初始化評估矩陣失敗: {e}")
+        return
+
+    try:
+        result = await test_runner.run_matrix_test(
+            targets,
+            scenarios=scenarios,
+            test_rounds=args.rounds,
+            concurrency=args.concurrency,
+            provider_concurrency=provider_concurrency,
+            unload_models=not args.keep_loaded,
+            samples=args.samples
+        )
+        print_matrix_results(result)
+    except Exception as e:
+        print(f"評估矩陣執行失敗: {e}")
+    finally:
+        await test_runner.close()
+
+def print_matrix_results(result: dict):
+    """輸出評估矩陣結果（每個受測對象一列、每個場景一欄）"""
+    scenarios = result["scenarios"]
+    print("\n" + "="*80)
+    print("評估矩陣結果摘要")
+    print("="*80)
+    print(f"測試 ID: {result['matrix_test_id']}")
+    print(f"受測對象: {len(result['targets'])}，場景: {len(scenarios)}，每格 {result['test_rounds']} 輪"
+          + (f" × {result['samples']} 次對話" if result.get('samples', 1) > 1 else ""))
+
+    header = f"{'服務提供者':<12}{'模型':<24}{'溫度':>6}{'tokens':>8}{'平均':>8}{'回應時間':>10}{'tokens/s':>10}{'提示:回應':>10}"
+    header += "".join(f"{scenario[:14]:>16}" for scenario in scenarios)
+    print("\n" + header)
+    summary = sorted(result["summary"], key=lambda row: row["overall_average_score"] or 0, reverse=True)
+    for row in summary:
+        line = f"{row['provider']:<12}{row['model'][:23]:<24}{row['temperature']:>6g}{row['max_tokens']:>8}"
+        line += f"{row['overall_average_score']:>8.3f}" if row["overall_average_score"] is not None else f"{'-':>8}"
+        line += f"{row['average_response_time']:>9.2f}s" if row["average_response_time"] is not None else f"{'-':>10}"
+        token_usage = row.get("token_usage") or {}
+        for key, width in (("completion_tokens_per_sec", 10), ("prompt_completion_ratio", 10)):
+            line += f"{token_usage[key]:>{width}.1f}" if token_usage.get(key) is not None else f"{'-':>{width}}"
+        for scenario in scenarios:
+            score = row["scenario_scores"].get(scenario)
+            line += f"{score:>16.3f}" if score is not None else f"{'失敗':>15}"
+        print(line)
+
+    sampled = [cell for cell in result["cells"]
+               if (cell.get("sample_statistics") or {}).get("overall_score_stats")]
+    if sampled:
+        confidence = sampled[0]["sample_statistics"]["confidence"]
+        min_ci_samples = sampled[0]["sample_statistics"]["min_ci_samples"]
+        print(f"\n多次取樣的總分（平均值 ± 標準差，{confidence:.0%} 信賴區間；"
+              f"少於 {min_ci_samples} 次成功對話時不計算）:")
+        for cell in sampled:
+            stats = cell["sample_statistics"]["overall_score_stats"]
+            line = f"  {cell['target']} / {cell['scenario']}: {stats['mean']:.3f}"
+            if stats["std"] is not None:
+                line += f" ± {stats['std']:.3f}"
+                if stats["ci_low"] is not None:
+                    line += f"  [{stats['ci_low']:.3f}, {stats['ci_high']:.3f}]"
+                else:
+                    line += "  CI n/a"
+            print(line)
+
+    if result["model_loads"]:
+        print("\n模型載入時間（不計入回應時間）:")
+        for model, model_load in result["model_loads"].items():
+            print(f"  {model}: {model_load['load_time']:.2f}s")
+
+    failed = [cell for cell in result["cells"] if "error" in cell]
+    if failed:
+        print(f"\n失敗的格子: {len(failed)}")
+        for cell in failed:
+            print(f"  {cell['target']} / {cell['scenario']}: {cell['error']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
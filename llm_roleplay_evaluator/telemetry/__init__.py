@@ -0,0 +1,17 @@
+# 遙測模組初始化檔案
+from .tracing import Tracer, get_tracer, set_tracer, enable_tracing, span, set_lane, reset_lane
+from .metrics import MetricsRegistry, MetricsServer, MetricsFileWriter, get_metrics
+
+__all__ = [
+    'Tracer',
+    'get_tracer',
+    'set_tracer',
+    'enable_tracing',
+    'span',
+    'set_lane',
+    'reset_lane',
+    'MetricsRegistry',
+    'MetricsServer',
+    'MetricsFileWriter',
+    'get_metrics'
+]
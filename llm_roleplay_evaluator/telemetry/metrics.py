@@ -0,0 +1,249 @@
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Union
+
+# 請求延遲直方圖的分界（秒）；本機模型的單輪回應通常落在 0.5～60 秒
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# 各指標的說明（Prometheus HELP）與類型
+METRICS = {
+    "llm_requests_in_flight": ("gauge", "目前進行中的 LLM 請求數"),
+    "llm_requests_total": ("counter", "完成的 LLM 請求數"),
+    "llm_request_errors_total": ("counter", "失敗的 LLM 請求數"),
+    "llm_rate_limited_total": ("counter", "遭到限流（429/503）的回應數"),
+    "llm_tokens_generated_total": ("counter", "產生的 token 數（串流片段數）"),
+    "llm_request_duration_seconds": ("histogram", "LLM 請求的完整回應時間"),
+    "llm_time_to_first_token_seconds": ("histogram", "LLM 請求的首 token 延遲"),
+    "scoring_queue_depth": ("gauge", "等待或進行中的評分工作數"),
+    "rounds_completed_total": ("counter", "完成的測試輪數"),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _format_labels(key: LabelKey, extra: LabelKey = ()) -> str:
+    """Prometheus 標籤字串（值中的反斜線、引號與換行需跳脫）"""
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+class Histogram:
+    """累積分界直方圖"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """記錄一個觀測值"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """各分界以下（含）的累積次數，最後一項為 +Inf"""
+        result, total = [], 0
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+class MetricsRegistry:
+    """執行期指標（計數器、量表與直方圖），可輸出為 Prometheus 文字格式或 JSON 快照
+
+    指標以名稱加標籤區分（例如依模型分開的延遲直方圖）；所有更新都在鎖內完成，
+    可從事件迴圈與背景執行緒同時更新。
+    """
+
+    def __init__(self, latency_buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        Args:
+            latency_buckets: 延遲直方圖的分界（秒）
+        """
+        self.latency_buckets = tuple(latency_buckets)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+
+    @staticmethod
+    def _label_key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any):
+        """增加計數器或量表"""
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def dec(self, name: str, value: float = 1.0, **labels: Any):
+        """減少量表"""
+        self.inc(name, -value, **labels)
+
+    def set(self, name: str, value: float, **labels: Any):
+        """設定量表"""
+        key = self._label_key(labels)
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels: Any):
+        """記錄直方圖觀測值"""
+        key = self._label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(self.latency_buckets)
+            series[key].observe(value)
+
+    def total(self, name: str) -> float:
+        """某個計數器所有標籤的加總"""
+        with self._lock:
+            return sum(self._values.get(name, {}).values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前所有指標的 JSON 快照（含自啟動以來的平均吞吐量）"""
+        uptime = time.time() - self.started_at
+        with self._lock:
+            values = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._values.items()
+            }
+            histograms = {
+                name: [{
+                    "labels": dict(key),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                    "buckets": dict(histogram.cumulative())
+                } for key, histogram in series.items()]
+                for name, series in self._histograms.items()
+            }
+            rounds = sum(self._values.get("rounds_completed_total", {}).values())
+            tokens = sum(self._values.get("llm_tokens_generated_total", {}).values())
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": uptime,
+            "rounds_per_minute": rounds / uptime * 60 if uptime > 0 else 0.0,
+            "tokens_per_second": tokens / uptime if uptime > 0 else 0.0,
+            "metrics": values,
+            "histograms": histograms
+        }
+
+    def render_prometheus(self) -> str:
+        """輸出 Prometheus 文字格式"""
+        lines = []
+        with self._lock:
+            names = sorted(set(self._values) | set(self._histograms))
+            for name in names:
+                metric_type, help_text = METRICS.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for key, value in self._values.get(name, {}).items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+                for key, histogram in self._histograms.get(name, {}).items():
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', bound),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        lines.append(f"evaluator_uptime_seconds {time.time() - self.started_at:.3f}")
+        return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    """以 HTTP 提供指標：/metrics 為 Prometheus 文字格式，/metrics.json 為 JSON 快照"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._runner = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 9464) -> str:
+        """在目前的事件迴圈啟動服務
+
+        Returns:
+            指標端點的 URL
+        """
+        # aiohttp 只在啟用指標端點時才匯入
+        from aiohttp import web
+
+        async def handle_metrics(request):
+            return web.Response(text=self.registry.render_prometheus(), content_type="text/plain")
+
+        async def handle_json(request):
+            return web.json_response(self.registry.snapshot())
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        app.router.add_get("/metrics.json", handle_json)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        bound_port = self._runner.addresses[0][1]
+        return f"http://{host}:{bound_port}/metrics"
+
+    async def stop(self):
+        """停止服務"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+class MetricsFileWriter:
+    """定期將指標快照寫入 JSON 檔（先寫暫存檔再取代，讀取端不會讀到寫到一半的檔案）"""
+
+    def __init__(self, registry: MetricsRegistry, path: Union[str, Path], interval: float = 10.0):
+        """
+        Args:
+            registry: 指標來源
+            path: 輸出檔案路徑
+            interval: 寫入間隔（秒）
+        """
+        self.registry = registry
+        self.path = Path(path)
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def write(self):
+        """立即寫入一次快照"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.registry.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    async def _run(self):
+        while True:
+            self.write()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """在目前的事件迴圈開始定期寫入"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """停止定期寫入，並寫入最後一次快照"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.write()
+
+# 全域指標（更新成本很低，一律啟用；只有在啟動端點或檔案輸出時才會被讀取）
+_metrics = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    """取得全域指標"""
+    return _metrics
@@ -0,0 +1,185 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Union
+
+# 目前的執行軌道（例如場景名稱）；並行的場景各自一條軌道，追蹤檢視器中才不會互相重疊
+_lane: contextvars.ContextVar[str] = contextvars.ContextVar("trace_lane", default="main")
+
+class _NoopSpan:
+    """停用時 span() 回傳的空內容管理器（進入時回傳可寫入但不會被記錄的參數字典）"""
+
+    def __enter__(self) -> Dict[str, Any]:
+        return {}
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class Tracer:
+    """輕量追蹤器：記錄各階段的時間區段，可匯出為 Chrome/Perfetto 追蹤檔與各階段摘要
+
+    時間使用 time.perf_counter_ns()（系統層級的單調時鐘），工作行程記錄的區段可直接合併。
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        Args:
+            enabled: 是否記錄區段
+        """
+        self.enabled = enabled
+        self.events: List[Dict[str, Any]] = []
+        self._lanes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._start_ns = time.perf_counter_ns()
+
+    def _lane_id(self, lane: str) -> int:
+        """取得軌道對應的數字 ID（Chrome 追蹤格式的 tid）"""
+        with self._lock:
+            if lane not in self._lanes:
+                self._lanes[lane] = len(self._lanes) + 1
+            return self._lanes[lane]
+
+    def span(self, name: str, category: str = "runner", **args: Any):
+        """建立計時區段的內容管理器（同步與非同步程式碼皆可使用）
+
+        進入時回傳參數字典，可在區段結束前補上結果（例如回應長度）。
+
+        Args:
+            name: 階段名稱
+            category: 分類（runner、provider、scoring、io 等）
+            args: 附加於追蹤事件的參數
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return self._record(name, category, args)
+
+    @contextmanager
+    def _record(self, name: str, category: str, args: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        start_ns = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            self.add_event(name, category, start_ns, time.perf_counter_ns() - start_ns, args)
+
+    def add_event(self, name: str, category: str, start_ns: int, duration_ns: int,
+                  args: Optional[Dict[str, Any]] = None, lane: Optional[str] = None, pid: Optional[int] = None):
+        """加入一個已完成的區段"""
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": duration_ns / 1000,
+            "pid": pid if pid is not None else os.getpid(),
+            "tid": self._lane_id(lane if lane is not None else _lane.get()),
+            "args": {key: value for key, value in (args or {}).items() if value is not None}
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def merge(self, events: Iterable[Dict[str, Any]], lane: str):
+        """合併其他行程（如評分工作行程）記錄的區段，放在指定軌道"""
+        for event in events:
+            self.add_event(event["name"], event["cat"], int(event["ts"] * 1000), int(event["dur"] * 1000),
+                           event.get("args"), lane=lane, pid=event["pid"])
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """依階段彙整區段（依總耗時由大到小）
+
+        Returns:
+            每個階段的次數、總耗時、平均、最大值（秒）與占整體時間的比例
+        """
+        if not self.events:
+            return []
+        wall_time = (max(e["ts"] + e["dur"] for e in self.events) - min(e["ts"] for e in self.events)) / 1e6
+        stages: Dict[str, Dict[str, Any]] = {}
+        for event in self.events:
+            stage = stages.setdefault(event["name"], {
+                "name": event["name"], "category": event["cat"], "count": 0, "total": 0.0, "max": 0.0
+            })
+            duration = event["dur"] / 1e6
+            stage["count"] += 1
+            stage["total"] += duration
+            stage["max"] = max(stage["max"], duration)
+
+        for stage in stages.values():
+            stage["mean"] = stage["total"] / stage["count"]
+            stage["share"] = stage["total"] / wall_time if wall_time > 0 else 0.0
+        return sorted(stages.values(), key=lambda stage: stage["total"], reverse=True)
+
+    def format_summary(self) -> str:
+        """各階段摘要表
+
+        「占比」為該階段累計時間除以整體經過時間；並行執行或巢狀的階段加總可能超過 100%。
+        """
+        lines = [f"{'階段':<28}{'分類':<10}{'次數':>6}{'總計':>10}{'平均':>10}{'最大':>10}{'占比':>8}"]
+        for stage in self.summary():
+            lines.append(
+                f"{stage['name']:<28}{stage['category']:<10}{stage['count']:>6}"
+                f"{stage['total']:>9.3f}s{stage['mean'] * 1000:>8.1f}ms{stage['max'] * 1000:>8.1f}ms"
+                f"{stage['share']:>8.1%}"
+            )
+        return "\n".join(lines)
+
+    def export(self, path: Union[str, Path]) -> Path:
+        """寫入 Chrome 追蹤格式檔案（可用 chrome://tracing 或 ui.perfetto.dev 開啟）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 以 metadata 事件標示行程與軌道名稱
+        metadata = []
+        pids = {event["pid"] for event in self.events}
+        for pid in pids:
+            label = "evaluator" if pid == os.getpid() else f"scoring worker {pid}"
+            metadata.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": label}})
+        lane_pids = {(event["pid"], event["tid"]) for event in self.events}
+        lane_names = {lane_id: lane for lane, lane_id in self._lanes.items()}
+        for pid, tid in lane_pids:
+            metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                             "args": {"name": lane_names.get(tid, str(tid))}})
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "traceEvents": metadata + self.events,
+                "displayTimeUnit": "ms",
+                "otherData": {"summary": self.summary()}
+            }, f, ensure_ascii=False)
+        return path
+
+# 全域追蹤器，預設停用
+_tracer = Tracer(enabled=False)
+
+def get_tracer() -> Tracer:
+    """取得目前的全域追蹤器"""
+    return _tracer
+
+def set_tracer(tracer: Tracer) -> Tracer:
+    """設定全域追蹤器，回傳原本的追蹤器"""
+    global _tracer
+    previous = _tracer
+    _tracer = tracer
+    return previous
+
+def enable_tracing() -> Tracer:
+    """啟用追蹤並回傳新的全域追蹤器"""
+    tracer = Tracer(enabled=True)
+    set_tracer(tracer)
+    return tracer
+
+def span(name: str, category: str = "runner", **args: Any):
+    """在全域追蹤器上建立計時區段（停用時不記錄）"""
+    return _tracer.span(name, category, **args)
+
+def set_lane(lane: str) -> contextvars.Token:
+    """設定目前非同步工作所屬的追蹤軌道（只影響目前的工作與其子工作）"""
+    return _lane.set(lane)
+
+def reset_lane(token: contextvars.Token):
+    """還原 set_lane 之前的追蹤軌道"""
+    _lane.reset(token)